@@ -1,21 +1,60 @@
-
 import strawberry
-from typing import List
-from app.services.database import get_all_products
-from app.api.graphql.types.product_types import ProductoType
+from typing import List, Optional, Tuple
+from app.core import config
+from app.services.database import get_all_products, get_products_page
+from app.api.graphql.types.product_types import ProductoType, ProductoPageType
 from app.models.schemas import Producto
 from app.api.graphql.mutations.product_mutations import Mutation
+from app.utils.pagination import encode_cursor, decode_sort_key
+
+
+def _fetch_page(
+    limit: Optional[int],
+    cursor: Optional[str],
+    categoria: Optional[str],
+    marca: Optional[str]
+) -> Tuple[List[dict], Optional[str]]:
+    """Resuelve una página con los mismos cursores que GET /products"""
+    after = decode_sort_key(cursor) if cursor is not None else None
+    page_size = min(limit or config.PAGE_SIZE_DEFAULT, config.PAGE_SIZE_MAX)
+    items, next_after = get_products_page(
+        page_size, after=after, categoria=categoria, marca=marca
+    )
+    next_cursor = encode_cursor(list(next_after)) if next_after is not None else None
+    return items, next_cursor
 
 
 # Resolvers
-def resolve_all_products() -> List[Producto]:
-    items = get_all_products()
+def resolve_all_products(
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    categoria: Optional[str] = None,
+    marca: Optional[str] = None
+) -> List[Producto]:
+    if limit is None and cursor is None:
+        items = get_all_products(categoria=categoria, marca=marca)
+    else:
+        items, _ = _fetch_page(limit, cursor, categoria, marca)
     return [Producto(**p) for p in items]
 
 
+def resolve_products_page(
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    categoria: Optional[str] = None,
+    marca: Optional[str] = None
+) -> ProductoPageType:
+    items, next_cursor = _fetch_page(limit, cursor, categoria, marca)
+    return ProductoPageType(
+        items=[Producto(**p) for p in items],
+        next_cursor=next_cursor
+    )
+
+
 @strawberry.type
 class Query:
     products: List[ProductoType] = strawberry.field(resolver=resolve_all_products)
+    products_page: ProductoPageType = strawberry.field(resolver=resolve_products_page)
 
 
-schema_graphql = strawberry.Schema(query=Query, mutation=Mutation)
\ No newline at end of file
+schema_graphql = strawberry.Schema(query=Query, mutation=Mutation)
@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Optional
 import strawberry
 from app.models.schemas import Detalles, Especificaciones, Producto, ProductoCreate
 
@@ -53,3 +53,10 @@ class ProductoCreateType:
     marca: strawberry.auto
     stock: strawberry.auto
     especificaciones: List[EspecificacionInputType]
+
+
+# Página de productos (paginación por cursor)
+@strawberry.type
+class ProductoPageType:
+    items: List[ProductoType]
+    next_cursor: Optional[str] = None
@@ -1,53 +1,296 @@
+import asyncio
+import json
+import msgspec
 import re
-from fastapi import APIRouter, Depends, HTTPException, Response, Request
-from typing import List
-from app.models.schemas import Producto, ProductoCreate
-from app.services.database import delete_product, get_all_products, get_product_by_id, create_product, patch_product, update_product
+import tempfile
+from collections import Counter
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Response, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from typing import AsyncIterator, Dict, List, Literal, Optional, Tuple
+from app.core import config
+from app.models.schemas import AgregadosGrupo, CambiosProductos, EstadisticasGrupo, Producto, ProductoCreate, ProductoPatch, ProductoPatchItem, ProductoStruct, Reserva, ReservaItem, ResumenPatchBatch
+from app.services.database import BLOCKING_STORAGE, TRACKS_ALL_WRITES, changelog, confirm_reservation, delete_product, get_all_products_json, get_product_by_id, get_product_json, get_products_page_json, get_aggregates, get_catalog_version, get_changes, get_facet_counts, get_group_stats, get_product_version, is_reservation_owner, iter_product_batches, product_exists, search_products, stored_filters, create_product, create_products, patch_product, patch_products, release_reservation, reserve_stock, update_product
+from app.services.changelog import ResyncRequired
+from app.services.events import DROPPED, EventBroker
+from app.services.response_cache import ResponseCache, list_key, product_key
+from app.services.reservations import InsufficientStock, ProductsNotFound
 from app.utils.token import extraer_actor_desde_token
-from app.utils.validators import validate_product_input, sanitize_output
+from app.utils.validators import validate_product_input, sanitize_output, sanitize_stored
+from app.utils.pagination import encode_cursor, decode_sort_key
+from app.utils.ndjson import iter_lines
+from app.utils.etag import if_match, make_etag, none_match
+from app.utils.export import accepts_gzip, csv_header, csv_rows, gzip_stream, ndjson_rows
+from app.utils.sse import KEEPALIVE, format_change, format_event
 from app.utils.logging import log_security_event
-from fastapi_cache.decorator import cache
+from fastapi_cache import FastAPICache
 
 # Crear el router
 router = APIRouter()
 
+def _change_event(entrada: dict) -> bytes:
+    # El id del evento es el cursor "<epoch>-<seq>", válido solo en este proceso
+    return format_change(entrada, changelog.cursor(entrada["seq"]))
+
+
+# Difusión de cambios a los suscriptores de GET /products/stream
+events = EventBroker(_change_event, config.SSE_QUEUE_SIZE, config.SSE_MAX_SUBSCRIBERS)
+changelog.subscribe(events.publish)
+
+# Caché de respuestas de GET /products y GET /products/{id}, invalidada por
+# el registro de cambios; con SQLite se desactiva junto con los ETag
+response_cache = ResponseCache(
+    changelog,
+    config.RESPONSE_CACHE_MAX_ENTRIES,
+    config.RESPONSE_CACHE_TTL_SECONDS,
+    enabled=TRACKS_ALL_WRITES
+)
+
+# Serialización de las lecturas frecuentes con los espejos msgspec de
+# Producto: misma salida que response_model, sin validar con pydantic
+_JSON_ENCODER = msgspec.json.Encoder()
+
+
+def _encode_producto(producto: dict) -> bytes:
+    """
+    JSON final (sanitizado) de un producto. El almacén conserva el resultado
+    por producto hasta que cambia; los listados concatenan esos bytes.
+    """
+    return _JSON_ENCODER.encode(msgspec.convert(sanitize_output(producto), ProductoStruct))
+
+
+def _json_array(partes: List[bytes]) -> bytes:
+    return b"[" + b",".join(partes) + b"]"
+
+
+def _after_from_cursor(cursor: Optional[str], sort: Optional[str]) -> Optional[tuple]:
+    """Obtiene la clave de continuación desde un cursor opaco (400 si es inválido)"""
+    if cursor is None:
+        return None
+    try:
+        return decode_sort_key(cursor, sort)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+
+def _parse_specs(spec: Optional[List[str]]) -> Optional[List[tuple]]:
+    """Convierte filtros `spec=atributo:valor` en pares (400 si falta el separador)"""
+    if not spec:
+        return None
+    pares = []
+    for item in spec:
+        atributo, sep, valor = item.partition(":")
+        if not sep or not atributo or not valor:
+            raise HTTPException(
+                status_code=400,
+                detail="Filtro spec inválido, se espera atributo:valor"
+            )
+        pares.append((atributo, valor))
+    return pares
+
+
+def _cached_json(data: bytes, estado: str, headers: Dict[str, str]) -> Response:
+    """Respuesta JSON ya serializada, con el estado de la caché (HIT/MISS)"""
+    headers = {**headers, FastAPICache.get_cache_status_header(): estado} if response_cache.backend() else headers
+    return Response(content=data, media_type="application/json", headers=headers)
+
+
+async def _run_store(func, *args, **kwargs):
+    """Llama a una función de la base de datos sin bloquear el event loop (ver BLOCKING_STORAGE)"""
+    if BLOCKING_STORAGE:
+        return await run_in_threadpool(func, *args, **kwargs)
+    return func(*args, **kwargs)
+
+
+def _catalog_etag() -> Optional[str]:
+    if not TRACKS_ALL_WRITES:
+        return None
+    return make_etag(*get_catalog_version())
+
+
+def _product_etag(product_id: int) -> Optional[str]:
+    if not TRACKS_ALL_WRITES:
+        return None
+    epoch, version = get_product_version(product_id)
+    return make_etag(epoch, product_id, version)
+
+
+def _product_not_found(request: Request, product_id: int) -> HTTPException:
+    log_security_event(
+        "product_not_found",
+        request,
+        {
+            "product_id": product_id,
+            "result": "not_found"
+        },
+        level="WARNING"
+    )
+    return HTTPException(
+        status_code=404,
+        detail=f"Producto con ID {product_id} no encontrado"
+    )
+
+
+def _etag_header(etag: Optional[str]) -> Dict[str, str]:
+    return {"ETag": etag} if etag is not None else {}
+
+
+def _check_if_match(request: Request, product_id: int, actor: str) -> None:
+    """Control de concurrencia optimista: 412 si If-Match no es la versión actual"""
+    etag = _product_etag(product_id)
+    if not if_match(request.headers.get("if-match"), etag):
+        log_security_event(
+            "precondition_failed",
+            request,
+            {
+                "product_id": product_id,
+                "actor": actor,
+                "if_match": request.headers.get("if-match"),
+                "result": "precondition_failed"
+            },
+            level="WARNING"
+        )
+        raise HTTPException(
+            status_code=412,
+            detail=f"El producto {product_id} fue modificado (If-Match no coincide)"
+        )
+
 # ENDPOINT 1: GET /products - Obtener todos los productos
 
 
 @router.get("/products", response_model=List[Producto])
-#@cache(expire=10)
-async def obtener_todos_productos(response: Response, request: Request):
+async def obtener_todos_productos(
+    request: Request,
+    categoria: Optional[str] = None,
+    marca: Optional[str] = None,
+    precio_min: Optional[float] = Query(None, ge=0),
+    precio_max: Optional[float] = Query(None, ge=0),
+    sort: Optional[Literal["precio", "-precio"]] = None,
+    spec: Optional[List[str]] = Query(None),
+    limit: Optional[int] = Query(None, ge=1, le=config.PAGE_SIZE_MAX),
+    cursor: Optional[str] = None
+):
     """
-    Obtiene todos los productos con protección contra:
+    Obtiene todos los productos, opcionalmente filtrados por categoría, marca
+    y rango de precio, y ordenados por precio (resueltos con los índices
+    secundarios), con protección contra:
     - A01:2021 - Broken Access Control (via middleware)
     - A05:2021 - Security Misconfiguration (via middleware)
     - A07:2021 - Rate Limiting (via middleware)
     - A09:2021 - Security Logging (logging detallado)
     
+    Args:
+        categoria (str, opcional): Filtrar por categoría exacta
+        marca (str, opcional): Filtrar por marca exacta
+        precio_min (float, opcional): Precio mínimo (inclusive)
+        precio_max (float, opcional): Precio máximo (inclusive)
+        sort (str, opcional): "precio" ascendente o "-precio" descendente
+        spec (List[str], opcional): Filtros de especificación "atributo:valor"
+        limit (int, opcional): Tamaño de página; activa la paginación por cursor
+        cursor (str, opcional): Valor de `X-Next-Cursor` de la página anterior
+    
     Returns:
-        List[Producto]: Lista de productos sanitizada
+        List[Producto]: Lista de productos sanitizada. Si hay más páginas, el
+        cursor siguiente se envía en el header `X-Next-Cursor`. El header
+        `ETag` refleja la versión del catálogo; con `If-None-Match` vigente
+        se responde 304 sin consultar ni serializar productos. La respuesta
+        serializada se guarda en la caché de respuestas hasta que una
+        escritura afecte al listado.
     """
     try:
         # Log del inicio de la solicitud
         log_security_event(
             "products_list_attempt",
             request,
-            {"operation": "list_all"}
+            {
+                "operation": "list_all",
+                "filters": {
+                    "categoria": categoria,
+                    "marca": marca,
+                    "precio_min": precio_min,
+                    "precio_max": precio_max,
+                    "spec": spec
+                },
+                "sort": sort,
+                "limit": limit
+            }
         )
         
-        productos = get_all_products()
+        etag = _catalog_etag()
+        if none_match(request.headers.get("if-none-match"), etag):
+            log_security_event(
+                "products_not_modified",
+                request,
+                {"result": "not_modified"}
+            )
+            return Response(status_code=304, headers={"ETag": etag})
+        
+        filtros = {
+            "categoria": categoria,
+            "marca": marca,
+            "precio_min": precio_min,
+            "precio_max": precio_max,
+            "sort": sort,
+            "specs": _parse_specs(spec)
+        }
+        key = list_key(**filtros, limit=limit, cursor=cursor)
+        cached = await response_cache.get(key)
+        if cached is not None:
+            # Primera línea: cursor siguiente (vacío si no hay); resto: cuerpo
+            next_cursor, _, body = cached.partition(b"\n")
+            headers = _etag_header(etag)
+            if next_cursor:
+                headers["X-Next-Cursor"] = next_cursor.decode("ascii")
+            log_security_event(
+                "products_listed",
+                request,
+                {"cache": "hit", "result": "success"}
+            )
+            return _cached_json(body, "HIT", headers)
+        
+        version = response_cache.version()
+        next_cursor = ""
+        # Pares (clave de orden, JSON del producto); el ID es el último
+        # componente de la clave
+        if limit is None and cursor is None:
+            items = await _run_store(get_all_products_json, _encode_producto, **filtros)
+        else:
+            items, next_after = await _run_store(
+                get_products_page_json,
+                _encode_producto,
+                limit or config.PAGE_SIZE_DEFAULT,
+                after=_after_from_cursor(cursor, sort),
+                **filtros
+            )
+            if next_after is not None:
+                next_cursor = encode_cursor(list(next_after))
+        body = _json_array([data for _, data in items])
+        await response_cache.set(
+            key,
+            next_cursor.encode("ascii") + b"\n" + body,
+            version,
+            ids=(sort_key[-1] for sort_key, _ in items),
+            # La invalidación compara con productos en su forma almacenada
+            filtros=stored_filters(**filtros)
+        )
         
         # Log de operación exitosa
         log_security_event(
             "products_listed",
             request,
             {
-                "count": len(productos),
+                "count": len(items),
+                "cache": "miss",
                 "result": "success"
             }
         )
         
-        return sanitize_output(productos)
+        headers = _etag_header(etag)
+        if next_cursor:
+            headers["X-Next-Cursor"] = next_cursor
+        return _cached_json(body, "MISS", headers)
         
     except Exception as e:
         # Log de error
@@ -62,11 +305,605 @@ async def obtener_todos_productos(response: Response, request: Request):
         )
         raise
 
+# GET /products/search - Búsqueda de texto completo
+# (declarado antes de /products/{product_id} para que "search" no se tome como ID)
+
+
+@router.get("/products/search", response_model=List[Producto])
+async def buscar_productos(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=config.PAGE_SIZE_MAX)
+):
+    """
+    Busca productos por texto libre en el nombre y en los valores de las
+    especificaciones, ignorando mayúsculas y tildes, ordenados por relevancia.
+    Protección contra:
+    - A03:2021 - Injection (la consulta solo se tokeniza, nunca se interpreta)
+    - A05:2021 - Security Misconfiguration (via middleware)
+    - A07:2021 - Rate Limiting (via middleware)
+    - A09:2021 - Security Logging (logging detallado)
+    
+    Args:
+        q (str): Texto a buscar
+        limit (int): Cantidad máxima de resultados
+        
+    Returns:
+        List[Producto]: Productos sanitizados, del más al menos relevante
+    """
+    try:
+        log_security_event(
+            "products_search_attempt",
+            request,
+            {"query": q, "limit": limit}
+        )
+        
+        productos = await _run_store(search_products, q, limit)
+        
+        log_security_event(
+            "products_searched",
+            request,
+            {
+                "count": len(productos),
+                "result": "success"
+            }
+        )
+        
+        # Misma forma que response_model, codificada con los espejos msgspec
+        return Response(
+            content=_json_array([_encode_producto(p) for p in productos]),
+            media_type="application/json"
+        )
+        
+    except Exception as e:
+        log_security_event(
+            "products_search_error",
+            request,
+            {
+                "error": str(e),
+                "error_type": type(e).__name__
+            },
+            level="ERROR"
+        )
+        raise
+
+# GET /products/facets - Conteo de valores por atributo de especificación
+
+
+@router.get("/products/facets", response_model=Dict[str, Dict[str, int]])
+async def obtener_facetas(
+    request: Request,
+    categoria: Optional[str] = None,
+    marca: Optional[str] = None,
+    precio_min: Optional[float] = Query(None, ge=0),
+    precio_max: Optional[float] = Query(None, ge=0),
+    spec: Optional[List[str]] = Query(None)
+):
+    """
+    Obtiene, para los productos que cumplen los filtros, cuántos tienen cada
+    valor de cada atributo de especificación (p. ej. RAM: 8GB (120), 12GB (45)).
+    Protección contra:
+    - A03:2021 - Injection (claves y valores sanitizados)
+    - A05:2021 - Security Misconfiguration (via middleware)
+    - A07:2021 - Rate Limiting (via middleware)
+    - A09:2021 - Security Logging (logging detallado)
+    
+    Args:
+        categoria, marca, precio_min, precio_max, spec: Mismos filtros que GET /products
+        
+    Returns:
+        Dict[str, Dict[str, int]]: atributo -> valor -> cantidad de productos
+    """
+    try:
+        log_security_event(
+            "products_facets_attempt",
+            request,
+            {
+                "filters": {
+                    "categoria": categoria,
+                    "marca": marca,
+                    "precio_min": precio_min,
+                    "precio_max": precio_max,
+                    "spec": spec
+                }
+            }
+        )
+        
+        counts = await _run_store(
+            get_facet_counts,
+            categoria=categoria,
+            marca=marca,
+            precio_min=precio_min,
+            precio_max=precio_max,
+            specs=_parse_specs(spec)
+        )
+        
+        log_security_event(
+            "products_facets_listed",
+            request,
+            {
+                "attributes": len(counts),
+                "result": "success"
+            }
+        )
+        
+        # Las claves también son datos de usuario: se sanitizan igual que los valores
+        return {
+            sanitize_stored(atributo): {
+                sanitize_stored(valor): total
+                for valor, total in sorted(valores.items(), key=lambda item: (-item[1], item[0]))
+            }
+            for atributo, valores in sorted(counts.items())
+        }
+        
+    except Exception as e:
+        if isinstance(e, HTTPException):
+            raise
+            
+        log_security_event(
+            "products_facets_error",
+            request,
+            {
+                "error": str(e),
+                "error_type": type(e).__name__
+            },
+            level="ERROR"
+        )
+        raise
+
+# GET /products/stats - Agregados de inventario por categoría o marca
+
+
+@router.get("/products/stats", response_model=Dict[str, EstadisticasGrupo])
+async def obtener_estadisticas(
+    request: Request,
+    group_by: Literal["categoria", "marca"] = "categoria",
+    stock_bajo: int = Query(5, ge=0)
+):
+    """
+    Obtiene agregados de inventario por categoría o marca: cantidad de
+    productos, stock total, valor del stock, precio promedio/mínimo/máximo y
+    cantidad de productos con stock bajo el umbral.
+    Protección contra:
+    - A03:2021 - Injection (agrupación restringida a valores conocidos, claves sanitizadas)
+    - A05:2021 - Security Misconfiguration (via middleware)
+    - A07:2021 - Rate Limiting (via middleware)
+    - A09:2021 - Security Logging (logging detallado)
+    
+    Args:
+        group_by (str): "categoria" o "marca"
+        stock_bajo (int): Umbral bajo el cual un producto cuenta como stock bajo
+        
+    Returns:
+        Dict[str, EstadisticasGrupo]: grupo -> agregados
+    """
+    try:
+        log_security_event(
+            "products_stats_attempt",
+            request,
+            {"group_by": group_by, "stock_bajo": stock_bajo}
+        )
+        
+        stats = await _run_store(get_group_stats, group_by, stock_bajo)
+        
+        log_security_event(
+            "products_stats_listed",
+            request,
+            {
+                "groups": len(stats),
+                "result": "success"
+            }
+        )
+        
+        return {sanitize_stored(grupo): valores for grupo, valores in sorted(stats.items())}
+        
+    except Exception as e:
+        if isinstance(e, HTTPException):
+            raise
+            
+        log_security_event(
+            "products_stats_error",
+            request,
+            {
+                "error": str(e),
+                "error_type": type(e).__name__
+            },
+            level="ERROR"
+        )
+        raise
+
+# GET /products/aggregates - Agregados materializados por categoría o marca
+
+
+@router.get("/products/aggregates", response_model=Dict[str, AgregadosGrupo])
+async def obtener_agregados(
+    request: Request,
+    group_by: Literal["categoria", "marca"] = "categoria"
+):
+    """
+    Obtiene los agregados que el almacén mantiene actualizados en cada
+    escritura: cantidad de productos, stock total y precio mínimo, máximo y
+    promedio por grupo. El costo depende de la cantidad de grupos, no del
+    tamaño del catálogo.
+    Protección contra:
+    - A03:2021 - Injection (agrupación restringida a valores conocidos, claves sanitizadas)
+    - A05:2021 - Security Misconfiguration (via middleware)
+    - A07:2021 - Rate Limiting (via middleware)
+    - A09:2021 - Security Logging (logging detallado)
+    
+    Args:
+        group_by (str): "categoria" o "marca"
+        
+    Returns:
+        Dict[str, AgregadosGrupo]: grupo -> agregados
+    """
+    try:
+        log_security_event(
+            "products_aggregates_attempt",
+            request,
+            {"group_by": group_by}
+        )
+        
+        agregados = await _run_store(get_aggregates, group_by)
+        
+        log_security_event(
+            "products_aggregates_listed",
+            request,
+            {
+                "groups": len(agregados),
+                "result": "success"
+            }
+        )
+        
+        return {sanitize_stored(grupo): valores for grupo, valores in sorted(agregados.items())}
+        
+    except Exception as e:
+        if isinstance(e, HTTPException):
+            raise
+            
+        log_security_event(
+            "products_aggregates_error",
+            request,
+            {
+                "error": str(e),
+                "error_type": type(e).__name__
+            },
+            level="ERROR"
+        )
+        raise
+
+# GET /products/changes - Cambios del catálogo desde una secuencia
+
+
+@router.get("/products/changes", response_model=CambiosProductos)
+async def obtener_cambios(
+    request: Request,
+    since: Optional[str] = Query(None, max_length=64),
+    limit: int = Query(config.PAGE_SIZE_DEFAULT, ge=1, le=config.PAGE_SIZE_MAX)
+):
+    """
+    Obtiene los cambios del catálogo posteriores al cursor `since`, en
+    orden: cada creación o modificación trae el producto completo y cada
+    eliminación una lápida. El cliente guarda `next_since` (opaco, ligado
+    al proceso que lo emitió) y lo envía en la siguiente consulta; si esos
+    cambios ya salieron del registro o el cursor es de otro proceso (por
+    ejemplo tras un reinicio) responde 410 y el cliente debe resincronizar
+    con GET /products y seguir desde el `next_since` de la respuesta 410.
+    Protección contra:
+    - A03:2021 - Injection (salida sanitizada)
+    - A04:2021 - Insecure Design (registro y páginas de tamaño acotado)
+    - A05:2021 - Security Misconfiguration (via middleware)
+    - A07:2021 - Rate Limiting (via middleware)
+    - A09:2021 - Security Logging (logging detallado)
+    
+    Args:
+        since (str): Cursor `next_since` de la consulta anterior (omitido al comenzar)
+        limit (int): Máximo de cambios a retornar
+        
+    Returns:
+        CambiosProductos: Cambios, siguiente `since` y si quedan más
+        
+    Raises:
+        HTTPException: 400 si el cursor no es válido, 410 si se requiere resincronizar
+    """
+    try:
+        log_security_event(
+            "products_changes_attempt",
+            request,
+            {"since": since, "limit": limit}
+        )
+        
+        try:
+            cambios = get_changes(since, limit)
+        except ValueError:
+            log_security_event(
+                "products_changes_invalid_cursor",
+                request,
+                {"since": since, "result": "invalid_cursor"},
+                level="WARNING"
+            )
+            raise HTTPException(status_code=400, detail="Cursor inválido")
+        except ResyncRequired as e:
+            log_security_event(
+                "products_changes_resync",
+                request,
+                {
+                    "since": since,
+                    "oldest_seq": e.oldest_seq,
+                    "last_seq": e.last_seq,
+                    "result": "resync_required"
+                },
+                level="WARNING"
+            )
+            raise HTTPException(
+                status_code=410,
+                detail={
+                    "message": "Resincronización requerida: los cambios pedidos ya no están disponibles",
+                    "oldest_seq": e.oldest_seq,
+                    "last_seq": e.last_seq,
+                    "next_since": changelog.cursor(e.last_seq)
+                }
+            )
+        
+        log_security_event(
+            "products_changes_listed",
+            request,
+            {
+                "count": len(cambios["changes"]),
+                "next_since": cambios["next_since"],
+                "result": "success"
+            }
+        )
+        
+        return sanitize_output(cambios)
+        
+    except Exception as e:
+        if isinstance(e, HTTPException):
+            raise
+            
+        log_security_event(
+            "products_changes_error",
+            request,
+            {
+                "error": str(e),
+                "error_type": type(e).__name__
+            },
+            level="ERROR"
+        )
+        raise
+
+# GET /products/export - Exportación completa del catálogo en streaming
+
+_EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+async def _export_rows(request: Request, formato: str) -> AsyncIterator[bytes]:
+    """Serializa el catálogo lote a lote: nunca hay más de un lote en memoria"""
+    exportados = 0
+    try:
+        serializar = csv_rows if formato == "csv" else ndjson_rows
+        if formato == "csv":
+            yield csv_header()
+        lotes = iter_product_batches(config.PAGE_SIZE_MAX)
+        while (lote := await _run_store(next, lotes, None)) is not None:
+            exportados += len(lote)
+            yield serializar(sanitize_output(lote))
+            # Cede el event loop entre lotes para no bloquear otras solicitudes
+            await asyncio.sleep(0)
+            
+        log_security_event(
+            "products_exported",
+            request,
+            {
+                "format": formato,
+                "count": exportados,
+                "result": "success"
+            }
+        )
+    except Exception as e:
+        # La respuesta ya comenzó: el error solo puede registrarse
+        log_security_event(
+            "products_export_error",
+            request,
+            {
+                "format": formato,
+                "count": exportados,
+                "error": str(e),
+                "error_type": type(e).__name__
+            },
+            level="ERROR"
+        )
+        raise
+
+
+@router.get("/products/export", response_class=StreamingResponse)
+async def exportar_productos(
+    request: Request,
+    formato: Literal["ndjson", "csv"] = Query("ndjson", alias="format")
+):
+    """
+    Exporta el catálogo completo en NDJSON o CSV, en streaming y con memoria
+    constante: los productos se leen por páginas keyset, se sanitizan y se
+    serializan lote a lote. Con `Accept-Encoding: gzip` la salida se
+    comprime de forma incremental.
+    Protección contra:
+    - A03:2021 - Injection (salida sanitizada)
+    - A04:2021 - Insecure Design (memoria acotada sin importar el tamaño del catálogo)
+    - A05:2021 - Security Misconfiguration (via middleware)
+    - A07:2021 - Rate Limiting (via middleware)
+    - A09:2021 - Security Logging (logging detallado)
+    
+    Args:
+        formato (str): "ndjson" o "csv" (parámetro `format`)
+        
+    Returns:
+        StreamingResponse: Catálogo serializado, opcionalmente comprimido
+    """
+    try:
+        log_security_event(
+            "products_export_attempt",
+            request,
+            {"format": formato}
+        )
+        
+        body = _export_rows(request, formato)
+        headers = {
+            "Content-Disposition": f'attachment; filename="products.{formato}"',
+            "Vary": "Accept-Encoding"
+        }
+        if accepts_gzip(request.headers.get("accept-encoding")):
+            body = gzip_stream(body)
+            headers["Content-Encoding"] = "gzip"
+        
+        return StreamingResponse(body, media_type=_EXPORT_MEDIA_TYPES[formato], headers=headers)
+        
+    except Exception as e:
+        if isinstance(e, HTTPException):
+            raise
+            
+        log_security_event(
+            "products_export_error",
+            request,
+            {
+                "error": str(e),
+                "error_type": type(e).__name__
+            },
+            level="ERROR"
+        )
+        raise
+
+# GET /products/stream - Cambios del catálogo en vivo (Server-Sent Events)
+
+
+def _last_event_id(request: Request) -> Optional[str]:
+    return request.headers.get("last-event-id") or None
+
+
+async def _stream_changes(request: Request, since: Optional[str]) -> AsyncIterator[bytes]:
+    """
+    Emite los cambios pendientes desde el cursor `since` (reconexión con
+    Last-Event-ID) y luego los cambios en vivo, con comentarios keepalive
+    en los períodos sin actividad. La suscripción se toma al comenzar la
+    transmisión (una respuesta que nunca se envía no deja una cola
+    suscrita) y ya está activa al reproducir el registro, así que no se
+    pierden cambios entre ambos. Un Last-Event-ID de otro proceso o
+    ilegible se trata como un hueco: el cliente recibe `resync`.
+    """
+    queue = events.subscribe()
+    if queue is None:
+        # Otro cliente tomó el último cupo después de la verificación del endpoint
+        yield format_event("dropped", {"reason": "too_many_subscribers"})
+        return
+    enviados = 0
+    ultimo = 0
+    try:
+        if since is not None:
+            try:
+                for entrada in changelog.since(changelog.parse_cursor(since), changelog.capacity):
+                    ultimo = entrada["seq"]
+                    enviados += 1
+                    yield _change_event(entrada)
+            except (ResyncRequired, ValueError):
+                yield format_event("resync", {
+                    "oldest_seq": changelog.oldest_seq,
+                    "last_seq": changelog.last_seq,
+                    "next_since": changelog.cursor(changelog.last_seq)
+                })
+        while True:
+            try:
+                evento = await asyncio.wait_for(queue.get(), timeout=config.SSE_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield KEEPALIVE
+                continue
+            if evento is DROPPED:
+                log_security_event(
+                    "products_stream_dropped",
+                    request,
+                    {"sent": enviados, "result": "slow_consumer"},
+                    level="WARNING"
+                )
+                yield format_event("dropped", {"reason": "slow_consumer"})
+                return
+            seq, data = evento
+            if seq <= ultimo:
+                continue
+            enviados += 1
+            yield data
+    finally:
+        events.unsubscribe(queue)
+
+
+@router.get("/products/stream", response_class=StreamingResponse)
+async def stream_cambios(request: Request):
+    """
+    Transmite los cambios del catálogo a medida que ocurren, como Server-
+    Sent Events: un evento por creación, actualización, patch, cambio de
+    stock o eliminación (nombre = acción, id = cursor "<epoch>-<seq>" del
+    registro de cambios). Al reconectar con Last-Event-ID se reenvían los
+    cambios perdidos, o un evento `resync` si ya no están disponibles o el
+    id es de otro proceso (por ejemplo tras un reinicio). Un cliente
+    que no consume a tiempo recibe `dropped` y se cierra su conexión.
+    Protección contra:
+    - A03:2021 - Injection (salida sanitizada)
+    - A04:2021 - Insecure Design (colas acotadas, máximo de suscriptores)
+    - A05:2021 - Security Misconfiguration (via middleware)
+    - A07:2021 - Rate Limiting (via middleware)
+    - A09:2021 - Security Logging (logging detallado)
+    
+    Returns:
+        StreamingResponse: text/event-stream sin fin
+        
+    Raises:
+        HTTPException: 503 si se alcanzó el máximo de suscriptores
+    """
+    try:
+        since = _last_event_id(request)
+        log_security_event(
+            "products_stream_attempt",
+            request,
+            {"last_event_id": since, "subscribers": len(events)}
+        )
+        
+        if events.full:
+            log_security_event(
+                "products_stream_rejected",
+                request,
+                {"subscribers": len(events), "result": "too_many_subscribers"},
+                level="WARNING"
+            )
+            raise HTTPException(
+                status_code=503,
+                detail="Demasiados suscriptores, intente más tarde"
+            )
+        
+        return StreamingResponse(
+            _stream_changes(request, since),
+            media_type="text/event-stream",
+            headers={"X-Accel-Buffering": "no"}
+        )
+        
+    except Exception as e:
+        if isinstance(e, HTTPException):
+            raise
+            
+        log_security_event(
+            "products_stream_error",
+            request,
+            {
+                "error": str(e),
+                "error_type": type(e).__name__
+            },
+            level="ERROR"
+        )
+        raise
+
 # ENDPOINT 2: GET /products/{id} - Obtener un producto específico
 
 
 @router.get("/products/{product_id}", response_model=Producto)
-#@cache(expire=10)
 async def obtener_producto_por_id(product_id: int, request: Request):
     """
     Obtiene un producto específico con protección contra:
@@ -80,7 +917,9 @@ async def obtener_producto_por_id(product_id: int, request: Request):
         request (Request): Objeto request de FastAPI
         
     Returns:
-        Producto: Producto sanitizado
+        Producto: Producto sanitizado, con su versión en el header `ETag`; 304
+        sin cuerpo si `If-None-Match` ya tiene esa versión. La respuesta
+        serializada se guarda en la caché hasta que el producto cambie.
         
     Raises:
         HTTPException: Si el producto no existe
@@ -93,35 +932,58 @@ async def obtener_producto_por_id(product_id: int, request: Request):
             {"product_id": product_id}
         )
         
-        producto = get_product_by_id(product_id)
-
-        if not producto:
-            # Log de producto no encontrado
+        # Un ID inexistente es 404 antes de evaluar condiciones: su versión
+        # (0 si nunca existió) podría coincidir con un If-None-Match
+        if not await _run_store(product_exists, product_id):
+            raise _product_not_found(request, product_id)
+        
+        # La versión se resuelve sin leer ni serializar el producto
+        etag = _product_etag(product_id)
+        if none_match(request.headers.get("if-none-match"), etag):
             log_security_event(
-                "product_not_found",
+                "product_not_modified",
                 request,
                 {
                     "product_id": product_id,
-                    "result": "not_found"
-                },
-                level="WARNING"
+                    "result": "not_modified"
+                }
             )
-            raise HTTPException(
-                status_code=404,
-                detail=f"Producto con ID {product_id} no encontrado"
+            return Response(status_code=304, headers={"ETag": etag})
+        
+        cached = await response_cache.get(product_key(product_id))
+        if cached is not None:
+            log_security_event(
+                "product_retrieved",
+                request,
+                {
+                    "product_id": product_id,
+                    "cache": "hit",
+                    "result": "success"
+                }
             )
+            return _cached_json(cached, "HIT", _etag_header(etag))
+        
+        version = response_cache.version()
+        body = await _run_store(get_product_json, product_id, _encode_producto)
+
+        if body is None:
+            # Borrado entre la verificación y la lectura
+            raise _product_not_found(request, product_id)
             
+        await response_cache.set(product_key(product_id), body, version, ids=(product_id,))
+        
         # Log de búsqueda exitosa
         log_security_event(
             "product_retrieved",
             request,
             {
                 "product_id": product_id,
+                "cache": "miss",
                 "result": "success"
             }
         )
         
-        return sanitize_output(producto)
+        return _cached_json(body, "MISS", _etag_header(etag))
         
     except Exception as e:
         if isinstance(e, HTTPException):
@@ -140,67 +1002,222 @@ async def obtener_producto_por_id(product_id: int, request: Request):
         )
         raise
 
-# ENDPOINT 3: POST /products - Crear un nuevo producto
+# ENDPOINT 3: POST /products - Crear un nuevo producto
+
+
+@router.post("/products", response_model=Producto, status_code=201)
+async def crear_producto(
+    producto_data: ProductoCreate,
+    request: Request,
+    actor: str = Depends(extraer_actor_desde_token)
+):
+    """
+    Crea un nuevo producto con protección contra:
+    - A03:2021 - Injection (validación de entrada)
+    - A04:2021 - Insecure Design (validación de datos)
+    - A05:2021 - Security Misconfiguration (via middleware)
+    - A07:2021 - Rate Limiting (via middleware)
+    - A09:2021 - Security Logging (logging detallado)
+    - A10:2021 - SSRF (validación de URLs)
+    
+    Args:
+        producto_data (ProductoCreate): Datos del producto a crear
+        request (Request): Objeto request de FastAPI
+        actor (str): Actor que realiza la operación
+        
+    Returns:
+        Producto: Producto creado y sanitizado
+        
+    Raises:
+        HTTPException: Si los datos contienen contenido malicioso
+    """
+    try:
+        # Log del intento de creación
+        log_security_event(
+            "product_create_attempt",
+            request,
+            {"actor": actor, "product_data": producto_data.model_dump()}
+        )
+        
+        # Validar entrada contra inyecciones
+        validate_product_input(producto_data.model_dump())
+        
+        
+        nuevo_producto = await _run_store(
+            create_product, producto_data.model_dump(), created_by=actor)
+        
+        # Log de creación exitosa
+        log_security_event(
+            "product_created",
+            request,
+            {
+                "actor": actor,
+                "product_id": nuevo_producto.get("id"),
+                "result": "success"
+            }
+        )
+        
+        return sanitize_output(nuevo_producto)
+        
+    except Exception as e:
+        # Log de error en la creación
+        log_security_event(
+            "product_create_error",
+            request,
+            {
+                "actor": actor,
+                "error": str(e),
+                "error_type": type(e).__name__
+            },
+            level="ERROR"
+        )
+        raise
+
+# POST /products:bulk - Carga masiva de productos en NDJSON
+
+
+def _validate_bulk_line(linea: Optional[bytes]) -> dict:
+    """
+    Valida una línea de la carga masiva igual que POST /products.
+
+    Raises:
+        ValueError: Si la línea excede el largo máximo
+        ValidationError: Si no es JSON válido o no cumple ProductoCreate
+        HTTPException: Si validate_product_input la rechaza
+    """
+    if linea is None:
+        raise ValueError(f"La línea excede {config.BULK_MAX_LINE_BYTES} bytes")
+    data = ProductoCreate.model_validate_json(linea).model_dump()
+    validate_product_input(data)
+    return data
+
+
+def _bulk_error(numero: int, e: Exception) -> dict:
+    if isinstance(e, ValidationError):
+        detalle = e.errors(include_url=False, include_context=False, include_input=False)
+        return {"line": numero, "status": 422, "error": detalle}
+    if isinstance(e, HTTPException):
+        return {"line": numero, "status": e.status_code, "error": e.detail}
+    return {"line": numero, "status": 400, "error": str(e)}
+
+
+def _flush_bulk(pendientes: List[Tuple[int, Optional[dict], Optional[dict]]], actor: str) -> bytes:
+    """Crea los productos válidos de un lote y serializa un resultado por línea"""
+    creados = iter(create_products(
+        [data for _, data, error in pendientes if error is None],
+        created_by=actor
+    ))
+    resultados = []
+    for numero, data, error in pendientes:
+        resultado = error if error is not None else {
+            "line": numero, "status": 201, "id": next(creados)["id"]
+        }
+        resultados.append(json.dumps(sanitize_output(resultado), ensure_ascii=False))
+    return ("\n".join(resultados) + "\n").encode("utf-8")
+
+
+async def _bulk_load(request: Request, actor: str, resultados) -> Dict[str, int]:
+    """
+    Lee el cuerpo por líneas, valida y crea por lotes, y escribe el resultado
+    de cada línea en `resultados`. Cada lote queda creado al procesarse.
+    """
+    totales = {"created": 0, "failed": 0}
+    pendientes: List[Tuple[int, Optional[dict], Optional[dict]]] = []
+
+    async def flush():
+        totales["created"] += sum(error is None for _, _, error in pendientes)
+        resultados.write(await _run_store(_flush_bulk, pendientes, actor))
+        pendientes.clear()
+
+    async for numero, linea in iter_lines(request.stream(), config.BULK_MAX_LINE_BYTES):
+        try:
+            pendientes.append((numero, _validate_bulk_line(linea), None))
+        except (ValueError, HTTPException) as e:
+            pendientes.append((numero, None, _bulk_error(numero, e)))
+            totales["failed"] += 1
+        if len(pendientes) >= config.BULK_BATCH_SIZE:
+            await flush()
+    if pendientes:
+        await flush()
+    return totales
 
 
-@router.post("/products", response_model=Producto, status_code=201)
-async def crear_producto(
-    producto_data: ProductoCreate,
+def _iter_spooled(archivo, chunk_size: int = 65536):
+    with archivo:
+        archivo.seek(0)
+        while chunk := archivo.read(chunk_size):
+            yield chunk
+
+
+@router.post(
+    "/products:bulk",
+    response_class=StreamingResponse,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"application/x-ndjson": {"schema": {"type": "string"}}}
+        }
+    }
+)
+async def crear_productos_bulk(
     request: Request,
     actor: str = Depends(extraer_actor_desde_token)
 ):
     """
-    Crea un nuevo producto con protección contra:
-    - A03:2021 - Injection (validación de entrada)
-    - A04:2021 - Insecure Design (validación de datos)
+    Crea productos en masa desde un cuerpo NDJSON (un ProductoCreate por
+    línea). El cuerpo se lee de forma incremental, sin acumularlo; las líneas
+    se validan y se insertan por lotes de BULK_BATCH_SIZE con una sola
+    actualización de índices por lote. La respuesta, también NDJSON, entrega
+    un resultado por línea: {"line", "status": 201, "id"} o
+    {"line", "status", "error"}.
+
+    La respuesta se envía a propósito recién al terminar de leer el cuerpo:
+    muchos clientes HTTP/1.1 no leen la respuesta hasta terminar de enviar
+    el cuerpo, y si el servidor transmitiera cada resultado al aplicarlo
+    ambos lados se bloquearían con los buffers llenos. Mientras tanto los
+    resultados se acumulan en un archivo temporal (en memoria hasta 1 MiB,
+    luego en disco), no en la memoria del proceso; cada lote ya queda
+    creado al procesarse.
+    Protección contra:
+    - A03:2021 - Injection (cada línea pasa por validate_product_input)
+    - A04:2021 - Insecure Design (largo máximo por línea, sin acumular el cuerpo)
     - A05:2021 - Security Misconfiguration (via middleware)
     - A07:2021 - Rate Limiting (via middleware)
-    - A09:2021 - Security Logging (logging detallado)
-    - A10:2021 - SSRF (validación de URLs)
+    - A09:2021 - Security Logging (un evento por carga, no por producto)
     
     Args:
-        producto_data (ProductoCreate): Datos del producto a crear
-        request (Request): Objeto request de FastAPI
+        request (Request): Objeto request de FastAPI, leído como stream
         actor (str): Actor que realiza la operación
         
     Returns:
-        Producto: Producto creado y sanitizado
-        
-    Raises:
-        HTTPException: Si los datos contienen contenido malicioso
+        StreamingResponse: Resultados por línea en NDJSON
     """
+    # Resultados retenidos hasta terminar la lectura (ver docstring)
+    resultados = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
     try:
-        # Log del intento de creación
         log_security_event(
-            "product_create_attempt",
+            "products_bulk_attempt",
             request,
-            {"actor": actor, "product_data": producto_data.model_dump()}
+            {"actor": actor, "batch_size": config.BULK_BATCH_SIZE}
         )
         
-        # Validar entrada contra inyecciones
-        validate_product_input(producto_data.model_dump())
-        
-        
-        nuevo_producto = create_product(
-            producto_data.model_dump(), created_by=actor)
+        totales = await _bulk_load(request, actor, resultados)
         
-        # Log de creación exitosa
         log_security_event(
-            "product_created",
+            "products_bulk_created",
             request,
-            {
-                "actor": actor,
-                "product_id": nuevo_producto.get("id"),
-                "result": "success"
-            }
+            {"actor": actor, **totales, "result": "success"}
         )
         
-        return sanitize_output(nuevo_producto)
+        return StreamingResponse(_iter_spooled(resultados), media_type="application/x-ndjson")
         
     except Exception as e:
-        # Log de error en la creación
+        resultados.close()
+        if isinstance(e, HTTPException):
+            raise
+            
         log_security_event(
-            "product_create_error",
+            "products_bulk_error",
             request,
             {
                 "actor": actor,
@@ -219,6 +1236,7 @@ async def update_product_endpoint(
     product_id: int,
     producto: ProductoCreate,
     request: Request,
+    response: Response,
     actor: str = Depends(extraer_actor_desde_token)
 ):
     """
@@ -234,13 +1252,15 @@ async def update_product_endpoint(
         product_id (int): ID del producto a actualizar
         producto (ProductoCreate): Nuevos datos del producto
         request (Request): Objeto request de FastAPI
+        response (Response): Respuesta, para el header ETag
         actor (str): Actor que realiza la operación
         
     Returns:
-        Producto: Producto actualizado y sanitizado
+        Producto: Producto actualizado y sanitizado, con su nueva versión en `ETag`
         
     Raises:
-        HTTPException: Si el producto no existe o los datos contienen contenido malicioso
+        HTTPException: Si el producto no existe, 412 si `If-Match` no es la
+        versión actual, o si los datos contienen contenido malicioso
     """
     try:
         # Log del intento de actualización
@@ -254,7 +1274,7 @@ async def update_product_endpoint(
             }
         )
         
-        product = get_product_by_id(product_id)
+        product = await _run_store(get_product_by_id, product_id)
         if not product:
             # Log de producto no encontrado
             log_security_event(
@@ -272,10 +1292,13 @@ async def update_product_endpoint(
                 detail=f"Producto con ID {product_id} no encontrado"
             )
         
+        # Control de concurrencia optimista (If-Match)
+        _check_if_match(request, product_id, actor)
+        
         # Validar entrada contra inyecciones
         validate_product_input(producto.model_dump())
         
-        updated_product = update_product(product_id, producto.model_dump(), updated_by=actor)
+        updated_product = await _run_store(update_product, product_id, producto.model_dump(), updated_by=actor)
         
         # Log de actualización exitosa
         log_security_event(
@@ -288,6 +1311,7 @@ async def update_product_endpoint(
             }
         )
         
+        response.headers.update(_etag_header(_product_etag(product_id)))
         return sanitize_output(updated_product)
         
     except Exception as e:
@@ -316,6 +1340,7 @@ async def patch_product_endpoint(
     product_id: int,
     changes: dict,
     request: Request,
+    response: Response,
     actor: str = Depends(extraer_actor_desde_token)
 ):
     """
@@ -331,13 +1356,15 @@ async def patch_product_endpoint(
         product_id (int): ID del producto a actualizar
         changes (dict): Cambios parciales a aplicar
         request (Request): Objeto request de FastAPI
+        response (Response): Respuesta, para el header ETag
         actor (str): Actor que realiza la operación
         
     Returns:
-        Producto: Producto actualizado y sanitizado
+        Producto: Producto actualizado y sanitizado, con su nueva versión en `ETag`
         
     Raises:
-        HTTPException: Si el producto no existe o los datos contienen contenido malicioso
+        HTTPException: Si el producto no existe, 412 si `If-Match` no es la
+        versión actual, o si los datos contienen contenido malicioso
     """
     try:
         # Log del intento de actualización parcial
@@ -351,7 +1378,7 @@ async def patch_product_endpoint(
             }
         )
         
-        product = get_product_by_id(product_id)
+        product = await _run_store(get_product_by_id, product_id)
         if not product:
             # Log de producto no encontrado
             log_security_event(
@@ -369,10 +1396,19 @@ async def patch_product_endpoint(
                 detail=f"Producto con ID {product_id} no encontrado"
             )
         
+        # Control de concurrencia optimista (If-Match)
+        _check_if_match(request, product_id, actor)
+        
+        # Validar tipos de los campos (los índices dependen de ellos)
+        try:
+            changes = ProductoPatch.model_validate(changes).model_dump(exclude_unset=True)
+        except ValidationError as e:
+            raise RequestValidationError(e.errors(include_url=False, include_context=False))
+        
         # Validar entrada contra inyecciones
         validate_product_input(changes)
         
-        updated_product = patch_product(product_id, changes, updated_by=actor)
+        updated_product = await _run_store(patch_product, product_id, changes, updated_by=actor)
         
         # Log de actualización parcial exitosa
         log_security_event(
@@ -386,6 +1422,7 @@ async def patch_product_endpoint(
             }
         )
         
+        response.headers.update(_etag_header(_product_etag(product_id)))
         return sanitize_output(updated_product)
         
     except Exception as e:
@@ -406,6 +1443,119 @@ async def patch_product_endpoint(
         )
         raise
 
+# PATCH /products:batch - Actualización parcial de varios productos
+
+
+@router.patch("/products:batch", response_model=ResumenPatchBatch)
+async def patch_products_batch_endpoint(
+    request: Request,
+    items: List[ProductoPatchItem] = Body(..., min_length=1, max_length=config.PATCH_BATCH_MAX_ITEMS),
+    actor: str = Depends(extraer_actor_desde_token)
+):
+    """
+    Actualiza parcialmente varios productos de forma transaccional: se
+    validan todos los cambios y, si alguno falla, no se aplica ninguno. Los
+    cambios se aplican con una sola actualización de índices y agregados.
+    Protección contra:
+    - A01:2021 - Broken Access Control (via middleware)
+    - A03:2021 - Injection (validación de entrada de cada cambio)
+    - A04:2021 - Insecure Design (todo o nada, tamaño de lote acotado)
+    - A05:2021 - Security Misconfiguration (via middleware)
+    - A07:2021 - Rate Limiting (via middleware)
+    - A09:2021 - Security Logging (logging detallado)
+    
+    Args:
+        items (List[ProductoPatchItem]): Lista de {id, changes}
+        request (Request): Objeto request de FastAPI
+        actor (str): Actor que realiza la operación
+        
+    Returns:
+        ResumenPatchBatch: Cantidad de productos actualizados y campos modificados
+        
+    Raises:
+        HTTPException: 400 si hay IDs repetidos o contenido malicioso, 404 si
+        algún producto no existe
+    """
+    try:
+        log_security_event(
+            "products_batch_patch_attempt",
+            request,
+            {"actor": actor, "count": len(items)}
+        )
+        
+        ids = [item.id for item in items]
+        repetidos = sorted(i for i, veces in Counter(ids).items() if veces > 1)
+        if repetidos:
+            raise HTTPException(
+                status_code=400,
+                detail=f"IDs repetidos en el lote: {repetidos}"
+            )
+        
+        cambios = []
+        for item in items:
+            changes = item.changes.model_dump(exclude_unset=True)
+            # Validar entrada contra inyecciones
+            try:
+                validate_product_input(changes)
+            except HTTPException as e:
+                raise HTTPException(
+                    status_code=e.status_code,
+                    detail=f"Producto {item.id}: {e.detail}"
+                )
+            cambios.append((item.id, changes))
+        
+        actualizados = await _run_store(patch_products, cambios, updated_by=actor)
+        if actualizados is None:
+            faltantes = [i for i in ids if await _run_store(get_product_by_id, i) is None]
+            log_security_event(
+                "product_not_found",
+                request,
+                {
+                    "product_ids": faltantes,
+                    "actor": actor,
+                    "result": "not_found"
+                },
+                level="WARNING"
+            )
+            raise HTTPException(
+                status_code=404,
+                detail=f"Productos no encontrados: {faltantes}"
+            )
+        
+        campos: Dict[str, int] = {}
+        for _, changes in cambios:
+            for campo in changes:
+                campos[campo] = campos.get(campo, 0) + 1
+        
+        log_security_event(
+            "products_batch_patched",
+            request,
+            {
+                "actor": actor,
+                "count": len(actualizados),
+                "fields_updated": campos,
+                "result": "success"
+            }
+        )
+        
+        return {"updated": len(actualizados), "fields_updated": campos}
+        
+    except Exception as e:
+        if isinstance(e, HTTPException):
+            raise
+            
+        log_security_event(
+            "products_batch_patch_error",
+            request,
+            {
+                "actor": actor,
+                "error": str(e),
+                "error_type": type(e).__name__
+            },
+            level="ERROR"
+        )
+        raise
+
 # DELETE /products/{id} - Eliminar producto
 
 
@@ -431,7 +1581,8 @@ async def delete_product_endpoint(
         None
         
     Raises:
-        HTTPException: Si el producto no existe
+        HTTPException: Si el producto no existe, 412 si `If-Match` no es la
+        versión actual
     """
     try:
         # Log del intento de eliminación
@@ -444,7 +1595,7 @@ async def delete_product_endpoint(
             }
         )
         
-        product = get_product_by_id(product_id)
+        product = await _run_store(get_product_by_id, product_id)
         if not product:
             # Log de producto no encontrado
             log_security_event(
@@ -461,6 +1612,9 @@ async def delete_product_endpoint(
                 status_code=404,
                 detail=f"Producto con ID {product_id} no encontrado"
             )
+        
+        # Control de concurrencia optimista (If-Match)
+        _check_if_match(request, product_id, actor)
             
         # Guardar datos del producto antes de eliminar para el log
         product_data = {
@@ -469,7 +1623,7 @@ async def delete_product_endpoint(
             "last_modified": product.get("updated_at", "unknown")
         }
         
-        delete_product(product_id)
+        await _run_store(delete_product, product_id)
         
         # Log de eliminación exitosalog_security_event
         log_security_event(
@@ -502,3 +1656,219 @@ async def delete_product_endpoint(
             level="ERROR"
         )
         raise
+
+
+# Reservas de stock
+
+
+@router.post("/products/stock/reserve", response_model=Reserva, status_code=201)
+async def reservar_stock(
+    request: Request,
+    items: List[ReservaItem] = Body(..., min_length=1, max_length=config.RESERVATION_MAX_ITEMS),
+    actor: str = Depends(extraer_actor_desde_token)
+):
+    """
+    Reserva stock de varios productos en una sola operación atómica: se
+    verifica y descuenta el stock de todas las líneas, o de ninguna. La
+    reserva expira tras RESERVATION_TTL_SECONDS y su stock se devuelve.
+    Protección contra:
+    - A01:2021 - Broken Access Control (via middleware)
+    - A04:2021 - Insecure Design (todo o nada, sin sobreventa bajo concurrencia)
+    - A05:2021 - Security Misconfiguration (via middleware)
+    - A07:2021 - Rate Limiting (via middleware)
+    - A09:2021 - Security Logging (logging detallado)
+    
+    Args:
+        items (List[ReservaItem]): Lista de {id, qty}
+        request (Request): Objeto request de FastAPI
+        actor (str): Actor que realiza la operación
+        
+    Returns:
+        Reserva: ID de la reserva, vencimiento y líneas reservadas
+        
+    Raises:
+        HTTPException: 404 si algún producto no existe, 409 si el stock no alcanza
+    """
+    try:
+        log_security_event(
+            "stock_reserve_attempt",
+            request,
+            {"actor": actor, "count": len(items)}
+        )
+        
+        try:
+            reserva = await _run_store(reserve_stock, [(item.id, item.qty) for item in items], reserved_by=actor)
+        except ProductsNotFound as e:
+            log_security_event(
+                "product_not_found",
+                request,
+                {
+                    "product_ids": e.ids,
+                    "actor": actor,
+                    "result": "not_found"
+                },
+                level="WARNING"
+            )
+            raise HTTPException(
+                status_code=404,
+                detail=f"Productos no encontrados: {e.ids}"
+            )
+        except InsufficientStock as e:
+            log_security_event(
+                "stock_reserve_rejected",
+                request,
+                {
+                    "actor": actor,
+                    "faltantes": e.faltantes,
+                    "result": "insufficient_stock"
+                },
+                level="WARNING"
+            )
+            raise HTTPException(
+                status_code=409,
+                detail={"message": "Stock insuficiente", "faltantes": e.faltantes}
+            )
+        
+        log_security_event(
+            "stock_reserved",
+            request,
+            {
+                "actor": actor,
+                "reservation_id": reserva["reservation_id"],
+                "items": reserva["items"],
+                "result": "success"
+            }
+        )
+        
+        return reserva
+        
+    except Exception as e:
+        if isinstance(e, HTTPException):
+            raise
+            
+        log_security_event(
+            "stock_reserve_error",
+            request,
+            {
+                "actor": actor,
+                "error": str(e),
+                "error_type": type(e).__name__
+            },
+            level="ERROR"
+        )
+        raise
+
+
+async def _cerrar_reserva(request: Request, reservation_id: str, actor: str, accion: str, cerrar) -> dict:
+    """
+    Confirma o libera una reserva con el logging común; 404 si no está
+    vigente y 403 si la creó otro actor y `actor` no es administrador.
+    """
+    try:
+        log_security_event(
+            f"stock_reservation_{accion}_attempt",
+            request,
+            {"actor": actor, "reservation_id": reservation_id}
+        )
+        
+        propia = await _run_store(is_reservation_owner, reservation_id, actor)
+        if propia is False and actor not in config.ADMIN_ACTORS:
+            log_security_event(
+                "stock_reservation_forbidden",
+                request,
+                {
+                    "actor": actor,
+                    "reservation_id": reservation_id,
+                    "result": "forbidden"
+                },
+                level="WARNING"
+            )
+            raise HTTPException(
+                status_code=403,
+                detail=f"La reserva {reservation_id} pertenece a otro actor"
+            )
+        
+        reserva = await _run_store(cerrar, reservation_id)
+        if reserva is None:
+            log_security_event(
+                "stock_reservation_not_found",
+                request,
+                {
+                    "actor": actor,
+                    "reservation_id": reservation_id,
+                    "result": "not_found"
+                },
+                level="WARNING"
+            )
+            raise HTTPException(
+                status_code=404,
+                detail=f"Reserva {reservation_id} no encontrada o expirada"
+            )
+        
+        log_security_event(
+            f"stock_reservation_{accion}",
+            request,
+            {
+                "actor": actor,
+                "reservation_id": reservation_id,
+                "items": reserva["items"],
+                "result": "success"
+            }
+        )
+        return reserva
+        
+    except Exception as e:
+        if isinstance(e, HTTPException):
+            raise
+            
+        log_security_event(
+            f"stock_reservation_{accion}_error",
+            request,
+            {
+                "actor": actor,
+                "reservation_id": reservation_id,
+                "error": str(e),
+                "error_type": type(e).__name__
+            },
+            level="ERROR"
+        )
+        raise
+
+
+@router.post("/products/stock/reservations/{reservation_id}/confirm", response_model=Reserva)
+async def confirmar_reserva(
+    reservation_id: str,
+    request: Request,
+    actor: str = Depends(extraer_actor_desde_token)
+):
+    """
+    Confirma una reserva vigente: el stock descontado queda firme.
+    Protección contra:
+    - A01:2021 - Broken Access Control (solo su creador o un administrador)
+    - A07:2021 - Rate Limiting (via middleware)
+    - A09:2021 - Security Logging (logging detallado)
+    
+    Raises:
+        HTTPException: 403 si la reserva es de otro actor, 404 si no existe o ya expiró
+    """
+    return await _cerrar_reserva(request, reservation_id, actor, "confirmed", confirm_reservation)
+
+
+@router.delete("/products/stock/reservations/{reservation_id}", status_code=204)
+async def liberar_reserva(
+    reservation_id: str,
+    request: Request,
+    actor: str = Depends(extraer_actor_desde_token)
+):
+    """
+    Libera una reserva vigente y devuelve su stock.
+    Protección contra:
+    - A01:2021 - Broken Access Control (solo su creador o un administrador)
+    - A07:2021 - Rate Limiting (via middleware)
+    - A09:2021 - Security Logging (logging detallado)
+    
+    Raises:
+        HTTPException: 403 si la reserva es de otro actor, 404 si no existe o ya expiró
+    """
+    await _cerrar_reserva(request, reservation_id, actor, "released", release_reservation)
+    return None
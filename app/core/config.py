@@ -14,6 +14,80 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
 
+# Rate limiting (solicitudes por segundo por IP)
+RATE_LIMIT_PER_SECOND = int(os.getenv("RATE_LIMIT_PER_SECOND", "10"))
+
+# Paginación por cursor
+PAGE_SIZE_DEFAULT = int(os.getenv("PAGE_SIZE_DEFAULT", "50"))
+PAGE_SIZE_MAX = int(os.getenv("PAGE_SIZE_MAX", "500"))
+
+# Carga masiva NDJSON (POST /products:bulk)
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "500"))
+BULK_MAX_LINE_BYTES = int(os.getenv("BULK_MAX_LINE_BYTES", "65536"))
+
+# Actualización parcial por lotes (PATCH /products:batch)
+PATCH_BATCH_MAX_ITEMS = int(os.getenv("PATCH_BATCH_MAX_ITEMS", "5000"))
+
+# Reservas de stock (POST /products/stock/reserve)
+RESERVATION_TTL_SECONDS = int(os.getenv("RESERVATION_TTL_SECONDS", "900"))
+RESERVATION_SWEEP_SECONDS = int(os.getenv("RESERVATION_SWEEP_SECONDS", "30"))
+RESERVATION_MAX_ITEMS = int(os.getenv("RESERVATION_MAX_ITEMS", "1000"))
+
+# Registro de cambios (GET /products/changes): cantidad de cambios retenidos
+CHANGELOG_CAPACITY = int(os.getenv("CHANGELOG_CAPACITY", "10000"))
+
+# Stream SSE de cambios (GET /products/stream)
+SSE_QUEUE_SIZE = int(os.getenv("SSE_QUEUE_SIZE", "256"))
+SSE_MAX_SUBSCRIBERS = int(os.getenv("SSE_MAX_SUBSCRIBERS", "1000"))
+SSE_KEEPALIVE_SECONDS = int(os.getenv("SSE_KEEPALIVE_SECONDS", "15"))
+
+# Caché de respuestas de lectura (GET /products, GET /products/{id})
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024"))
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "300"))
+
+# Escapar HTML una sola vez al escribir (create/update/patch) en lugar de en
+# cada respuesta. Los productos se guardan escapados y marcados; al arrancar
+# el catálogo se alinea con el modo configurado
+SANITIZE_ON_WRITE = os.getenv("SANITIZE_ON_WRITE", "false").lower() == "true"
+
+# Clase de respuesta JSON por defecto: "json" (JSONResponse de FastAPI),
+# "orjson" o "msgspec"
+JSON_RESPONSE_CLASS = os.getenv("JSON_RESPONSE_CLASS", "json")
+
+# Política de caché HTTP (Cache-Control) para lecturas públicas, por
+# plantilla de ruta del router de productos. Solo se aplica a GET/HEAD
+# exitosos de las rutas listadas; el resto de las
+# respuestas (escrituras, errores, rutas no listadas) usa no-store. Un
+# valor vacío deshabilita la caché de esa ruta.
+CACHE_CONTROL_NO_STORE = "no-store, no-cache, must-revalidate, proxy-revalidate"
+CACHE_CONTROL_PRODUCT = os.getenv(
+    "CACHE_CONTROL_PRODUCT", "public, max-age=30, stale-while-revalidate=60"
+) or CACHE_CONTROL_NO_STORE
+CACHE_CONTROL_PRODUCT_LIST = os.getenv(
+    "CACHE_CONTROL_PRODUCT_LIST", "public, max-age=10, stale-while-revalidate=30"
+) or CACHE_CONTROL_NO_STORE
+CACHE_POLICIES = {
+    "/products/{product_id}": CACHE_CONTROL_PRODUCT,
+    "/products": CACHE_CONTROL_PRODUCT_LIST,
+    "/products/search": CACHE_CONTROL_PRODUCT_LIST,
+    "/products/facets": CACHE_CONTROL_PRODUCT_LIST,
+    "/products/stats": CACHE_CONTROL_PRODUCT_LIST,
+    "/products/aggregates": CACHE_CONTROL_PRODUCT_LIST,
+}
+
+# Actores que pueden confirmar o liberar reservas de otros (separados por coma)
+ADMIN_ACTORS = frozenset(a.strip() for a in os.getenv("ADMIN_ACTORS", "").split(",") if a.strip())
+
+# Almacenamiento de productos: "memory" (por defecto) o "sqlite"
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "memory").lower()
+SQLITE_PATH = os.getenv("SQLITE_PATH", "products.db")
+SQLITE_POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "4"))
+
+# Persistencia del almacén en memoria (WAL + snapshots); vacío = deshabilitada
+PERSISTENCE_DIR = os.getenv("PERSISTENCE_DIR", "")
+WAL_FSYNC_INTERVAL_MS = int(os.getenv("WAL_FSYNC_INTERVAL_MS", "50"))
+SNAPSHOT_INTERVAL_SECONDS = int(os.getenv("SNAPSHOT_INTERVAL_SECONDS", "300"))
+
 # Configuración del servidor
 HOST = os.getenv("HOST")
 PORT = int(os.getenv("PORT"))
@@ -32,4 +106,10 @@ if not ALGORITHM:
     raise ValueError("ALGORITHM no está definido en las variables de entorno")
 
 if not HOST:
-    raise ValueError("HOST no está definido en las variables de entorno")
\ No newline at end of file
+    raise ValueError("HOST no está definido en las variables de entorno")
+
+if STORAGE_BACKEND not in ("memory", "sqlite"):
+    raise ValueError("STORAGE_BACKEND debe ser 'memory' o 'sqlite'")
+
+if JSON_RESPONSE_CLASS not in ("json", "orjson", "msgspec"):
+    raise ValueError("JSON_RESPONSE_CLASS debe ser 'json', 'orjson' o 'msgspec'")
@@ -0,0 +1,221 @@
+from abc import ABC, abstractmethod
+from itertools import islice
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+
+class ProductRepository(ABC):
+    """
+    Interface para el almacenamiento de productos.
+
+    Los productos se intercambian como dict con la forma de `Producto`.
+    Los filtros de igualdad aceptados son `categoria`, `marca` y `specs`
+    (lista de pares (atributo, valor)); los valores None se ignoran.
+    """
+
+    SORTS = ("precio", "-precio")
+    GROUP_BY = ("categoria", "marca")
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Cantidad de productos almacenados"""
+        pass
+
+    def __iter__(self) -> Iterator[dict]:
+        """Todos los productos en orden de ID"""
+        return self.scan()
+
+    def __contains__(self, product_id: int) -> bool:
+        return self.get(product_id) is not None
+
+    @abstractmethod
+    def get(self, product_id: int) -> Optional[dict]:
+        """Obtiene un producto por ID"""
+        pass
+
+    @abstractmethod
+    def put(self, product: dict) -> dict:
+        """Inserta o reemplaza un producto completo"""
+        pass
+
+    def put_many(self, products: Sequence[dict]) -> Sequence[dict]:
+        """
+        Inserta o reemplaza un lote de productos. Las implementaciones pueden
+        sobrescribirlo para actualizar sus índices una sola vez por lote.
+        """
+        for product in products:
+            self.put(product)
+        return products
+
+    @abstractmethod
+    def remove(self, product_id: int) -> Optional[dict]:
+        """Elimina un producto y lo retorna, o None si no existía"""
+        pass
+
+    @abstractmethod
+    def max_id(self) -> int:
+        """Mayor ID almacenado (0 si no hay productos)"""
+        pass
+
+    @abstractmethod
+    def allocate_id(self) -> int:
+        """
+        Reserva el siguiente ID para un producto nuevo.
+
+        Los IDs son crecientes y no se reutilizan, ni tras borrar el producto
+        con el mayor ID; es seguro llamarlo desde varios hilos a la vez.
+        """
+        pass
+
+    @abstractmethod
+    def scan(
+        self,
+        after: Optional[Sequence] = None,
+        sort: Optional[str] = None,
+        precio_min: Optional[float] = None,
+        precio_max: Optional[float] = None,
+        limit: Optional[int] = None,
+        **filtros
+    ) -> Iterator[dict]:
+        """
+        Recorre los productos que cumplen los filtros, en orden de ID o, con
+        sort "precio"/"-precio", por (precio, id). `after` es la clave de
+        orden (ver sort_key) del último producto ya entregado y `limit` una
+        cota opcional de resultados.
+        """
+        pass
+
+    @abstractmethod
+    def filter_ids(self, **filtros) -> List[int]:
+        """IDs que cumplen los filtros de igualdad, en orden de ID"""
+        pass
+
+    @abstractmethod
+    def facet_counts(
+        self,
+        precio_min: Optional[float] = None,
+        precio_max: Optional[float] = None,
+        **filtros
+    ) -> Dict[str, Dict[str, int]]:
+        """Conteo por atributo y valor de los productos que cumplen los filtros"""
+        pass
+
+    @abstractmethod
+    def search(self, query: str, limit: int) -> List[dict]:
+        """Productos más relevantes para una búsqueda de texto libre"""
+        pass
+
+    @abstractmethod
+    def group_stats(self, group_by: str, stock_bajo: int) -> Dict[str, Dict[str, float]]:
+        """
+        Agregados de inventario por `categoria` o `marca`: productos,
+        stock_total, valor_stock, precio_promedio, precio_min, precio_max y
+        stock_bajo (productos con stock menor a `stock_bajo`)
+        """
+        pass
+
+    @abstractmethod
+    def aggregates(self, group_by: str) -> Dict[str, Dict[str, float]]:
+        """
+        Agregados mantenidos por `categoria` o `marca`: productos,
+        stock_total, precio_min, precio_max y precio_promedio
+        """
+        pass
+
+    @abstractmethod
+    def reserve_stock(self, reservation: dict, timestamp: str) -> List[dict]:
+        """
+        Descuenta el stock de las líneas de `reservation` y la guarda, en una
+        sola operación atómica también frente a otros procesos que comparten
+        el almacenamiento. Retorna los productos actualizados.
+
+        Raises:
+            ProductsNotFound: Si algún producto no existe
+            InsufficientStock: Si algún producto no alcanza; no se descuenta nada
+        """
+        pass
+
+    @abstractmethod
+    def finish_reservation(
+        self,
+        reservation_id: str,
+        restore: bool,
+        timestamp: str
+    ) -> Optional[Tuple[dict, List[dict]]]:
+        """
+        Cierra una reserva guardada, devolviendo su stock si `restore`.
+        Retorna la reserva y los productos actualizados, o None si no existe.
+        """
+        pass
+
+    @abstractmethod
+    def get_reservation(self, reservation_id: str) -> Optional[dict]:
+        """Reserva guardada (con su `actor`), o None si no existe"""
+        pass
+
+    @abstractmethod
+    def expire_reservations(self, now: float, timestamp: str) -> List[Tuple[dict, List[dict]]]:
+        """Cierra devolviendo su stock las reservas con `deadline` <= `now`"""
+        pass
+
+    @abstractmethod
+    def reservation_count(self) -> int:
+        """Cantidad de reservas guardadas"""
+        pass
+
+    def page(
+        self,
+        limit: int,
+        after: Optional[Sequence] = None,
+        sort: Optional[str] = None,
+        **filtros
+    ) -> Tuple[List[dict], Optional[tuple]]:
+        """
+        Página de hasta `limit` productos posteriores a la clave `after`.
+
+        Retorna los productos y la clave desde la cual continuar, o None si no
+        quedan más.
+        """
+        window = list(islice(self.scan(after, sort, limit=limit + 1, **filtros), limit + 1))
+        items = window[:limit]
+        next_after = self.sort_key(items[-1], sort) if len(window) > limit else None
+        return items, next_after
+
+    def get_json(self, product_id: int, encode: Callable[[dict], bytes]) -> Optional[bytes]:
+        """
+        Producto codificado con `encode`, o None si no existe. Un almacén
+        puede conservar la codificación hasta que el producto cambie.
+        """
+        product = self.get(product_id)
+        return encode(product) if product is not None else None
+
+    def scan_json(
+        self,
+        encode: Callable[[dict], bytes],
+        after: Optional[Sequence] = None,
+        sort: Optional[str] = None,
+        **kwargs
+    ) -> Iterator[Tuple[tuple, bytes]]:
+        """Como scan, pero entrega pares (clave de orden, producto codificado)"""
+        for product in self.scan(after, sort, **kwargs):
+            yield self.sort_key(product, sort), encode(product)
+
+    def page_json(
+        self,
+        encode: Callable[[dict], bytes],
+        limit: int,
+        after: Optional[Sequence] = None,
+        sort: Optional[str] = None,
+        **filtros
+    ) -> Tuple[List[Tuple[tuple, bytes]], Optional[tuple]]:
+        """Como page, con los productos codificados por scan_json"""
+        window = list(islice(self.scan_json(encode, after, sort, limit=limit + 1, **filtros), limit + 1))
+        items = window[:limit]
+        next_after = items[-1][0] if len(window) > limit else None
+        return items, next_after
+
+    @staticmethod
+    def sort_key(product: dict, sort: Optional[str] = None) -> tuple:
+        """Clave de orden de un producto para usar como cursor"""
+        if sort is None:
+            return (product["id"],)
+        return (product["precio"], product["id"])
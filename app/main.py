@@ -1,3 +1,4 @@
+import asyncio
 from collections.abc import AsyncIterator
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
@@ -9,6 +10,10 @@ from fastapi_cache.backends.inmemory import InMemoryBackend
 from fastapi_cache import FastAPICache
 from contextlib import asynccontextmanager
 from app.middleware.security import SecurityMiddleware
+from app.services import database
+from app.services.persistence import snapshot_periodically
+from app.services.reservations import expire_periodically
+from app.utils.responses import response_class
 from app.core.services.security_services import (
     InMemoryRateLimiter,
     FileSecurityLogger,
@@ -19,7 +24,24 @@ def create_application() -> FastAPI:
     @asynccontextmanager
     async def lifespan(_: FastAPI) -> AsyncIterator[None]:
         FastAPICache.init(InMemoryBackend(), prefix="fastapi-cache")
+
+        # Snapshots periódicos del almacén en memoria cuando hay WAL
+        journal = getattr(database.db, "journal", None)
+        snapshots = None
+        if journal is not None:
+            snapshots = asyncio.create_task(snapshot_periodically(
+                database.db, journal, config.SNAPSHOT_INTERVAL_SECONDS
+            ))
+        # Devuelve el stock de reservas vencidas aunque no haya tráfico
+        expiraciones = asyncio.create_task(expire_periodically(
+            database.reservations, config.RESERVATION_SWEEP_SECONDS, database.BLOCKING_STORAGE
+        ))
         yield
+        expiraciones.cancel()
+        if snapshots is not None:
+            snapshots.cancel()
+            journal.sync()
+            journal.close()
 
 
     """
@@ -31,6 +53,7 @@ def create_application() -> FastAPI:
         description="API REST para evaluación INFO1189 - Implementa principios REST y Clean Architecture",
         docs_url="/docs",
         redoc_url="/redoc",
+        default_response_class=response_class(config.JSON_RESPONSE_CLASS),
         lifespan=lifespan
     )
 
@@ -48,7 +71,7 @@ def create_application() -> FastAPI:
     # Middleware de seguridad personalizado
     app.add_middleware(
         SecurityMiddleware,
-        rate_limiter=InMemoryRateLimiter(requests_per_second=10),
+        rate_limiter=InMemoryRateLimiter(requests_per_second=config.RATE_LIMIT_PER_SECOND),
         security_logger=FileSecurityLogger(log_file="security.log"),
         url_validator=SSRFURLValidator(
             allowed_schemes=['https', 'http'],  # Permitir http para desarrollo local
@@ -98,12 +121,14 @@ async def root():
 async def health_check():
     """
     Endpoint de health check.
-    Útil para verificar que la API está funcionando.
+    Útil para verificar que la API está funcionando. Incluye los contadores
+    de la caché de respuestas (aciertos, fallos, expulsiones, invalidaciones).
     """
     return {
         "status": "healthy",
         "timestamp": "2024-10-01T00:00:00Z",
-        "version": config.API_VERSION
+        "version": config.API_VERSION,
+        "response_cache": products.response_cache.stats()
     }
 
 if __name__ == "__main__":
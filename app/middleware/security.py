@@ -1,6 +1,7 @@
 from fastapi import HTTPException, Request, Response
 from starlette.middleware.base import BaseHTTPMiddleware
-from typing import Callable
+from typing import Callable, Dict
+from app.core import config
 from app.core.interfaces.security import SecurityService, RateLimiter, SecurityLogger, URLValidator
 from app.core.services.security_services import InMemoryRateLimiter, FileSecurityLogger, SSRFURLValidator
 
@@ -27,12 +28,15 @@ class SecurityMiddleware(BaseHTTPMiddleware, SecurityService):
         app,
         rate_limiter: RateLimiter = None,
         security_logger: SecurityLogger = None,
-        url_validator: URLValidator = None
+        url_validator: URLValidator = None,
+        cache_policies: Dict[str, str] = None
     ):
         super().__init__(app)
         self.rate_limiter = rate_limiter or InMemoryRateLimiter()
         self.security_logger = security_logger or FileSecurityLogger()
         self.url_validator = url_validator or SSRFURLValidator()
+        # Plantilla de ruta del router (p. ej. /products/{product_id}) -> Cache-Control
+        self.cache_policies = config.CACHE_POLICIES if cache_policies is None else cache_policies
         
         # Headers de seguridad predefinidos
         self.security_headers = {
@@ -42,9 +46,6 @@ class SecurityMiddleware(BaseHTTPMiddleware, SecurityService):
             'Strict-Transport-Security': 'max-age=31536000; includeSubDomains',
             #'Content-Security-Policy': "default-src 'self'", # al activarlo, solo admite archivos alojados en el mismo servidor.
             'Referrer-Policy': 'strict-origin-when-cross-origin',
-            'Cache-Control': 'no-store, no-cache, must-revalidate, proxy-revalidate',
-            'Pragma': 'no-cache',
-            'Expires': '0',
             'X-Permitted-Cross-Domain-Policies': 'none',
             'Cross-Origin-Embedder-Policy': 'require-corp',
             'Cross-Origin-Opener-Policy': 'same-origin',
@@ -105,6 +106,48 @@ class SecurityMiddleware(BaseHTTPMiddleware, SecurityService):
             response.headers[header] = value
         return response
     
+    def cache_control_for(self, request: Request, response: Response) -> str:
+        """
+        Política de caché de una respuesta según la ruta que la atendió.
+        Solo las lecturas exitosas (200/304) de rutas configuradas son
+        cacheables; escrituras, errores y rutas no listadas usan no-store.
+        
+        Args:
+            request (Request): Solicitud atendida
+            response (Response): Respuesta generada
+            
+        Returns:
+            str: Valor del header Cache-Control
+        """
+        if request.method in ("GET", "HEAD") and response.status_code in (200, 304):
+            # El router deja en el scope la ruta que atendió la solicitud
+            route = request.scope.get("route")
+            policy = self.cache_policies.get(getattr(route, "path", None))
+            if policy:
+                return policy
+        return config.CACHE_CONTROL_NO_STORE
+    
+    def apply_cache_policy(self, request: Request, response: Response) -> Response:
+        """
+        Agrega los headers de caché sin reemplazar los que fijó el handler
+        
+        Args:
+            request (Request): Solicitud atendida
+            response (Response): Respuesta a completar
+            
+        Returns:
+            Response: Respuesta con Cache-Control (y Pragma/Expires si no es cacheable)
+        """
+        if "cache-control" in response.headers:
+            return response
+        cache_control = self.cache_control_for(request, response)
+        response.headers["Cache-Control"] = cache_control
+        if cache_control == config.CACHE_CONTROL_NO_STORE:
+            # Compatibilidad con cachés HTTP/1.0
+            response.headers.setdefault("Pragma", "no-cache")
+            response.headers.setdefault("Expires", "0")
+        return response
+    
     async def dispatch(self, request: Request, call_next: Callable) -> Response:
         """
         Procesa una solicitud aplicando todas las medidas de seguridad
@@ -143,8 +186,9 @@ class SecurityMiddleware(BaseHTTPMiddleware, SecurityService):
             # Procesar la solicitud
             response = await call_next(request)
             
-            # Mejorar la respuesta con headers de seguridad
+            # Mejorar la respuesta con headers de seguridad y de caché
             response = self.enhance_response(response)
+            response = self.apply_cache_policy(request, response)
             
             # Log de finalización exitosa
             self.security_logger.log_event(
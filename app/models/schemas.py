@@ -1,5 +1,6 @@
-from pydantic import BaseModel
-from typing import List, Optional
+import msgspec
+from pydantic import BaseModel, Field, field_validator
+from typing import Dict, List, Literal, Optional
 from datetime import datetime
 
 
@@ -25,10 +26,112 @@ class Producto(BaseModel):
     updated_by: Optional[str] = None # Identificador del último modificador
 
 
-class ProductoCreate(BaseModel):
+# Espejos msgspec de Producto para las lecturas frecuentes: validan tipos y
+# codifican a JSON mucho más rápido que pydantic, con la misma salida (salvo
+# la notación de exponentes de floats desde 1e16). No aparecen en OpenAPI:
+# las rutas siguen declarando response_model=Producto
+class DetallesStruct(msgspec.Struct):
+    atributo: str
+    valor: str
+
+class EspecificacionesStruct(msgspec.Struct):
+    grupo: str
+    detalles: List[DetallesStruct]
+
+class ProductoStruct(msgspec.Struct):
+    id: int
     nombre: str
     precio: float
     categoria: str
     marca: str
     stock: int
+    especificaciones: List[EspecificacionesStruct]
+    created_at: str
+    updated_at: str
+    created_by: Optional[str] = None
+    updated_by: Optional[str] = None
+
+
+# Mayor valor que guardan las columnas int64 del almacén (ver ColumnStore)
+INT64_MAX = 2 ** 63 - 1
+
+
+class ProductoCreate(BaseModel):
+    nombre: str
+    precio: float = Field(..., ge=0, allow_inf_nan=False)
+    categoria: str
+    marca: str
+    stock: int = Field(..., ge=0, le=INT64_MAX)
     especificaciones: List[Especificaciones] = []
+
+
+class ProductoPatch(BaseModel):
+    nombre: Optional[str] = None
+    precio: Optional[float] = Field(None, ge=0, allow_inf_nan=False)
+    categoria: Optional[str] = None
+    marca: Optional[str] = None
+    stock: Optional[int] = Field(None, ge=0, le=INT64_MAX)
+    especificaciones: Optional[List[Especificaciones]] = None
+
+    @field_validator("*")
+    @classmethod
+    def rechazar_null(cls, value):
+        # Omitir un campo lo deja igual; un null explícito no es un valor válido
+        if value is None:
+            raise ValueError("El campo no admite null")
+        return value
+
+
+class ProductoPatchItem(BaseModel):
+    id: int
+    changes: ProductoPatch
+
+
+class ResumenPatchBatch(BaseModel):
+    updated: int
+    fields_updated: Dict[str, int] # Campo -> cantidad de productos que lo cambiaron
+
+
+class EstadisticasGrupo(BaseModel):
+    productos: int
+    stock_total: int
+    valor_stock: float # Suma de precio x stock
+    precio_promedio: float
+    precio_min: float
+    precio_max: float
+    stock_bajo: int # Productos bajo el umbral de stock
+
+
+class AgregadosGrupo(BaseModel):
+    productos: int
+    stock_total: int
+    precio_min: float
+    precio_max: float
+    precio_promedio: float
+
+
+class ReservaItem(BaseModel):
+    id: int
+    qty: int = Field(..., gt=0)
+
+
+class Reserva(BaseModel):
+    reservation_id: str
+    expires_at: datetime
+    items: List[ReservaItem]
+
+
+class CambioProducto(BaseModel):
+    seq: int
+    op: Literal["upsert", "delete"]
+    action: Literal["create", "update", "patch", "stock", "delete"]
+    id: int
+    at: datetime
+    product: Optional[Producto] = None # None en las eliminaciones (lápida)
+
+
+class CambiosProductos(BaseModel):
+    changes: List[CambioProducto]
+    next_since: str # Cursor "<epoch>-<seq>" para `since` en la siguiente consulta
+    last_seq: int
+    has_more: bool
@@ -0,0 +1,140 @@
+"""
+Registro de cambios del catálogo (change feed).
+
+Cada mutación agrega una entrada con un número de secuencia monótono a un
+buffer circular de capacidad fija: las entradas más antiguas se descartan
+al llenarse. Un cliente que consulta `since=<seq>` recibe solo los cambios
+posteriores; si alguno de ellos ya fue descartado debe resincronizar el
+catálogo completo.
+
+Las secuencias vuelven a empezar en cada proceso, así que hacia afuera se
+exponen como cursores "<epoch>-<seq>": un cursor de otro proceso exige
+resincronizar en lugar de interpretarse como una secuencia local.
+"""
+import threading
+import uuid
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+
+class ResyncRequired(LookupError):
+    """Los cambios pedidos ya no están en el buffer (o la secuencia es de otro proceso)"""
+
+    def __init__(self, since, oldest_seq: int, last_seq: int):
+        super().__init__(f"Secuencia {since} fuera del registro ({oldest_seq}..{last_seq})")
+        self.since = since
+        self.oldest_seq = oldest_seq
+        self.last_seq = last_seq
+
+
+class ChangeLog:
+    """
+    Buffer circular de cambios con secuencia monótona.
+
+    La entrada con secuencia `seq` ocupa la posición `seq % capacity`, así
+    que leer desde una secuencia cuesta O(k) en los k cambios devueltos.
+    Las entradas son {"seq", "op", "action", "id", "at", "product"}: op
+    "upsert" lleva el producto completo tras el cambio; op "delete" es una
+    lápida con product None. `action` indica la operación que lo originó
+    (create, update, patch, stock o delete).
+
+    También lleva las versiones: la del catálogo es last_seq y la de cada
+    producto es la secuencia de su último cambio (0 si no cambió desde el
+    arranque). `epoch` distingue a cada proceso, ya que las secuencias
+    vuelven a empezar al reiniciar.
+    """
+
+    def __init__(self, capacity: int):
+        if capacity < 1:
+            raise ValueError("capacity debe ser mayor que 0")
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._entries: List[Optional[dict]] = [None] * capacity
+        self._last_seq = 0
+        self._versions: Dict[int, int] = {}
+        self.epoch = uuid.uuid4().hex[:12]
+        self._listeners: List[Callable[[List[dict]], object]] = []
+
+    @property
+    def last_seq(self) -> int:
+        return self._last_seq
+
+    @property
+    def oldest_seq(self) -> int:
+        """Secuencia más antigua que conserva el buffer (last_seq + 1 si está vacío)"""
+        return max(1, self._last_seq - self.capacity + 1)
+
+    def cursor(self, seq: int) -> str:
+        """Cursor opaco de una secuencia de este proceso"""
+        return f"{self.epoch}-{seq}"
+
+    def parse_cursor(self, cursor: str) -> int:
+        """
+        Secuencia de un cursor entregado por cursor().
+
+        Raises:
+            ValueError: Si no tiene la forma "<epoch>-<seq>"
+            ResyncRequired: Si es de otro proceso (otra época)
+        """
+        epoch, sep, seq = cursor.rpartition("-")
+        if not sep or not epoch or not seq.isdigit():
+            raise ValueError(f"Cursor inválido: {cursor!r}")
+        if epoch != self.epoch:
+            raise ResyncRequired(cursor, self.oldest_seq, self._last_seq)
+        return int(seq)
+
+    def version(self, product_id: int) -> int:
+        """
+        Versión de un producto. Una eliminación también la avanza, así que
+        un producto borrado nunca conserva la versión de un estado anterior.
+        """
+        return self._versions.get(product_id, 0)
+
+    def subscribe(self, listener: Callable[[List[dict]], object]) -> None:
+        """
+        Registra `listener(entradas)`, llamado con cada grupo de cambios
+        agregado. Se invoca dentro del lock para que los oyentes reciban los
+        cambios en orden de secuencia: debe ser barato y no bloquear.
+        """
+        self._listeners.append(listener)
+
+    def record_upserts(self, productos: Iterable[dict], timestamp: str, action: str) -> int:
+        return self._append((("upsert", action, p["id"], p) for p in productos), timestamp)
+
+    def record_delete(self, product_id: int, timestamp: str) -> int:
+        return self._append([("delete", "delete", product_id, None)], timestamp)
+
+    def _append(self, cambios: Iterable[Tuple[str, str, int, Optional[dict]]], timestamp: str) -> int:
+        with self._lock:
+            entradas = []
+            for op, action, product_id, producto in cambios:
+                self._last_seq += 1
+                entrada = {
+                    "seq": self._last_seq,
+                    "op": op,
+                    "action": action,
+                    "id": product_id,
+                    "at": timestamp,
+                    "product": producto
+                }
+                self._entries[self._last_seq % self.capacity] = entrada
+                self._versions[product_id] = self._last_seq
+                entradas.append(entrada)
+            if entradas:
+                for listener in self._listeners:
+                    listener(entradas)
+            return self._last_seq
+
+    def since(self, seq: int, limit: int) -> List[dict]:
+        """
+        Cambios con secuencia mayor que `seq`, a lo más `limit`, en orden.
+
+        Raises:
+            ResyncRequired: Si faltan cambios posteriores a `seq` en el buffer
+        """
+        with self._lock:
+            last_seq = self._last_seq
+            oldest_seq = self.oldest_seq
+            if seq < oldest_seq - 1 or seq > last_seq:
+                raise ResyncRequired(seq, oldest_seq, last_seq)
+            fin = min(last_seq, seq + limit)
+            return [self._entries[s % self.capacity] for s in range(seq + 1, fin + 1)]
@@ -0,0 +1,136 @@
+"""
+Espejo columnar del catálogo en arreglos NumPy para agregados analíticos.
+
+ColumnStore replica `precio`, `stock` y los códigos de `categoria` y `marca`
+(ver SYMBOLS en app/services/records.py) en arreglos contiguos. Se actualiza
+como un índice más desde ProductStore, y los agregados por grupo se calculan
+con operaciones vectorizadas (bincount, ufunc.at) sin recorrer los
+registros en Python.
+"""
+from typing import Any, Dict, Sequence
+
+import numpy as np
+
+_INITIAL_CAPACITY = 1024
+_COLUMNS = ("_ids", "precio", "stock", "categoria", "marca")
+
+
+class ColumnStore:
+    """
+    Columnas precio/stock/categoria/marca con una fila por producto.
+
+    Las filas son densas: un borrado mueve la última fila al hueco, de modo
+    que las primeras `len(self)` filas siempre son los productos vigentes.
+    La capacidad se duplica al llenarse (append amortizado O(1)).
+    """
+
+    def __init__(self, capacity: int = _INITIAL_CAPACITY):
+        self._size = 0
+        self._rows: Dict[int, int] = {}
+        self._ids = np.empty(capacity, dtype=np.int64)
+        self.precio = np.empty(capacity, dtype=np.float64)
+        self.stock = np.empty(capacity, dtype=np.int64)
+        self.categoria = np.empty(capacity, dtype=np.int32)
+        self.marca = np.empty(capacity, dtype=np.int32)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _grow(self) -> None:
+        capacity = len(self._ids) * 2
+        for name in _COLUMNS:
+            column = getattr(self, name)
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self._size] = column[:self._size]
+            setattr(self, name, grown)
+
+    def add(self, record) -> None:
+        row = self._rows.get(record.id)
+        nueva = row is None
+        if nueva:
+            if self._size == len(self._ids):
+                self._grow()
+            row = self._size
+        self._ids[row] = record.id
+        self.precio[row] = record.precio
+        self.stock[row] = record.stock
+        self.categoria[row] = record.categoria
+        self.marca[row] = record.marca
+        if nueva:
+            # La fila se registra recién escrita: si un valor no cabe, no queda a medias
+            self._rows[record.id] = row
+            self._size += 1
+
+    def add_many(self, records: Sequence[Any]) -> None:
+        """
+        Agrega o reemplaza un lote (IDs sin repetir) con una asignación por
+        columna: las filas existentes se sobrescriben en su lugar y las
+        nuevas se agregan al final.
+        """
+        nuevos = sum(record.id not in self._rows for record in records)
+        while self._size + nuevos > len(self._ids):
+            self._grow()
+        rows = np.empty(len(records), dtype=np.int64)
+        for pos, record in enumerate(records):
+            row = self._rows.get(record.id)
+            if row is None:
+                row = self._rows[record.id] = self._size
+                self._size += 1
+            rows[pos] = row
+        self._ids[rows] = [record.id for record in records]
+        self.precio[rows] = [record.precio for record in records]
+        self.stock[rows] = [record.stock for record in records]
+        self.categoria[rows] = [record.categoria for record in records]
+        self.marca[rows] = [record.marca for record in records]
+
+    def discard(self, record) -> None:
+        row = self._rows.pop(record.id, None)
+        if row is None:
+            return
+        last = self._size - 1
+        if row != last:
+            for name in _COLUMNS:
+                column = getattr(self, name)
+                column[row] = column[last]
+            self._rows[int(self._ids[row])] = row
+        self._size = last
+
+    def group_stats(self, group_by: str, stock_bajo: int) -> Dict[int, Dict[str, float]]:
+        """
+        Agregados por código de `group_by` ("categoria" o "marca").
+
+        Returns:
+            Dict[int, Dict[str, float]]: código -> productos, stock_total,
+            valor_stock (suma de precio x stock), precio_promedio, precio_min,
+            precio_max y stock_bajo (productos con stock < `stock_bajo`)
+        """
+        n = self._size
+        if n == 0:
+            return {}
+        codes = getattr(self, group_by)[:n]
+        precio = self.precio[:n]
+        stock = self.stock[:n]
+        groups = int(codes.max()) + 1
+
+        productos = np.bincount(codes, minlength=groups)
+        stock_total = np.bincount(codes, weights=stock, minlength=groups)
+        valor_stock = np.bincount(codes, weights=precio * stock, minlength=groups)
+        suma_precio = np.bincount(codes, weights=precio, minlength=groups)
+        bajo = np.bincount(codes[stock < stock_bajo], minlength=groups)
+        precio_min = np.full(groups, np.inf)
+        precio_max = np.full(groups, -np.inf)
+        np.minimum.at(precio_min, codes, precio)
+        np.maximum.at(precio_max, codes, precio)
+
+        return {
+            int(code): {
+                "productos": int(productos[code]),
+                "stock_total": int(stock_total[code]),
+                "valor_stock": float(valor_stock[code]),
+                "precio_promedio": float(suma_precio[code] / productos[code]),
+                "precio_min": float(precio_min[code]),
+                "precio_max": float(precio_max[code]),
+                "stock_bajo": int(bajo[code])
+            }
+            for code in np.flatnonzero(productos)
+        }
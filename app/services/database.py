@@ -1,7 +1,22 @@
 # Aquí se definirán las funciones para interactuar con la base de datos
-# Por simplicidad, usaremos una lista en memoria como "base de datos"
+# El almacenamiento se delega en un ProductRepository: en memoria (por defecto)
+# o SQLite, según STORAGE_BACKEND
 
+import heapq
+import threading
 from datetime import datetime, timezone
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+from app.core import config
+from app.core.interfaces.repository import ProductRepository
+from app.services.changelog import ChangeLog
+from app.services.columns import ColumnStore
+from app.services.indexes import FacetIndex, GroupAggregates, HashIndex, IdOrderIndex, SortedIndex, TextIndex
+from app.services.persistence import WriteAheadLog, load_state
+from app.services.records import SYMBOLS, ProductRecord
+from app.services.reservations import InsufficientStock, ProductsNotFound, StockReservations, reservation_items
+from app.services.sqlite_repository import SQLiteProductRepository
+from app.utils.validators import ESCAPED, PRODUCT_TEXT_FIELDS, escape_on_write, escape_product, unescape_product
 
 
 def _get_utc_timestamp() -> str:
@@ -9,8 +24,512 @@ def _get_utc_timestamp() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 
-# Base de datos de productos tecnológicos
-db = [
+class ProductStore(ProductRepository):
+    """
+    Almacén de productos en memoria indexado por ID.
+
+    Mantiene un diccionario id -> registro; como los dict de Python conservan
+    el orden de inserción, sirve a la vez de índice hash (búsqueda, reemplazo
+    y borrado en O(1)) y de orden estable para los listados. Los productos
+    se guardan como ProductRecord compactos y se convierten a dict solo al
+    entregarlos.
+
+    Además mantiene índices invertidos sobre `categoria` y `marca` (por
+    código de símbolo) que se actualizan en cada escritura, para filtrar sin
+    recorrer el catálogo,
+    una lista ordenada de IDs para paginar por cursor, un índice ordenado
+    por `precio` para rangos y orden por precio, un índice de texto
+    completo sobre nombre y especificaciones y un índice de facetas
+    (atributo, valor) sobre las especificaciones. Un espejo columnar en
+    NumPy (ColumnStore) resuelve los agregados por categoría y marca, y
+    los agregados más consultados se mantienen materializados por grupo.
+    """
+
+    INDEXED_FIELDS = ("categoria", "marca")
+
+    def __init__(
+        self,
+        productos: Iterable[dict] = (),
+        journal: Optional[WriteAheadLog] = None,
+        next_id: int = 1,
+        reservations: Iterable[dict] = ()
+    ):
+        # El journal se asigna después de la carga inicial: esos productos
+        # (y reservas) ya están persistidos (o son el catálogo semilla)
+        self.journal = None
+        self._id_lock = threading.Lock()
+        self._next_id = next_id
+        # Reservas de stock vigentes y heap (vencimiento, id) para expirarlas
+        # sin recorrerlas; el lock hace atómico verificar y descontar stock
+        self._stock_lock = threading.Lock()
+        self._reservations: Dict[str, dict] = {}
+        self._expiry: List[Tuple[float, str]] = []
+        self._by_id: Dict[int, ProductRecord] = {}
+        self._indexes: Dict[str, HashIndex] = {
+            field: HashIndex(field) for field in self.INDEXED_FIELDS
+        }
+        self._order = IdOrderIndex()
+        self._price = SortedIndex("precio")
+        self._text = TextIndex()
+        self._facets = FacetIndex()
+        self._columns = ColumnStore()
+        self._aggregates: Dict[str, GroupAggregates] = {
+            field: GroupAggregates(field) for field in self.GROUP_BY
+        }
+        # Carga inicial en un solo lote: cada índice ordenado se construye una vez
+        self._apply([ProductRecord.from_dict(producto) for producto in productos])
+        for reservation in reservations:
+            self._reservations[reservation["reservation_id"]] = reservation
+            heapq.heappush(self._expiry, (reservation["deadline"], reservation["reservation_id"]))
+        self.journal = journal
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def __iter__(self) -> Iterator[dict]:
+        return (record.to_dict() for record in list(self._by_id.values()))
+
+    def records(self) -> List[ProductRecord]:
+        """Registros actuales en orden de inserción (referencias, sin convertir)"""
+        return list(self._by_id.values())
+
+    def reservations(self) -> List[dict]:
+        """Reservas vigentes (se persisten en los snapshots)"""
+        return list(self._reservations.values())
+
+    def __contains__(self, product_id: int) -> bool:
+        return product_id in self._by_id
+
+    def ids(self) -> Iterable[int]:
+        """IDs en orden de inserción"""
+        return self._by_id.keys()
+
+    def max_id(self) -> int:
+        return max(self._by_id, default=0)
+
+    @property
+    def next_id(self) -> int:
+        """Siguiente ID que entregará allocate_id (se persiste en los snapshots)"""
+        return self._next_id
+
+    def allocate_id(self) -> int:
+        with self._id_lock:
+            product_id = self._next_id
+            self._next_id += 1
+        return product_id
+
+    def get(self, product_id: int) -> Optional[dict]:
+        record = self._by_id.get(product_id)
+        return record.to_dict() if record is not None else None
+
+    def put(self, product: dict) -> dict:
+        """Inserta o reemplaza un producto conservando su posición original"""
+        record = ProductRecord.from_dict(product)
+        if self.journal is not None:
+            self.journal.append_put(product)
+        previous = self._by_id.get(record.id)
+        if previous is not None:
+            self._unindex(previous)
+        try:
+            self._index(record)
+        except Exception:
+            # _index ya se deshizo: se repone el registro previo y el log se
+            # compensa para que la reproducción no aplique la escritura fallida
+            if previous is not None:
+                self._index(previous)
+            if self.journal is not None:
+                if previous is not None:
+                    self.journal.append_put(previous.to_dict())
+                else:
+                    self.journal.append_delete(record.id)
+            raise
+        if previous is None:
+            self._order.add(record.id)
+            if record.id >= self._next_id:
+                # Un ID explícito (catálogo semilla, importación) avanza el asignador
+                with self._id_lock:
+                    self._next_id = max(self._next_id, record.id + 1)
+        self._by_id[record.id] = record
+        return product
+
+    def put_many(self, products: Sequence[dict]) -> Sequence[dict]:
+        """
+        Inserta o reemplaza un lote con una sola escritura al log. Los
+        registros reemplazados salen de los índices y el lote entra en ellos
+        con una operación por índice ordenado y por lote, en vez de una por
+        producto.
+
+        Todo o nada: todos los registros se construyen (y validan) antes de
+        escribir en el log o tocar el almacén.
+        """
+        records = [ProductRecord.from_dict(product) for product in products]
+        if self.journal is not None and records:
+            self.journal.append_puts(products)
+        self._apply(records)
+        return products
+
+    def _apply(self, records: List[ProductRecord]) -> None:
+        """Reemplaza un lote de registros ya registrados en el log"""
+        previos: List[ProductRecord] = []
+        lote: Dict[int, ProductRecord] = {}
+        for record in records:
+            actual = self._by_id.get(record.id)
+            if actual is None:
+                self._order.add(record.id)
+            elif record.id not in lote:
+                # Solo el registro previo al lote está indexado
+                previos.append(actual)
+            lote[record.id] = record
+            self._by_id[record.id] = record
+        if previos:
+            self._unindex_many(previos)
+        if lote:
+            self._index_many(list(lote.values()))
+            with self._id_lock:
+                self._next_id = max(self._next_id, max(lote) + 1)
+
+    def remove(self, product_id: int) -> Optional[dict]:
+        if self.journal is not None and product_id in self._by_id:
+            self.journal.append_delete(product_id)
+        record = self._by_id.pop(product_id, None)
+        if record is None:
+            return None
+        self._unindex(record)
+        self._order.discard(product_id)
+        return record.to_dict()
+
+    def reserve_stock(self, reservation: dict, timestamp: str) -> List[dict]:
+        items = reservation_items(reservation)
+        with self._stock_lock:
+            faltantes = [product_id for product_id in items if product_id not in self._by_id]
+            if faltantes:
+                raise ProductsNotFound(faltantes)
+            stock = {product_id: self._by_id[product_id].stock for product_id in items}
+            insuficientes = [
+                {"id": product_id, "requested": qty, "available": stock[product_id]}
+                for product_id, qty in items.items()
+                if stock[product_id] < qty
+            ]
+            if insuficientes:
+                raise InsufficientStock(insuficientes)
+
+            actualizados = self._adjust_stock(items, -1, reservation["actor"], timestamp)
+            records = [ProductRecord.from_dict(p) for p in actualizados]
+            # Reserva y descuento en un solo registro: tras un reinicio no
+            # puede quedar uno sin el otro
+            if self.journal is not None:
+                self.journal.append_reservation(reservation, actualizados)
+            self._apply(records)
+            self._reservations[reservation["reservation_id"]] = reservation
+            heapq.heappush(self._expiry, (reservation["deadline"], reservation["reservation_id"]))
+        return actualizados
+
+    def finish_reservation(
+        self,
+        reservation_id: str,
+        restore: bool,
+        timestamp: str
+    ) -> Optional[Tuple[dict, List[dict]]]:
+        with self._stock_lock:
+            if reservation_id not in self._reservations:
+                return None
+            return self._finish_locked(reservation_id, restore, timestamp)
+
+    def get_reservation(self, reservation_id: str) -> Optional[dict]:
+        return self._reservations.get(reservation_id)
+
+    def expire_reservations(self, now: float, timestamp: str) -> List[Tuple[dict, List[dict]]]:
+        vencidas = []
+        with self._stock_lock:
+            while self._expiry and self._expiry[0][0] <= now:
+                _, reservation_id = heapq.heappop(self._expiry)
+                # Las confirmadas o liberadas ya no están vigentes: su entrada se descarta
+                if reservation_id in self._reservations:
+                    vencidas.append(self._finish_locked(reservation_id, True, timestamp))
+        return vencidas
+
+    def reservation_count(self) -> int:
+        return len(self._reservations)
+
+    def _finish_locked(self, reservation_id: str, restore: bool, timestamp: str) -> Tuple[dict, List[dict]]:
+        reservation = self._reservations[reservation_id]
+        actualizados = []
+        if restore:
+            # Un producto borrado mientras tanto no recupera stock
+            items = {
+                product_id: qty
+                for product_id, qty in reservation_items(reservation).items()
+                if product_id in self._by_id
+            }
+            actualizados = self._adjust_stock(items, 1, reservation["actor"], timestamp)
+        records = [ProductRecord.from_dict(p) for p in actualizados]
+        if self.journal is not None:
+            self.journal.append_reservation_end(reservation_id, actualizados)
+        del self._reservations[reservation_id]
+        self._apply(records)
+        return reservation, actualizados
+
+    def _adjust_stock(self, items: Dict[int, int], signo: int, actor: Optional[str], timestamp: str) -> List[dict]:
+        return [
+            dict(
+                self._by_id[product_id].to_dict(),
+                stock=self._by_id[product_id].stock + signo * qty,
+                updated_at=timestamp,
+                updated_by=actor
+            )
+            for product_id, qty in items.items()
+        ]
+
+    def filter_ids(self, **filtros) -> List[int]:
+        """
+        IDs que cumplen todos los filtros de igualdad indicados, en orden de ID.
+
+        Los filtros con valor None se ignoran. Se intersectan los índices
+        empezando por el conjunto más pequeño. `specs` es una lista de pares
+        (atributo, valor) que deben cumplirse todos.
+        """
+        ids = self._match(**filtros)
+        if ids is None:
+            return list(self._by_id)
+        return sorted(ids)
+
+    def scan(
+        self,
+        after: Optional[Sequence] = None,
+        sort: Optional[str] = None,
+        precio_min: Optional[float] = None,
+        precio_max: Optional[float] = None,
+        limit: Optional[int] = None,
+        **filtros
+    ) -> Iterator[dict]:
+        """
+        Recorre perezosamente los productos que cumplen los filtros.
+
+        Sin `sort` el orden es por ID; con "precio"/"-precio" se usa el índice
+        ordenado. `after` es la clave de orden (ver sort_key) del último
+        producto ya entregado y `limit` acota la iteración.
+        """
+        for product_id in self._scan_ids(after, sort, precio_min, precio_max, limit, **filtros):
+            yield self._by_id[product_id].to_dict()
+
+    def get_json(self, product_id: int, encode: Callable[[dict], bytes]) -> Optional[bytes]:
+        record = self._by_id.get(product_id)
+        return record.json(encode) if record is not None else None
+
+    def scan_json(
+        self,
+        encode: Callable[[dict], bytes],
+        after: Optional[Sequence] = None,
+        sort: Optional[str] = None,
+        precio_min: Optional[float] = None,
+        precio_max: Optional[float] = None,
+        limit: Optional[int] = None,
+        **filtros
+    ) -> Iterator[Tuple[tuple, bytes]]:
+        """Como scan, reutilizando la codificación que conserva cada registro"""
+        for product_id in self._scan_ids(after, sort, precio_min, precio_max, limit, **filtros):
+            record = self._by_id[product_id]
+            key = (record.id,) if sort is None else (record.precio, record.id)
+            yield key, record.json(encode)
+
+    def _scan_ids(
+        self,
+        after: Optional[Sequence],
+        sort: Optional[str],
+        precio_min: Optional[float],
+        precio_max: Optional[float],
+        limit: Optional[int],
+        **filtros
+    ) -> Iterable[int]:
+        """IDs que recorre scan, en su orden"""
+        match = self._match(**filtros)
+        with_range = precio_min is not None or precio_max is not None
+
+        if sort is None:
+            after_id = after[0] if after else None
+            if match is None and not with_range:
+                ids = self._order.after(after_id)
+            else:
+                match = self._restrict_to_price(match, precio_min, precio_max)
+                ids = self._ids_in_order(match, after_id, limit)
+        elif match is not None and len(match) < self._price.count(precio_min, precio_max):
+            # El filtro de igualdad es más selectivo que el rango: ordenar solo esos
+            ids = self._sort_by_price(match, after, sort, precio_min, precio_max)
+        else:
+            ids = self._price.scan(
+                precio_min, precio_max, after=after, descending=sort == "-precio"
+            )
+            if match is not None:
+                ids = (i for i in ids if i in match)
+
+        if limit is not None:
+            ids = islice(ids, limit)
+        return ids
+
+    def _ids_in_order(self, match: Set[int], after_id: Optional[int], limit: Optional[int]) -> Iterable[int]:
+        """
+        IDs de `match` mayores que `after_id`, en orden de ID. Recorrer la
+        lista ordenada probando pertenencia cuesta ~limit·n/m pasos y se
+        detiene al completar la página; seleccionar dentro del conjunto
+        cuesta ~m. Se elige el más barato, sin ordenar nunca el conjunto
+        completo para servir una página.
+        """
+        if not match:
+            return ()
+        pedidos = limit if limit is not None else len(match)
+        if pedidos * len(self._by_id) <= len(match) * len(match):
+            return (i for i in self._order.after(after_id) if i in match)
+        candidatos = (i for i in match if after_id is None or i > after_id)
+        if limit is not None:
+            return heapq.nsmallest(limit, candidatos)
+        return sorted(candidatos)
+
+    def matching_ids(
+        self,
+        precio_min: Optional[float] = None,
+        precio_max: Optional[float] = None,
+        **filtros
+    ) -> Optional[Set[int]]:
+        """IDs que cumplen filtros y rango de precio, o None si no hay filtros"""
+        return self._restrict_to_price(self._match(**filtros), precio_min, precio_max)
+
+    def facet_counts(
+        self,
+        precio_min: Optional[float] = None,
+        precio_max: Optional[float] = None,
+        **filtros
+    ) -> Dict[str, Dict[str, int]]:
+        """Conteo por atributo y valor de los productos que cumplen los filtros"""
+        counts = self._facets.counts(self.matching_ids(precio_min, precio_max, **filtros))
+        return {SYMBOLS.decode(atributo): valores for atributo, valores in counts.items()}
+
+    def search(self, query: str, limit: int) -> List[dict]:
+        """Productos más relevantes para una búsqueda de texto libre"""
+        return [self._by_id[i].to_dict() for i, _ in self._text.search(query, limit)]
+
+    def group_stats(self, group_by: str, stock_bajo: int) -> Dict[str, Dict[str, float]]:
+        """Agregados por categoría o marca, vectorizados sobre el espejo columnar"""
+        if group_by not in self.GROUP_BY:
+            raise ValueError(f"Agrupación no soportada: {group_by}")
+        stats = self._columns.group_stats(group_by, stock_bajo)
+        return {SYMBOLS.decode(code): values for code, values in stats.items()}
+
+    def aggregates(self, group_by: str) -> Dict[str, Dict[str, float]]:
+        """Agregados materializados por categoría o marca, en O(grupos)"""
+        if group_by not in self.GROUP_BY:
+            raise ValueError(f"Agrupación no soportada: {group_by}")
+        snapshot = self._aggregates[group_by].snapshot()
+        return {SYMBOLS.decode(code): values for code, values in snapshot.items()}
+
+    def _match(self, specs: Optional[Sequence[Tuple[str, str]]] = None, **filtros) -> Optional[Set[int]]:
+        """
+        Intersección de los filtros de igualdad, o None si no hay filtros. Con
+        un solo filtro es el conjunto del índice (interno: no modificar).
+        """
+        # Los filtros se comparan por código: un string nunca visto no tiene
+        # código y no puede coincidir con ningún producto
+        vacio: Set[int] = set()
+        conjuntos = []
+        for field, value in filtros.items():
+            if value is not None:
+                code = SYMBOLS.lookup(value)
+                conjuntos.append(self._indexes[field].lookup(code) if code is not None else vacio)
+        for atributo, valor in specs or ():
+            code = SYMBOLS.lookup(atributo)
+            conjuntos.append(self._facets.lookup(code, valor) if code is not None else vacio)
+        if not conjuntos:
+            return None
+        if len(conjuntos) == 1:
+            return conjuntos[0]
+        conjuntos.sort(key=len)
+        return conjuntos[0].intersection(*conjuntos[1:])
+
+    def _restrict_to_price(
+        self,
+        match: Optional[Set[int]],
+        precio_min: Optional[float],
+        precio_max: Optional[float]
+    ) -> Optional[Set[int]]:
+        if precio_min is None and precio_max is None:
+            return match
+        in_range = set(self._price.scan(precio_min, precio_max))
+        return in_range if match is None else in_range & match
+
+    def _sort_by_price(self, ids, after, sort, precio_min, precio_max) -> List[int]:
+        descending = sort == "-precio"
+        keys = []
+        for product_id in ids:
+            record = self._by_id[product_id]
+            key = (record.precio, record.id)
+            if precio_min is not None and key[0] < precio_min:
+                continue
+            if precio_max is not None and key[0] > precio_max:
+                continue
+            if after is not None and (key <= tuple(after) if not descending
+                                      else key >= tuple(after)):
+                continue
+            keys.append(key)
+        keys.sort(reverse=descending)
+        return [key[1] for key in keys]
+
+    def _index(self, record: ProductRecord) -> None:
+        """
+        Agrega el registro a cada índice. Si uno falla, el registro sale de
+        los que ya lo tenían antes de propagar el error: nunca queda
+        indexado a medias.
+        """
+        indexados = []
+        try:
+            for index in (
+                *self._indexes.values(), self._price, self._text, self._facets,
+                self._columns, *self._aggregates.values()
+            ):
+                index.add(record)
+                indexados.append(index)
+        except Exception:
+            for index in reversed(indexados):
+                index.discard(record)
+            raise
+
+    def _index_many(self, records: List[ProductRecord]) -> None:
+        """Indexa un lote (IDs sin repetir); los índices ordenados se ordenan una vez"""
+        for record in records:
+            for index in self._indexes.values():
+                index.add(record)
+            self._text.add(record)
+            self._facets.add(record)
+        self._price.add_many(records)
+        self._columns.add_many(records)
+        for aggregate in self._aggregates.values():
+            aggregate.add_many(records)
+
+    def _unindex_many(self, records: List[ProductRecord]) -> None:
+        """
+        Quita un lote de registros que serán reemplazados. El espejo
+        columnar no se toca: _index_many sobrescribe sus filas en su lugar.
+        """
+        for record in records:
+            for index in self._indexes.values():
+                index.discard(record)
+            self._text.discard(record)
+            self._facets.discard(record)
+        self._price.discard_many(records)
+        for aggregate in self._aggregates.values():
+            aggregate.discard_many(records)
+
+    def _unindex(self, record: ProductRecord) -> None:
+        for index in self._indexes.values():
+            index.discard(record)
+        self._price.discard(record)
+        self._text.discard(record)
+        self._facets.discard(record)
+        self._columns.discard(record)
+        for aggregate in self._aggregates.values():
+            aggregate.discard(record)
+
+
+# Productos tecnológicos iniciales
+_productos_iniciales = [
     {
         "id": 1,
         "nombre": "MacBook Air M2 13' 256GB",
@@ -130,28 +649,271 @@ db = [
 ]
 
 
+def _create_repository() -> ProductRepository:
+    """Crea el repositorio configurado en STORAGE_BACKEND"""
+    if config.STORAGE_BACKEND == "sqlite":
+        repository = SQLiteProductRepository(
+            config.SQLITE_PATH,
+            pool_size=config.SQLITE_POOL_SIZE
+        )
+        # Una base SQLite nueva parte con el mismo catálogo inicial
+        if len(repository) == 0:
+            for producto in _productos_iniciales:
+                repository.put(producto)
+        return repository
+
+    if config.PERSISTENCE_DIR:
+        # Estado persistido: snapshot + cola del log; un directorio vacío
+        # parte del catálogo inicial, registrado en el log
+        productos, last_lsn, next_id, reservas = load_state(config.PERSISTENCE_DIR)
+        journal = WriteAheadLog(
+            config.PERSISTENCE_DIR,
+            last_lsn=last_lsn,
+            fsync_interval=config.WAL_FSYNC_INTERVAL_MS / 1000
+        )
+        if productos is None:
+            store = ProductStore(journal=journal)
+            for producto in _productos_iniciales:
+                store.put(producto)
+            return store
+        return ProductStore(
+            productos.values(), journal=journal, next_id=next_id, reservations=reservas.values()
+        )
+
+    return ProductStore(_productos_iniciales)
+
+
+def _align_escaping(repository: ProductRepository) -> int:
+    """
+    Alinea los productos almacenados con SANITIZE_ON_WRITE: con el modo
+    activo se escapan y marcan los que no lo están (catálogo inicial o datos
+    previos); sin él se revierten los escapados. Así los filtros y las claves
+    de facetas siempre comparan con valores de la misma forma.
+    Retorna cuántos productos se reescribieron.
+    """
+    if config.SANITIZE_ON_WRITE:
+        pendientes = [escape_product(p) for p in repository if not _is_escaped(p)]
+    else:
+        pendientes = [unescape_product(p) for p in repository if p.get(ESCAPED)]
+    if pendientes:
+        repository.put_many(pendientes)
+    return len(pendientes)
+
+
+def _is_escaped(product: dict) -> bool:
+    return set(PRODUCT_TEXT_FIELDS) <= set(product.get(ESCAPED) or ())
+
+
+def _mark_escaped(product: dict) -> dict:
+    """Marca un producto construido con valores ya escapados por escape_on_write"""
+    if config.SANITIZE_ON_WRITE:
+        product[ESCAPED] = PRODUCT_TEXT_FIELDS
+    return product
+
+
+def stored_filters(**filtros) -> dict:
+    """
+    Filtros de igualdad en la forma en que están almacenados los valores
+    (escapados con SANITIZE_ON_WRITE); el resto de los filtros no cambia.
+    """
+    if not config.SANITIZE_ON_WRITE:
+        return filtros
+    stored = dict(filtros)
+    for field in ("categoria", "marca"):
+        if stored.get(field) is not None:
+            stored[field] = escape_on_write(stored[field])
+    if stored.get("specs"):
+        stored["specs"] = [(escape_on_write(a), escape_on_write(v)) for a, v in stored["specs"]]
+    return stored
+
+
+# Base de datos de productos tecnológicos
+db = _create_repository()
+_align_escaping(db)
+# Registro de cambios para GET /products/changes; las reservas también lo alimentan
+changelog = ChangeLog(config.CHANGELOG_CAPACITY)
+reservations = StockReservations(
+    db,
+    config.RESERVATION_TTL_SECONDS,
+    _get_utc_timestamp,
+    lambda productos, timestamp: changelog.record_upserts(productos, timestamp, "stock")
+)
+
+
 # Funciones para manejar la base de datos
-def get_all_products():
-    """Obtener todos los productos"""
-    return db
+def get_all_products(
+    categoria: str = None,
+    marca: str = None,
+    precio_min: float = None,
+    precio_max: float = None,
+    sort: str = None,
+    specs: list = None
+):
+    """Obtener todos los productos, opcionalmente filtrados y ordenados"""
+    filtros = (categoria, marca, precio_min, precio_max, sort)
+    if all(value is None for value in filtros) and not specs:
+        return list(db)
+    return list(db.scan(
+        sort=sort,
+        precio_min=precio_min,
+        precio_max=precio_max,
+        **stored_filters(categoria=categoria, marca=marca, specs=specs)
+    ))
+
+
+def get_products_page(
+    limit: int,
+    after: tuple = None,
+    categoria: str = None,
+    marca: str = None,
+    precio_min: float = None,
+    precio_max: float = None,
+    sort: str = None,
+    specs: list = None
+):
+    """
+    Obtener una página de productos (paginación keyset).
+
+    Args:
+        after (tuple): Clave de orden del último producto de la página
+            anterior: (id,) o, si se ordena por precio, (precio, id)
+
+    Returns:
+        Tuple[List[dict], Optional[tuple]]: productos y clave de continuación
+        si existen más resultados
+    """
+    return db.page(
+        limit,
+        after=after,
+        sort=sort,
+        precio_min=precio_min,
+        precio_max=precio_max,
+        **stored_filters(categoria=categoria, marca=marca, specs=specs)
+    )
+
+
+def get_all_products_json(
+    encode: Callable[[dict], bytes],
+    categoria: str = None,
+    marca: str = None,
+    precio_min: float = None,
+    precio_max: float = None,
+    sort: str = None,
+    specs: list = None
+) -> List[Tuple[tuple, bytes]]:
+    """
+    Como get_all_products, pero entrega pares (clave de orden, JSON del
+    producto). El almacén en memoria conserva la codificación de cada
+    producto hasta que cambia, así que `encode` debe ser siempre la misma
+    función para aprovecharla.
+    """
+    return list(db.scan_json(
+        encode,
+        sort=sort,
+        precio_min=precio_min,
+        precio_max=precio_max,
+        **stored_filters(categoria=categoria, marca=marca, specs=specs)
+    ))
+
+
+def get_products_page_json(
+    encode: Callable[[dict], bytes],
+    limit: int,
+    after: tuple = None,
+    categoria: str = None,
+    marca: str = None,
+    precio_min: float = None,
+    precio_max: float = None,
+    sort: str = None,
+    specs: list = None
+) -> Tuple[List[Tuple[tuple, bytes]], Optional[tuple]]:
+    """Como get_products_page, con los productos codificados (ver get_all_products_json)"""
+    return db.page_json(
+        encode,
+        limit,
+        after=after,
+        sort=sort,
+        precio_min=precio_min,
+        precio_max=precio_max,
+        **stored_filters(categoria=categoria, marca=marca, specs=specs)
+    )
+
+
+def iter_product_batches(batch_size: int) -> Iterator[List[dict]]:
+    """
+    Recorrer el catálogo completo en lotes de a lo más `batch_size`
+    productos, por orden de ID.
+
+    Cada lote es una página keyset: entre lotes no se retiene ningún estado
+    salvo el último ID entregado, así que la memoria es constante y las
+    escrituras concurrentes no invalidan el recorrido.
+    """
+    after = None
+    while True:
+        items, after = db.page(batch_size, after=after)
+        if items:
+            yield items
+        if after is None:
+            return
+
+
+def get_facet_counts(
+    categoria: str = None,
+    marca: str = None,
+    precio_min: float = None,
+    precio_max: float = None,
+    specs: list = None
+):
+    """
+    Obtener el conteo de productos por atributo y valor de especificación
+    para el conjunto filtrado, p. ej. {"RAM": {"8GB": 120, "12GB": 45}}.
+    """
+    return db.facet_counts(
+        precio_min=precio_min,
+        precio_max=precio_max,
+        **stored_filters(categoria=categoria, marca=marca, specs=specs)
+    )
+
+
+def get_group_stats(group_by: str, stock_bajo: int = 5):
+    """
+    Obtener agregados de inventario agrupados por `categoria` o `marca`,
+    p. ej. {"Laptops": {"productos": 12, "stock_total": 140, ...}}.
+    """
+    return db.group_stats(group_by, stock_bajo)
+
+
+def get_aggregates(group_by: str):
+    """
+    Obtener los agregados materializados por `categoria` o `marca`, que cada
+    escritura actualiza de forma incremental.
+    """
+    return db.aggregates(group_by)
+
+
+def search_products(q: str, limit: int = 20):
+    """Buscar productos por texto en nombre y especificaciones, ordenados por relevancia"""
+    return db.search(escape_on_write(q), limit)
 
 
 def get_product_by_id(product_id: int):
     """Obtener un producto por ID"""
-    for product in db:
-        if product["id"] == product_id:
-            return product
-    return None
+    return db.get(product_id)
 
 
-def create_product(product_data, created_by: str = None):
-    """Crear un nuevo producto"""
-    # Generar nuevo ID
-    new_id = max([p["id"] for p in db]) + 1 if db else 1
+def product_exists(product_id: int) -> bool:
+    """Si existe un producto con ese ID, sin leerlo ni convertirlo"""
+    return product_id in db
+
+
+def get_product_json(product_id: int, encode: Callable[[dict], bytes]) -> Optional[bytes]:
+    """Obtener un producto por ID ya codificado (ver get_all_products_json)"""
+    return db.get_json(product_id, encode)
 
-    timestamp = _get_utc_timestamp()
 
-    new_product = {
+def _new_product(product_data: dict, new_id: int, timestamp: str, created_by: str = None) -> dict:
+    product_data, created_by = escape_on_write(product_data), escape_on_write(created_by)
+    return _mark_escaped({
         "id": new_id,
         "nombre": product_data["nombre"],
         "precio": product_data["precio"],
@@ -163,72 +925,199 @@ def create_product(product_data, created_by: str = None):
         "updated_at": timestamp,
         "created_by": created_by,
         "updated_by": created_by
-    }
+    })
+
 
-    db.append(new_product)
+def create_product(product_data, created_by: str = None):
+    """Crear un nuevo producto"""
+    # Generar nuevo ID: O(1), sin recorrer el catálogo
+    new_id = db.allocate_id()
+    timestamp = _get_utc_timestamp()
+    new_product = db.put(_new_product(product_data, new_id, timestamp, created_by))
+    changelog.record_upserts([new_product], timestamp, "create")
     return new_product
 
 
+def create_products(products_data: List[dict], created_by: str = None) -> List[dict]:
+    """Crear un lote de productos con una sola actualización de índices"""
+    timestamp = _get_utc_timestamp()
+    new_products = [
+        _new_product(product_data, db.allocate_id(), timestamp, created_by)
+        for product_data in products_data
+    ]
+    db.put_many(new_products)
+    changelog.record_upserts(new_products, timestamp, "create")
+    return new_products
+
+
 def update_product(product_id: int, product_data: dict, updated_by: str = None) -> dict:
     """Actualizar un producto completamente."""
-    for i, p in enumerate(db):
-        if p["id"] == product_id:
-            # Preservar campos de auditoría originales
-            created_at_original = p["created_at"]
-            created_by_original = p["created_by"]
-
-            updated = {
-                "id": product_id,
-                "nombre": product_data["nombre"],
-                "precio": product_data["precio"],
-                "categoria": product_data["categoria"],
-                "marca": product_data["marca"],
-                "stock": product_data["stock"],
-                "especificaciones": product_data.get("especificaciones", []),
-                "created_at": created_at_original,  # NO cambia
-                "updated_at": _get_utc_timestamp(),  # Actualizar timestamp
-                "created_by": created_by_original,  # NO cambia
-                "updated_by": updated_by  # Actualizar actor
-            }
-            db[i] = updated
-            return updated
-    return None
+    p = db.get(product_id)
+    if p is None:
+        return None
+
+    # Con SANITIZE_ON_WRITE la entrada se escapa aquí una sola vez; los
+    # campos de auditoría originales ya están almacenados escapados
+    product_data, updated_by = escape_on_write(product_data), escape_on_write(updated_by)
+
+    # Preservar campos de auditoría originales
+    created_at_original = p["created_at"]
+    created_by_original = p["created_by"]
+    timestamp = _get_utc_timestamp()
+
+    updated = {
+        "id": product_id,
+        "nombre": product_data["nombre"],
+        "precio": product_data["precio"],
+        "categoria": product_data["categoria"],
+        "marca": product_data["marca"],
+        "stock": product_data["stock"],
+        "especificaciones": product_data.get("especificaciones", []),
+        "created_at": created_at_original,  # NO cambia
+        "updated_at": timestamp,  # Actualizar timestamp
+        "created_by": created_by_original,  # NO cambia
+        "updated_by": updated_by  # Actualizar actor
+    }
+    updated = db.put(_mark_escaped(updated))
+    changelog.record_upserts([updated], timestamp, "update")
+    return updated
+
+
+def _apply_changes(p: dict, changes: dict, updated_by: str, timestamp: str) -> dict:
+    changes, updated_by = escape_on_write(changes), escape_on_write(updated_by)
+    patched = p.copy()
+
+    # Aplicar cambios permitidos
+    if "nombre" in changes:
+        patched["nombre"] = changes["nombre"]
+    if "precio" in changes:
+        patched["precio"] = changes["precio"]
+    if "categoria" in changes:
+        patched["categoria"] = changes["categoria"]
+    if "marca" in changes:
+        patched["marca"] = changes["marca"]
+    if "stock" in changes:
+        patched["stock"] = changes["stock"]
+    if "especificaciones" in changes:
+        patched["especificaciones"] = changes["especificaciones"]
+
+    # Actualizar metadatos de auditoría
+    patched["updated_at"] = timestamp
+    patched["updated_by"] = updated_by
+    # created_at y created_by NO cambian
+
+    return _mark_escaped(patched)
 
 
 def patch_product(product_id: int, changes: dict, updated_by: str = None) -> dict:
     """Actualizar un producto parcialmente."""
-    for i, p in enumerate(db):
-        if p["id"] == product_id:
-            patched = p.copy()
-
-            # Aplicar cambios permitidos
-            if "nombre" in changes:
-                patched["nombre"] = changes["nombre"]
-            if "precio" in changes:
-                patched["precio"] = changes["precio"]
-            if "categoria" in changes:
-                patched["categoria"] = changes["categoria"]
-            if "marca" in changes:
-                patched["marca"] = changes["marca"]
-            if "stock" in changes:
-                patched["stock"] = changes["stock"]
-            if "especificaciones" in changes:
-                patched["especificaciones"] = changes["especificaciones"]
-
-            # Actualizar metadatos de auditoría
-            patched["updated_at"] = _get_utc_timestamp()
-            patched["updated_by"] = updated_by
-            # created_at y created_by NO cambian
-
-            db[i] = patched
-            return patched
-    return None
+    p = db.get(product_id)
+    if p is None:
+        return None
+    timestamp = _get_utc_timestamp()
+    patched = db.put(_apply_changes(p, changes, updated_by, timestamp))
+    changelog.record_upserts([patched], timestamp, "patch")
+    return patched
+
+
+def patch_products(items: List[Tuple[int, dict]], updated_by: str = None) -> Optional[List[dict]]:
+    """
+    Actualizar parcialmente varios productos en una sola operación.
+
+    Todo o nada: si algún ID no existe no se modifica ninguno y se retorna
+    None. Los cambios se aplican con un único put_many (una escritura al log
+    y una actualización de índices por lote).
+    """
+    actuales = [db.get(product_id) for product_id, _ in items]
+    if any(p is None for p in actuales):
+        return None
+    timestamp = _get_utc_timestamp()
+    patched = [
+        _apply_changes(p, changes, updated_by, timestamp)
+        for p, (_, changes) in zip(actuales, items)
+    ]
+    db.put_many(patched)
+    changelog.record_upserts(patched, timestamp, "patch")
+    return patched
 
 
 def delete_product(product_id: int) -> bool:
     """Eliminar un producto."""
-    for i, p in enumerate(db):
-        if p["id"] == product_id:
-            db.pop(i)
-            return True
-    return False
+    if db.remove(product_id) is None:
+        return False
+    changelog.record_delete(product_id, _get_utc_timestamp())
+    return True
+
+
+def reserve_stock(items: List[Tuple[int, int]], reserved_by: str = None) -> dict:
+    """
+    Reservar stock de varios productos de forma atómica.
+
+    Raises:
+        ProductsNotFound: Si algún producto no existe
+        InsufficientStock: Si algún producto no tiene stock suficiente
+    """
+    # El actor queda en updated_by de los productos reservados
+    return reservations.reserve(items, escape_on_write(reserved_by))
+
+
+def confirm_reservation(reservation_id: str) -> Optional[dict]:
+    """Confirmar una reserva vigente; None si no existe o expiró."""
+    return reservations.confirm(reservation_id)
+
+
+def release_reservation(reservation_id: str) -> Optional[dict]:
+    """Liberar una reserva vigente devolviendo su stock; None si no existe o expiró."""
+    return reservations.release(reservation_id)
+
+
+def is_reservation_owner(reservation_id: str, actor: str) -> Optional[bool]:
+    """Si `actor` creó la reserva; None si la reserva no existe."""
+    reservation = db.get_reservation(reservation_id)
+    if reservation is None:
+        return None
+    # El actor se guarda en su forma almacenada (ver reserve_stock)
+    return reservation["actor"] == escape_on_write(actor)
+
+
+# SQLite hace E/S y una escritura puede esperar el busy timeout: los
+# endpoints llaman a estas funciones en el pool de hilos para no detener el
+# event loop. El almacén en memoria no bloquea y sus escrituras no son
+# seguras entre hilos, así que con él se llaman en el loop
+BLOCKING_STORAGE = config.STORAGE_BACKEND == "sqlite"
+
+# El registro de cambios solo ve las escrituras de este proceso. Con SQLite
+# otros workers escriben en el mismo archivo, así que sus versiones no sirven
+# para ETags ni para la caché de respuestas
+TRACKS_ALL_WRITES = config.STORAGE_BACKEND != "sqlite"
+
+
+def get_catalog_version() -> Tuple[str, int]:
+    """(época del proceso, versión) del catálogo; cambia con cada escritura."""
+    return changelog.epoch, changelog.last_seq
+
+
+def get_product_version(product_id: int) -> Tuple[str, int]:
+    """(época del proceso, versión) de un producto; cambia con cada escritura sobre él."""
+    return changelog.epoch, changelog.version(product_id)
+
+
+def get_changes(since: Optional[str], limit: int) -> dict:
+    """
+    Cambios del catálogo posteriores al cursor `since` (None: desde el
+    arranque del proceso).
+
+    Raises:
+        ValueError: Si el cursor no es válido
+        ResyncRequired: Si esos cambios ya salieron del registro o el
+            cursor es de otro proceso
+    """
+    seq = changelog.parse_cursor(since) if since is not None else 0
+    entries = changelog.since(seq, limit)
+    next_seq = entries[-1]["seq"] if entries else seq
+    return {
+        "changes": entries,
+        "next_since": changelog.cursor(next_seq),
+        "last_seq": changelog.last_seq,
+        "has_more": next_seq < changelog.last_seq
+    }
@@ -0,0 +1,76 @@
+"""
+Difusión en proceso de los cambios del catálogo a suscriptores asyncio
+(GET /products/stream).
+
+Cada suscriptor tiene una cola acotada. Los cambios se publican desde
+cualquier hilo con loop.call_soon_threadsafe y se reparten en el event loop:
+cada evento se codifica una sola vez y la misma secuencia de bytes se
+encola para todos. Un suscriptor cuya cola se llena se da de baja en lugar
+de bloquear a los demás o acumular memoria sin límite.
+"""
+import asyncio
+from typing import Callable, List, Optional, Set, Tuple
+
+# Marca que recibe un suscriptor dado de baja por no consumir a tiempo
+DROPPED = None
+
+
+class EventBroker:
+    """
+    Fan-out de entradas del ChangeLog a colas por suscriptor.
+
+    `encode(entrada)` convierte una entrada en los bytes que se envían; los
+    suscriptores reciben tuplas (seq, bytes) y DROPPED al ser descartados.
+    """
+
+    def __init__(self, encode: Callable[[dict], bytes], queue_size: int, max_subscribers: int):
+        self.encode = encode
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+    @property
+    def full(self) -> bool:
+        """Si se alcanzó max_subscribers (subscribe retornaría None)"""
+        return len(self._subscribers) >= self.max_subscribers
+
+    def subscribe(self) -> Optional[asyncio.Queue]:
+        """Nueva cola de suscriptor; None si se alcanzó max_subscribers"""
+        if len(self._subscribers) >= self.max_subscribers:
+            return None
+        self._loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self._subscribers.discard(queue)
+
+    def publish(self, entradas: List[dict]) -> None:
+        """Agenda la entrega de `entradas` en el event loop; seguro desde cualquier hilo"""
+        loop = self._loop
+        if not self._subscribers or loop is None or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(self._deliver, entradas)
+
+    def _deliver(self, entradas: List[dict]) -> None:
+        if not self._subscribers:
+            return
+        eventos: List[Tuple[int, bytes]] = [(e["seq"], self.encode(e)) for e in entradas]
+        for queue in list(self._subscribers):
+            if queue.maxsize - queue.qsize() < len(eventos):
+                self._drop(queue)
+                continue
+            for evento in eventos:
+                queue.put_nowait(evento)
+
+    def _drop(self, queue: asyncio.Queue) -> None:
+        """Da de baja un suscriptor lento: descarta lo pendiente y le avisa"""
+        self._subscribers.discard(queue)
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(DROPPED)
@@ -0,0 +1,562 @@
+"""
+Índices secundarios en memoria para el almacén de productos.
+
+Cada índice se actualiza de forma incremental desde ProductStore en cada
+escritura, de modo que las consultas nunca recorren el catálogo completo.
+Los índices reciben registros ProductRecord (ver app/services/records.py).
+"""
+import heapq
+import math
+import re
+import unicodedata
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter
+from typing import Any, Dict, Hashable, Iterator, List, Optional, Sequence, Set, Tuple
+
+
+class HashIndex:
+    """Índice invertido valor -> conjunto de IDs de producto"""
+
+    def __init__(self, field: str):
+        self.field = field
+        self._postings: Dict[Hashable, Set[int]] = {}
+
+    def add(self, record) -> None:
+        key = getattr(record, self.field)
+        self._postings.setdefault(key, set()).add(record.id)
+
+    def discard(self, record) -> None:
+        key = getattr(record, self.field)
+        ids = self._postings.get(key)
+        if ids is None:
+            return
+        ids.discard(record.id)
+        if not ids:
+            del self._postings[key]
+
+    def lookup(self, value: Hashable) -> Set[int]:
+        """IDs con ese valor (el conjunto es interno: no modificar)"""
+        return self._postings.get(value, set())
+
+    def keys(self):
+        return self._postings.keys()
+
+
+def _remove_sorted(entries: List[Any], removed: Sequence[Any]) -> None:
+    """
+    Quita de una lista ordenada los valores indicados (con repetición).
+
+    Pocos valores se borran uno a uno con bisect; si el lote es grande
+    respecto de la lista, conviene reconstruirla en una sola pasada.
+    """
+    if len(removed) * 32 < len(entries):
+        for value in removed:
+            pos = bisect_left(entries, value)
+            if pos < len(entries) and entries[pos] == value:
+                del entries[pos]
+        return
+    pending = Counter(removed)
+    kept = []
+    for value in entries:
+        if pending[value]:
+            pending[value] -= 1
+        else:
+            kept.append(value)
+    entries[:] = kept
+
+
+class SortedList:
+    """
+    Lista ordenada dividida en tramos de a lo más 2·LOAD valores.
+
+    Un insort sobre una sola lista desplaza en promedio n/2 elementos, así
+    que insertar se vuelve O(n) a medida que crece. Aquí solo se desplaza
+    el tramo afectado: insertar y borrar cuestan O(log n + LOAD), más una
+    inserción en la lista de máximos (n/LOAD elementos) cuando un tramo se
+    divide. Las posiciones globales (bisect, slices) recorren los largos de
+    los tramos, O(n/LOAD).
+    """
+
+    LOAD = 1000
+
+    def __init__(self, values: Sequence[Any] = ()):
+        self._lists: List[List[Any]] = []
+        self._maxes: List[Any] = []
+        self._len = 0
+        if values:
+            self._rebuild(sorted(values))
+
+    def _rebuild(self, ordered: List[Any]) -> None:
+        load = self.LOAD
+        self._lists = [ordered[i:i + load] for i in range(0, len(ordered), load)]
+        self._maxes = [sub[-1] for sub in self._lists]
+        self._len = len(ordered)
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __iter__(self) -> Iterator[Any]:
+        for sub in self._lists:
+            yield from sub
+
+    def __getitem__(self, index: int) -> Any:
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError("SortedList index out of range")
+        if index == self._len - 1:
+            return self._lists[-1][-1]
+        pos, idx = self._locate(index)
+        return self._lists[pos][idx]
+
+    def add(self, value: Any) -> None:
+        if not self._maxes:
+            self._lists.append([value])
+            self._maxes.append(value)
+        else:
+            pos = bisect_right(self._maxes, value)
+            if pos == len(self._maxes):
+                pos -= 1
+                self._lists[pos].append(value)
+                self._maxes[pos] = value
+            else:
+                insort(self._lists[pos], value)
+            self._split(pos)
+        self._len += 1
+
+    def update(self, values: Sequence[Any]) -> None:
+        """Inserta un lote; si es grande respecto de la lista se reconstruye con un solo sort"""
+        if len(values) * 8 < self._len:
+            for value in values:
+                self.add(value)
+            return
+        # Timsort detecta la lista existente como un tramo ya ordenado
+        ordered = list(self)
+        ordered.extend(values)
+        ordered.sort()
+        self._rebuild(ordered)
+
+    def remove(self, value: Any) -> bool:
+        """Quita una ocurrencia de `value`; False si no estaba"""
+        pos = bisect_left(self._maxes, value)
+        if pos == len(self._maxes):
+            return False
+        sub = self._lists[pos]
+        idx = bisect_left(sub, value)
+        if sub[idx] != value:
+            return False
+        del sub[idx]
+        self._len -= 1
+        if not sub:
+            del self._lists[pos]
+            del self._maxes[pos]
+        elif idx == len(sub):
+            self._maxes[pos] = sub[-1]
+        return True
+
+    def remove_many(self, values: Sequence[Any]) -> None:
+        """Quita los valores indicados (con repetición), en una pasada si el lote es grande"""
+        if len(values) * 32 < self._len:
+            for value in values:
+                self.remove(value)
+            return
+        ordered = list(self)
+        _remove_sorted(ordered, values)
+        self._rebuild(ordered)
+
+    def bisect_left(self, value: Any) -> int:
+        pos = bisect_left(self._maxes, value)
+        if pos == len(self._maxes):
+            return self._len
+        return self._offset(pos) + bisect_left(self._lists[pos], value)
+
+    def bisect_right(self, value: Any) -> int:
+        pos = bisect_right(self._maxes, value)
+        if pos == len(self._maxes):
+            return self._len
+        return self._offset(pos) + bisect_right(self._lists[pos], value)
+
+    def islice(self, start: int, stop: int, reverse: bool = False) -> Iterator[Any]:
+        """Valores en las posiciones [start, stop), en orden o al revés"""
+        if start >= stop:
+            return
+        if not reverse:
+            pos, idx = self._locate(start)
+            restantes = stop - start
+            for sub in self._lists[pos:]:
+                tramo = sub[idx:idx + restantes]
+                yield from tramo
+                restantes -= len(tramo)
+                if restantes <= 0:
+                    return
+                idx = 0
+        else:
+            pos, idx = self._locate(stop - 1)
+            restantes = stop - start
+            for p in range(pos, -1, -1):
+                sub = self._lists[p]
+                if p != pos:
+                    idx = len(sub) - 1
+                for i in range(idx, max(idx - restantes, -1), -1):
+                    yield sub[i]
+                restantes -= idx + 1
+                if restantes <= 0:
+                    return
+
+    def _offset(self, pos: int) -> int:
+        """Posición global del primer valor del tramo `pos`"""
+        return sum(len(sub) for sub in self._lists[:pos])
+
+    def _locate(self, index: int) -> Tuple[int, int]:
+        """(tramo, posición en el tramo) de una posición global válida"""
+        for pos, sub in enumerate(self._lists):
+            if index < len(sub):
+                return pos, index
+            index -= len(sub)
+        raise IndexError("SortedList index out of range")
+
+    def _split(self, pos: int) -> None:
+        sub = self._lists[pos]
+        if len(sub) > 2 * self.LOAD:
+            mitad = sub[self.LOAD:]
+            del sub[self.LOAD:]
+            self._lists.insert(pos + 1, mitad)
+            self._maxes[pos] = sub[-1]
+            self._maxes.insert(pos + 1, mitad[-1])
+
+
+class _Aggregate:
+    __slots__ = ("productos", "stock_total", "suma_precio", "precios")
+
+    def __init__(self):
+        self.productos = 0
+        self.stock_total = 0
+        self.suma_precio = 0.0
+        self.precios = SortedList()
+
+
+class GroupAggregates:
+    """
+    Agregados materializados por valor de `field`: cantidad de productos,
+    stock total y precio mínimo, máximo y promedio.
+
+    Cada escritura aplica un delta sobre su grupo. Para que mínimo y máximo
+    sigan siendo correctos tras un borrado, cada grupo conserva sus precios
+    en una SortedList: el mínimo y el máximo son sus extremos.
+    Leer todos los agregados cuesta O(grupos).
+    """
+
+    def __init__(self, field: str):
+        self.field = field
+        self._groups: Dict[Hashable, _Aggregate] = {}
+
+    def add(self, record) -> None:
+        key = getattr(record, self.field)
+        group = self._groups.get(key)
+        if group is None:
+            group = self._groups[key] = _Aggregate()
+        group.productos += 1
+        group.stock_total += record.stock
+        group.suma_precio += record.precio
+        group.precios.add(record.precio)
+
+    def add_many(self, records: Sequence[Any]) -> None:
+        """Aplica los deltas de un lote insertando una sola vez en cada grupo tocado"""
+        field = self.field
+        touched: Dict[Hashable, List[float]] = {}
+        for record in records:
+            key = getattr(record, field)
+            group = self._groups.get(key)
+            if group is None:
+                group = self._groups[key] = _Aggregate()
+            group.productos += 1
+            group.stock_total += record.stock
+            group.suma_precio += record.precio
+            touched.setdefault(key, []).append(record.precio)
+        for key, precios in touched.items():
+            self._groups[key].precios.update(precios)
+
+    def discard(self, record) -> None:
+        key = getattr(record, self.field)
+        group = self._groups.get(key)
+        if group is None:
+            return
+        if not group.precios.remove(record.precio):
+            return
+        group.productos -= 1
+        if group.productos == 0:
+            # Al vaciarse el grupo se descarta también el error acumulado de la suma
+            del self._groups[key]
+            return
+        group.stock_total -= record.stock
+        group.suma_precio -= record.precio
+
+    def discard_many(self, records: Sequence[Any]) -> None:
+        """Revierte los deltas de un lote de registros indexados"""
+        field = self.field
+        removed: Dict[Hashable, List[float]] = {}
+        for record in records:
+            key = getattr(record, field)
+            group = self._groups.get(key)
+            if group is None:
+                continue
+            group.productos -= 1
+            group.stock_total -= record.stock
+            group.suma_precio -= record.precio
+            removed.setdefault(key, []).append(record.precio)
+        for key, precios in removed.items():
+            group = self._groups[key]
+            if group.productos <= 0:
+                del self._groups[key]
+            else:
+                group.precios.remove_many(precios)
+
+    def snapshot(self) -> Dict[Hashable, Dict[str, float]]:
+        """Agregados de cada grupo con al menos un producto"""
+        return {
+            key: {
+                "productos": group.productos,
+                "stock_total": group.stock_total,
+                "precio_min": group.precios[0],
+                "precio_max": group.precios[-1],
+                "precio_promedio": group.suma_precio / group.productos
+            }
+            for key, group in self._groups.items()
+        }
+
+
+class IdOrderIndex:
+    """
+    Lista ordenada de IDs para paginación por cursor (keyset).
+
+    Los IDs nuevos suelen ser mayores que todos los existentes, así que la
+    inserción es un append. Los borrados son perezosos: el ID queda como
+    lápida hasta que las lápidas superan la mitad de la lista y se compacta,
+    con lo que el borrado es O(1) amortizado.
+    """
+
+    def __init__(self):
+        self._ids: List[int] = []
+        self._live: Set[int] = set()
+        self._tombstones = 0
+
+    def add(self, product_id: int) -> None:
+        if product_id in self._live:
+            return
+        self._live.add(product_id)
+        if not self._ids or product_id > self._ids[-1]:
+            self._ids.append(product_id)
+            return
+        pos = bisect_left(self._ids, product_id)
+        if pos < len(self._ids) and self._ids[pos] == product_id:
+            # Se reutiliza una lápida
+            self._tombstones -= 1
+        else:
+            insort(self._ids, product_id)
+
+    def discard(self, product_id: int) -> None:
+        if product_id not in self._live:
+            return
+        self._live.discard(product_id)
+        self._tombstones += 1
+        if self._tombstones > len(self._live):
+            self._ids = [i for i in self._ids if i in self._live]
+            self._tombstones = 0
+
+    def after(self, product_id: int = None) -> Iterator[int]:
+        """IDs vivos estrictamente mayores que product_id, en orden ascendente"""
+        start = 0 if product_id is None else bisect_right(self._ids, product_id)
+        ids, live = self._ids, self._live
+        for pos in range(start, len(ids)):
+            if ids[pos] in live:
+                yield ids[pos]
+
+
+class SortedIndex:
+    """
+    Índice ordenado de pares (valor, id) para consultas por rango y orden.
+
+    Las entradas viven en una SortedList: un rango cuesta O(log n + k) más
+    ubicar sus extremos, e insertar o borrar solo desplaza un tramo, de modo
+    que el costo de escribir no crece linealmente con el catálogo.
+    """
+
+    def __init__(self, field: str):
+        self.field = field
+        self._entries = SortedList()
+
+    def add(self, record) -> None:
+        self._entries.add((getattr(record, self.field), record.id))
+
+    def add_many(self, records: Sequence[Any]) -> None:
+        field = self.field
+        self._entries.update([(getattr(record, field), record.id) for record in records])
+
+    def discard(self, record) -> None:
+        self._entries.remove((getattr(record, self.field), record.id))
+
+    def discard_many(self, records: Sequence[Any]) -> None:
+        field = self.field
+        self._entries.remove_many([(getattr(record, field), record.id) for record in records])
+
+    def _bounds(self, low: Optional[Any], high: Optional[Any]) -> Tuple[int, int]:
+        start = 0 if low is None else self._entries.bisect_left((low,))
+        end = (len(self._entries) if high is None
+               else self._entries.bisect_right((high, float("inf"))))
+        return start, end
+
+    def count(self, low: Optional[Any] = None, high: Optional[Any] = None) -> int:
+        """Cantidad de entradas con low <= valor <= high"""
+        start, end = self._bounds(low, high)
+        return max(end - start, 0)
+
+    def scan(
+        self,
+        low: Optional[Any] = None,
+        high: Optional[Any] = None,
+        after: Optional[Sequence[Any]] = None,
+        descending: bool = False
+    ) -> Iterator[int]:
+        """
+        IDs con low <= valor <= high ordenados por (valor, id).
+
+        `after` es la clave (valor, id) del último elemento ya entregado; la
+        iteración continúa estrictamente después de ella en el sentido pedido.
+        """
+        start, end = self._bounds(low, high)
+        entries = self._entries
+        if not descending:
+            if after is not None:
+                start = max(start, entries.bisect_right(tuple(after)))
+        elif after is not None:
+            end = min(end, entries.bisect_left(tuple(after)))
+        for _, product_id in entries.islice(start, end, reverse=descending):
+            yield product_id
+
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Separa un texto en tokens en minúsculas y sin tildes.
+
+    "Núcleos" y "nucleos" producen el mismo token: se descompone en NFKD y
+    se descartan las marcas diacríticas antes de separar.
+    """
+    decomposed = unicodedata.normalize("NFKD", text)
+    folded = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return _TOKEN_RE.findall(folded.casefold())
+
+
+class TextIndex:
+    """
+    Índice invertido de texto completo: token -> {id: peso}.
+
+    Indexa `nombre` y cada `especificaciones[].detalles[].valor`. Los tokens
+    del nombre pesan más que los de las especificaciones. La relevancia de un
+    resultado es la suma, por token de la consulta, de su peso en el producto
+    por el IDF del token.
+    """
+
+    NAME_WEIGHT = 2.0
+    SPEC_WEIGHT = 1.0
+
+    def __init__(self):
+        self._postings: Dict[str, Dict[int, float]] = {}
+        self._doc_terms: Dict[int, Dict[str, float]] = {}
+
+    def _terms(self, record) -> Dict[str, float]:
+        terms: Dict[str, float] = {}
+        for token in tokenize(record.nombre or ""):
+            terms[token] = terms.get(token, 0.0) + self.NAME_WEIGHT
+        for _, valor in record.spec_pairs():
+            for token in tokenize(valor or ""):
+                terms[token] = terms.get(token, 0.0) + self.SPEC_WEIGHT
+        return terms
+
+    def add(self, record) -> None:
+        product_id = record.id
+        terms = self._terms(record)
+        self._doc_terms[product_id] = terms
+        for token, weight in terms.items():
+            self._postings.setdefault(token, {})[product_id] = weight
+
+    def discard(self, record) -> None:
+        product_id = record.id
+        for token in self._doc_terms.pop(product_id, {}):
+            posting = self._postings.get(token)
+            if posting is None:
+                continue
+            posting.pop(product_id, None)
+            if not posting:
+                del self._postings[token]
+
+    def search(self, query: str, limit: int) -> List[Tuple[int, float]]:
+        """Los `limit` IDs más relevantes para la consulta con su puntaje"""
+        total = len(self._doc_terms)
+        scores: Dict[int, float] = {}
+        for token in set(tokenize(query)):
+            posting = self._postings.get(token)
+            if not posting:
+                continue
+            idf = math.log(1 + total / len(posting))
+            for product_id, weight in posting.items():
+                scores[product_id] = scores.get(product_id, 0.0) + weight * idf
+        # Mayor puntaje primero; a igual puntaje, menor ID primero
+        return heapq.nsmallest(
+            limit, scores.items(), key=lambda item: (-item[1], item[0])
+        )
+
+
+class FacetIndex:
+    """
+    Índice de facetas sobre especificaciones: (atributo, valor) -> IDs, con
+    el atributo codificado como en los registros.
+
+    Guarda además, por producto, sus pares (atributo, valor) ya aplanados,
+    para contar facetas de un subconjunto sin recorrer las listas anidadas.
+    """
+
+    def __init__(self):
+        self._postings: Dict[Tuple[int, str], Set[int]] = {}
+        self._doc_pairs: Dict[int, Tuple[Tuple[int, str], ...]] = {}
+
+    def add(self, record) -> None:
+        product_id = record.id
+        pairs = tuple(dict.fromkeys(record.spec_pairs()))
+        self._doc_pairs[product_id] = pairs
+        for pair in pairs:
+            self._postings.setdefault(pair, set()).add(product_id)
+
+    def discard(self, record) -> None:
+        product_id = record.id
+        for pair in self._doc_pairs.pop(product_id, ()):
+            ids = self._postings.get(pair)
+            if ids is None:
+                continue
+            ids.discard(product_id)
+            if not ids:
+                del self._postings[pair]
+
+    def lookup(self, atributo: int, valor: str) -> Set[int]:
+        """IDs con ese par (el conjunto es interno: no modificar)"""
+        return self._postings.get((atributo, valor), set())
+
+    def counts(self, ids: Optional[Set[int]] = None) -> Dict[int, Dict[str, int]]:
+        """
+        Conteo de productos por atributo y valor.
+
+        Sin `ids` se usa el tamaño de cada posting, O(facetas); con `ids` se
+        recorren solo los pares aplanados de esos productos.
+        """
+        counts: Dict[int, Dict[str, int]] = {}
+        if ids is None:
+            for (atributo, valor), posting in self._postings.items():
+                counts.setdefault(atributo, {})[valor] = len(posting)
+            return counts
+        for product_id in ids:
+            for atributo, valor in self._doc_pairs.get(product_id, ()):
+                valores = counts.setdefault(atributo, {})
+                valores[valor] = valores.get(valor, 0) + 1
+        return counts
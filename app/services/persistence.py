@@ -0,0 +1,341 @@
+"""
+Persistencia del almacén en memoria: log de escritura anticipada (WAL) y
+snapshots periódicos.
+
+Cada mutación se agrega a un segmento de log binario (`wal-<lsn>.log`) antes
+de aplicarse en memoria; un hilo en segundo plano hace fsync por lotes cada
+`fsync_interval` segundos. Un snapshot compacto (`snapshot.bin`) guarda el
+estado completo junto al último LSN incluido, y permite borrar los segmentos
+anteriores. Al arrancar se lee el snapshot con mmap y solo se reproduce la
+cola del log.
+
+El snapshot guarda también el siguiente ID del asignador de IDs; al
+reproducir el log se avanza más allá de todo ID visto, incluso de productos
+borrados después, de modo que un ID nunca se reutiliza tras un reinicio.
+
+Las reservas de stock vigentes también se persisten: cada reserva y el stock
+que descuenta (o que devuelve al cerrarla) van en un único registro, y el
+snapshot incluye las reservas vigentes.
+
+Formato de un registro de log:
+    <I largo del payload> <I crc32> <Q lsn> <B operación> <payload>
+El crc cubre lsn, operación y payload; un registro truncado o corrupto marca
+el final válido de su segmento.
+"""
+import asyncio
+import json
+import mmap
+import os
+import struct
+import threading
+import zlib
+from itertools import chain
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from app.services.records import ProductRecord
+
+OP_PUT = 1
+OP_DELETE = 2
+OP_RESERVE = 3
+OP_RESERVATION_END = 4
+
+_RECORD = struct.Struct("<IIQB")
+_DELETE_PAYLOAD = struct.Struct("<q")
+_SNAPSHOT_MAGIC = b"PRODSNP3"
+_SNAPSHOT_HEADER = struct.Struct("<QQQQ")
+_SNAPSHOT_ENTRY = struct.Struct("<II")
+
+SNAPSHOT_FILE = "snapshot.bin"
+
+
+def _encode(data: dict) -> bytes:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _frame(lsn: int, op: int, payload: bytes) -> bytes:
+    """Registro de log completo: encabezado con crc + payload"""
+    header_tail = struct.pack("<QB", lsn, op)
+    crc = zlib.crc32(payload, zlib.crc32(header_tail))
+    return struct.pack("<II", len(payload), crc) + header_tail + payload
+
+
+def _segment_name(start_lsn: int) -> str:
+    return f"wal-{start_lsn:020d}.log"
+
+
+def _segments(directory: str) -> List[Tuple[int, str]]:
+    """Segmentos de log existentes como (lsn inicial, ruta), en orden"""
+    segments = []
+    for name in os.listdir(directory):
+        if name.startswith("wal-") and name.endswith(".log"):
+            segments.append((int(name[4:-4]), os.path.join(directory, name)))
+    return sorted(segments)
+
+
+def _fsync_directory(directory: str) -> None:
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _read_snapshot(path: str) -> Tuple[int, int, List[dict], List[dict]]:
+    """Lee un snapshot mediante mmap: retorna (lsn, siguiente ID, productos, reservas)"""
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if data[:len(_SNAPSHOT_MAGIC)] != _SNAPSHOT_MAGIC:
+                raise ValueError(f"Snapshot inválido: {path}")
+            offset = len(_SNAPSHOT_MAGIC)
+            lsn, count, next_id, reservation_count = _SNAPSHOT_HEADER.unpack_from(data, offset)
+            offset += _SNAPSHOT_HEADER.size
+            # Productos y luego reservas, con el mismo formato de entrada
+            entradas = []
+            for _ in range(count + reservation_count):
+                length, crc = _SNAPSHOT_ENTRY.unpack_from(data, offset)
+                offset += _SNAPSHOT_ENTRY.size
+                payload = data[offset:offset + length]
+                offset += length
+                if zlib.crc32(payload) != crc:
+                    raise ValueError(f"Snapshot corrupto: {path}")
+                entradas.append(json.loads(payload))
+    return lsn, next_id, entradas[:count], entradas[count:]
+
+
+def _read_segment(path: str) -> Iterable[Tuple[int, int, bytes]]:
+    """Registros válidos (lsn, operación, payload) de un segmento"""
+    with open(path, "rb") as f:
+        data = f.read()
+    offset = 0
+    while offset + _RECORD.size <= len(data):
+        length, crc, lsn, op = _RECORD.unpack_from(data, offset)
+        start = offset + _RECORD.size
+        payload = data[start:start + length]
+        if len(payload) < length:
+            return
+        if zlib.crc32(payload, zlib.crc32(data[offset + 8:start])) != crc:
+            return
+        yield lsn, op, payload
+        offset = start + length
+
+
+def load_state(directory: str) -> Tuple[Optional[Dict[int, dict]], int, int, Dict[str, dict]]:
+    """
+    Recupera el estado persistido en `directory`.
+
+    Returns:
+        Tuple[Optional[Dict[int, dict]], int, int, Dict[str, dict]]:
+        productos por ID en orden de inserción (None si el directorio no
+        tiene datos), último LSN aplicado, siguiente ID a asignar y reservas
+        de stock vigentes por ID
+    """
+    os.makedirs(directory, exist_ok=True)
+    snapshot_path = os.path.join(directory, SNAPSHOT_FILE)
+    segments = _segments(directory)
+    if not os.path.exists(snapshot_path) and not segments:
+        return None, 0, 1, {}
+
+    productos: Dict[int, dict] = {}
+    reservas: Dict[str, dict] = {}
+    last_lsn = 0
+    next_id = 1
+    if os.path.exists(snapshot_path):
+        last_lsn, next_id, items, reservations = _read_snapshot(snapshot_path)
+        productos = {p["id"]: p for p in items}
+        reservas = {r["reservation_id"]: r for r in reservations}
+
+    def put(product: dict) -> None:
+        nonlocal next_id
+        productos[product["id"]] = product
+        next_id = max(next_id, product["id"] + 1)
+
+    for _, path in segments:
+        for lsn, op, payload in _read_segment(path):
+            if lsn <= last_lsn:
+                continue
+            if op == OP_PUT:
+                put(json.loads(payload))
+            elif op == OP_DELETE:
+                productos.pop(_DELETE_PAYLOAD.unpack(payload)[0], None)
+            elif op == OP_RESERVE:
+                data = json.loads(payload)
+                for product in data["products"]:
+                    put(product)
+                reservas[data["reservation"]["reservation_id"]] = data["reservation"]
+            elif op == OP_RESERVATION_END:
+                data = json.loads(payload)
+                for product in data["products"]:
+                    put(product)
+                reservas.pop(data["reservation_id"], None)
+            last_lsn = lsn
+    return productos, last_lsn, next_id, reservas
+
+
+class WriteAheadLog:
+    """
+    Log de mutaciones del almacén con fsync por lotes y rotación por snapshot.
+
+    `fsync_interval` = 0 hace fsync en cada registro; con un valor positivo
+    un hilo en segundo plano sincroniza a lo sumo una vez por intervalo, de
+    modo que una ráfaga de escrituras comparte un único fsync.
+    """
+
+    def __init__(self, directory: str, last_lsn: int = 0, fsync_interval: float = 0.05):
+        self.directory = directory
+        self.fsync_interval = fsync_interval
+        self.records_since_snapshot = 0
+        self._lsn = last_lsn
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._file = self._open_segment(last_lsn + 1)
+        self._closed = threading.Event()
+        self._syncer = None
+        if fsync_interval > 0:
+            self._syncer = threading.Thread(
+                target=self._sync_loop, name="wal-fsync", daemon=True
+            )
+            self._syncer.start()
+
+    @property
+    def lsn(self) -> int:
+        """Último LSN escrito"""
+        return self._lsn
+
+    def _open_segment(self, start_lsn: int):
+        # Un segmento previo con este nombre no puede tener registros válidos
+        # (se habrían reproducido y el LSN sería mayor): se trunca su basura
+        path = os.path.join(self.directory, _segment_name(start_lsn))
+        segment = open(path, "wb")
+        _fsync_directory(self.directory)
+        return segment
+
+    def append_put(self, product: dict) -> int:
+        return self._append(OP_PUT, _encode(product))
+
+    def append_puts(self, productos: Sequence[dict]) -> int:
+        """Agrega un lote de productos con una sola escritura; retorna el último LSN"""
+        payloads = [_encode(product) for product in productos]
+        with self._lock:
+            first = self._lsn + 1
+            self._file.write(b"".join(
+                _frame(lsn, OP_PUT, payload)
+                for lsn, payload in enumerate(payloads, first)
+            ))
+            self._lsn = lsn = first + len(payloads) - 1
+            self._dirty = True
+            self.records_since_snapshot += len(payloads)
+            if self.fsync_interval <= 0:
+                self._sync_locked()
+        return lsn
+
+    def append_delete(self, product_id: int) -> int:
+        return self._append(OP_DELETE, _DELETE_PAYLOAD.pack(product_id))
+
+    def append_reservation(self, reservation: dict, productos: Sequence[dict]) -> int:
+        """Una reserva y los productos con el stock ya descontado, en un solo registro"""
+        return self._append(OP_RESERVE, _encode({"reservation": reservation, "products": list(productos)}))
+
+    def append_reservation_end(self, reservation_id: str, productos: Sequence[dict]) -> int:
+        """El cierre de una reserva y los productos con el stock devuelto (si lo hay)"""
+        return self._append(OP_RESERVATION_END, _encode({"reservation_id": reservation_id, "products": list(productos)}))
+
+    def _append(self, op: int, payload: bytes) -> int:
+        with self._lock:
+            lsn = self._lsn + 1
+            self._file.write(_frame(lsn, op, payload))
+            self._lsn = lsn
+            self._dirty = True
+            self.records_since_snapshot += 1
+            if self.fsync_interval <= 0:
+                self._sync_locked()
+        return lsn
+
+    def _sync_locked(self) -> None:
+        if self._dirty:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._dirty = False
+
+    def sync(self) -> None:
+        """Fuerza el fsync de los registros pendientes"""
+        with self._lock:
+            self._sync_locked()
+
+    def _sync_loop(self) -> None:
+        while not self._closed.wait(self.fsync_interval):
+            self.sync()
+
+    def rotate(self) -> int:
+        """
+        Cierra el segmento actual y abre uno nuevo.
+
+        Returns:
+            int: Último LSN del segmento cerrado; un snapshot del estado actual
+            corresponde exactamente a ese LSN
+        """
+        with self._lock:
+            self._sync_locked()
+            self._file.close()
+            self._file = self._open_segment(self._lsn + 1)
+            self.records_since_snapshot = 0
+            return self._lsn
+
+    def write_snapshot(
+        self,
+        lsn: int,
+        productos: Sequence[Any],
+        to_dict: Callable[[Any], dict] = None,
+        next_id: int = 1,
+        reservations: Sequence[dict] = ()
+    ) -> None:
+        """
+        Escribe un snapshot atómico (archivo temporal + rename) del estado en
+        `lsn` y elimina los segmentos que ya cubre. `to_dict` convierte cada
+        elemento a la forma `Producto` si no son dict; `next_id` es el estado
+        del asignador de IDs y `reservations` las reservas vigentes.
+        """
+        path = os.path.join(self.directory, SNAPSHOT_FILE)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_SNAPSHOT_MAGIC)
+            f.write(_SNAPSHOT_HEADER.pack(lsn, len(productos), next_id, len(reservations)))
+            entradas = (to_dict(product) if to_dict else product for product in productos)
+            for entrada in chain(entradas, reservations):
+                payload = _encode(entrada)
+                f.write(_SNAPSHOT_ENTRY.pack(len(payload), zlib.crc32(payload)))
+                f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        _fsync_directory(self.directory)
+
+        for start_lsn, segment_path in _segments(self.directory):
+            if start_lsn <= lsn:
+                os.remove(segment_path)
+
+    def close(self) -> None:
+        self._closed.set()
+        if self._syncer is not None:
+            self._syncer.join()
+        with self._lock:
+            self._sync_locked()
+            self._file.close()
+
+
+async def snapshot_periodically(store, log: WriteAheadLog, interval: float) -> None:
+    """
+    Tarea en segundo plano: cada `interval` segundos, si hubo escrituras,
+    rota el log y escribe un snapshot compacto en un hilo aparte.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        if log.records_since_snapshot == 0:
+            continue
+        # Rotación y copia de referencias sin await de por medio: el estado
+        # capturado corresponde exactamente al LSN retornado. La conversión a
+        # dict y la serialización ocurren fuera del event loop
+        lsn = log.rotate()
+        records = store.records()
+        reservations = store.reservations()
+        await asyncio.to_thread(
+            log.write_snapshot, lsn, records, ProductRecord.to_dict, store.next_id, reservations
+        )
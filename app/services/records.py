@@ -0,0 +1,237 @@
+"""
+Representación compacta de productos para el almacén en memoria.
+
+Un producto como dict anidado (dict -> lista de dicts -> lista de dicts)
+ocupa varias veces el tamaño de sus datos. ProductRecord usa __slots__ y
+guarda las especificaciones como una única tupla plana
+(grupo, atributo, valor, grupo, atributo, valor, ...); la forma `Producto`
+se reconstruye solo al entregar el producto.
+
+Cada registro conserva además su codificación JSON final (ver
+ProductRecord.json): como las escrituras reemplazan el registro, solo se
+vuelve a codificar un producto que cambió.
+
+Los campos de baja cardinalidad (categoria, marca, created_by, updated_by y
+los nombres de grupo y atributo de las especificaciones) se guardan
+codificados como enteros de la tabla de símbolos compartida SYMBOLS.
+"""
+import sys
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from app.utils.validators import ESCAPED
+
+# Un grupo sin detalles se conserva como (grupo, None, None)
+_EMPTY = None
+
+
+class SymbolTable:
+    """
+    Diccionario de codificación string <-> código entero.
+
+    Cada string distinto se guarda una sola vez y los registros referencian
+    su código. Los símbolos no se eliminan: la tabla crece con la cantidad
+    de valores distintos, no con la de productos.
+    """
+
+    def __init__(self):
+        self._codes: Dict[str, int] = {}
+        self._strings: List[str] = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._strings)
+
+    def encode(self, value: Optional[str]) -> Optional[int]:
+        """Código del string, registrándolo si es nuevo"""
+        if value is None:
+            return None
+        code = self._codes.get(value)
+        if code is None:
+            with self._lock:
+                code = self._codes.get(value)
+                if code is None:
+                    code = len(self._strings)
+                    self._strings.append(value)
+                    self._codes[value] = code
+        return code
+
+    def lookup(self, value: str) -> Optional[int]:
+        """Código del string sin registrarlo (None si nunca se ha visto)"""
+        return self._codes.get(value)
+
+    def decode(self, code: Optional[int]) -> Optional[str]:
+        return None if code is None else self._strings[code]
+
+
+SYMBOLS = SymbolTable()
+
+
+# Rangos que caben en las columnas int64/float64 de ColumnStore
+INT64_RANGE = (0, 2 ** 63 - 1)
+FLOAT_RANGE = (0.0, sys.float_info.max)
+
+
+def _require(
+    field: str,
+    value: Any,
+    types,
+    nullable: bool = False,
+    bounds: Optional[Tuple[Any, Any]] = None
+) -> Any:
+    """
+    Verifica el tipo (y el rango, si se indica `bounds`) de un campo antes
+    de crear el registro: los índices lo ordenan, suman o tokenizan, y un
+    valor inválido fallaría a mitad de la indexación (o ya escrito en el
+    log). Los NaN e infinitos quedan fuera de cualquier rango finito.
+    """
+    if value is None and nullable:
+        return value
+    if isinstance(value, bool) or not isinstance(value, types):
+        raise TypeError(f"Valor inválido para {field}: {value!r}")
+    if bounds is not None and not bounds[0] <= value <= bounds[1]:
+        raise ValueError(f"Valor fuera de rango para {field}: {value!r}")
+    return value
+
+
+def flatten_specs(especificaciones: Optional[List[Dict[str, Any]]]) -> Tuple[Any, ...]:
+    """Aplana la lista anidada de especificaciones en una tupla de tríos codificados"""
+    encode = SYMBOLS.encode
+    flat: List[Any] = []
+    for grupo in especificaciones or ():
+        grupo_code = encode(_require("grupo", grupo["grupo"], str))
+        detalles = grupo.get("detalles") or ()
+        if not detalles:
+            flat.extend((grupo_code, _EMPTY, _EMPTY))
+        for detalle in detalles:
+            flat.extend((
+                grupo_code,
+                encode(_require("atributo", detalle["atributo"], str)),
+                _require("valor", detalle["valor"], str)
+            ))
+    return tuple(flat)
+
+
+def unflatten_specs(specs: Tuple[Any, ...]) -> List[Dict[str, Any]]:
+    """Reconstruye la lista anidada; tríos consecutivos del mismo grupo se agrupan"""
+    decode = SYMBOLS.decode
+    especificaciones: List[Dict[str, Any]] = []
+    current = None
+    current_code = None
+    for pos in range(0, len(specs), 3):
+        grupo_code, atributo_code, valor = specs[pos:pos + 3]
+        if current is None or current_code != grupo_code:
+            current = {"grupo": decode(grupo_code), "detalles": []}
+            current_code = grupo_code
+            especificaciones.append(current)
+        if atributo_code is not _EMPTY:
+            current["detalles"].append({"atributo": decode(atributo_code), "valor": valor})
+    return especificaciones
+
+
+class ProductRecord:
+    """
+    Producto inmutable por convención: cada escritura crea un registro nuevo.
+
+    `categoria`, `marca`, `created_by` y `updated_by` contienen códigos de
+    SYMBOLS; to_dict() los decodifica. `escaped` es el marcador ESCAPED
+    de un producto guardado ya escapado (None si no lo está).
+    """
+
+    __slots__ = (
+        "id", "nombre", "precio", "categoria", "marca", "stock", "specs",
+        "created_at", "updated_at", "created_by", "updated_by", "escaped", "_json"
+    )
+
+    def __init__(
+        self,
+        id: int,
+        nombre: str,
+        precio: float,
+        categoria: int,
+        marca: int,
+        stock: int,
+        specs: Tuple[Any, ...],
+        created_at: str,
+        updated_at: str,
+        created_by: Optional[int],
+        updated_by: Optional[int],
+        escaped: Optional[Tuple[str, ...]] = None
+    ):
+        self.id = id
+        self.nombre = nombre
+        self.precio = precio
+        self.categoria = categoria
+        self.marca = marca
+        self.stock = stock
+        self.specs = specs
+        self.created_at = created_at
+        self.updated_at = updated_at
+        self.created_by = created_by
+        self.updated_by = updated_by
+        self.escaped = escaped
+        # (encoder, bytes) de la última codificación entregada por json()
+        self._json: Optional[Tuple[Callable[[Dict[str, Any]], bytes], bytes]] = None
+
+    @classmethod
+    def from_dict(cls, product: Dict[str, Any]) -> "ProductRecord":
+        """
+        Raises:
+            KeyError: Si falta un campo obligatorio
+            TypeError: Si un campo no tiene el tipo de `Producto`
+            ValueError: Si id, precio o stock no caben en las columnas
+        """
+        encode = SYMBOLS.encode
+        return cls(
+            _require("id", product["id"], int, bounds=INT64_RANGE),
+            _require("nombre", product["nombre"], str),
+            _require("precio", product["precio"], (int, float), bounds=FLOAT_RANGE),
+            encode(_require("categoria", product["categoria"], str)),
+            encode(_require("marca", product["marca"], str)),
+            _require("stock", product["stock"], int, bounds=INT64_RANGE),
+            flatten_specs(product.get("especificaciones")),
+            _require("created_at", product["created_at"], str),
+            _require("updated_at", product["updated_at"], str),
+            encode(_require("created_by", product.get("created_by"), str, nullable=True)),
+            encode(_require("updated_by", product.get("updated_by"), str, nullable=True)),
+            tuple(product[ESCAPED]) if product.get(ESCAPED) else None
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Producto con la forma de `Producto`"""
+        decode = SYMBOLS.decode
+        product = {
+            "id": self.id,
+            "nombre": self.nombre,
+            "precio": self.precio,
+            "categoria": decode(self.categoria),
+            "marca": decode(self.marca),
+            "stock": self.stock,
+            "especificaciones": unflatten_specs(self.specs),
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "created_by": decode(self.created_by),
+            "updated_by": decode(self.updated_by)
+        }
+        if self.escaped:
+            product[ESCAPED] = self.escaped
+        return product
+
+    def json(self, encode: Callable[[Dict[str, Any]], bytes]) -> bytes:
+        """
+        to_dict() codificado con `encode`, calculado en la primera lectura y
+        conservado mientras el registro siga vigente. Si se pide con otro
+        encoder se vuelve a codificar.
+        """
+        cached = self._json
+        if cached is None or cached[0] is not encode:
+            # Dos lectores simultáneos pueden codificar ambos: el resultado es el mismo
+            cached = self._json = (encode, encode(self.to_dict()))
+        return cached[1]
+
+    def spec_pairs(self) -> Iterator[Tuple[int, str]]:
+        """Pares (código de atributo, valor) de las especificaciones"""
+        specs = self.specs
+        for pos in range(0, len(specs), 3):
+            if specs[pos + 1] is not _EMPTY:
+                yield specs[pos + 1], specs[pos + 2]
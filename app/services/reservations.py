@@ -0,0 +1,146 @@
+"""
+Reservas de stock con expiración.
+
+Una reserva descuenta el stock de varios productos en una sola operación
+atómica: se verifica y se descuenta todo, o no se toca nada. La reserva vive
+`ttl` segundos; al confirmarla el descuento queda firme y al liberarla (o al
+expirar) el stock se devuelve.
+
+La atomicidad y la persistencia las resuelve el repositorio
+(reserve_stock, finish_reservation, expire_reservations): en memoria bajo un
+lock y en el WAL junto con el stock descontado, en SQLite con un descuento
+condicional dentro de BEGIN IMMEDIATE y una tabla de reservas. Así una
+reserva sobrevive a un reinicio y, con SQLite, cualquier worker puede
+confirmarla o liberarla. El vencimiento se guarda como hora Unix para que
+sea comparable entre procesos.
+"""
+import asyncio
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+
+class ProductsNotFound(LookupError):
+    """Algún producto de la reserva no existe"""
+
+    def __init__(self, ids: List[int]):
+        super().__init__(f"Productos no encontrados: {ids}")
+        self.ids = ids
+
+
+class InsufficientStock(ValueError):
+    """Algún producto no tiene stock suficiente para la reserva"""
+
+    def __init__(self, faltantes: List[dict]):
+        super().__init__(f"Stock insuficiente: {faltantes}")
+        self.faltantes = faltantes
+
+
+def new_reservation(items: Dict[int, int], ttl: float, actor: Optional[str]) -> dict:
+    """Reserva en su forma persistida: vencimiento como hora Unix (`deadline`) y actor"""
+    deadline = time.time() + ttl
+    return {
+        "reservation_id": uuid.uuid4().hex,
+        "items": [{"id": product_id, "qty": qty} for product_id, qty in items.items()],
+        "expires_at": datetime.fromtimestamp(deadline, timezone.utc).isoformat(),
+        "deadline": deadline,
+        "actor": actor
+    }
+
+
+def public_reservation(reservation: dict) -> dict:
+    """Forma de `Reserva` para la API"""
+    return {field: reservation[field] for field in ("reservation_id", "expires_at", "items")}
+
+
+def reservation_items(reservation: dict) -> Dict[int, int]:
+    return {line["id"]: line["qty"] for line in reservation["items"]}
+
+
+class StockReservations:
+    """
+    Reservas sobre un ProductRepository.
+
+    `timestamp` entrega la marca de tiempo de auditoría de cada escritura y
+    `on_write(productos, timestamp)`, si se indica, recibe cada lote escrito.
+    Las reservas vencidas se liberan al inicio de cada operación (y
+    periódicamente desde expire_periodically).
+    """
+
+    def __init__(
+        self,
+        repository,
+        ttl: float,
+        timestamp: Callable[[], str],
+        on_write: Optional[Callable[[List[dict], str], object]] = None
+    ):
+        self.repository = repository
+        self.ttl = ttl
+        self._timestamp = timestamp
+        self._on_write = on_write
+
+    def __len__(self) -> int:
+        return self.repository.reservation_count()
+
+    def reserve(self, lines: Sequence[Tuple[int, int]], actor: Optional[str] = None) -> dict:
+        """
+        Reserva `qty` unidades de cada (id, qty); las líneas repetidas del
+        mismo producto se suman.
+
+        Raises:
+            ProductsNotFound: Si algún producto no existe
+            InsufficientStock: Si algún producto no alcanza; no se descuenta nada
+        """
+        items: Dict[int, int] = {}
+        for product_id, qty in lines:
+            items[product_id] = items.get(product_id, 0) + qty
+
+        self.expire()
+        reservation = new_reservation(items, self.ttl, actor)
+        timestamp = self._timestamp()
+        self._notify(self.repository.reserve_stock(reservation, timestamp), timestamp)
+        return public_reservation(reservation)
+
+    def confirm(self, reservation_id: str) -> Optional[dict]:
+        """Deja firme el descuento; None si la reserva no existe o ya expiró"""
+        return self._finish(reservation_id, restore=False)
+
+    def release(self, reservation_id: str) -> Optional[dict]:
+        """Devuelve el stock reservado; None si la reserva no existe o ya expiró"""
+        return self._finish(reservation_id, restore=True)
+
+    def expire(self) -> int:
+        """Libera las reservas vencidas; retorna cuántas se liberaron"""
+        timestamp = self._timestamp()
+        vencidas = self.repository.expire_reservations(time.time(), timestamp)
+        for _, productos in vencidas:
+            self._notify(productos, timestamp)
+        return len(vencidas)
+
+    def _finish(self, reservation_id: str, restore: bool) -> Optional[dict]:
+        self.expire()
+        timestamp = self._timestamp()
+        cerrada = self.repository.finish_reservation(reservation_id, restore, timestamp)
+        if cerrada is None:
+            return None
+        reservation, productos = cerrada
+        self._notify(productos, timestamp)
+        return public_reservation(reservation)
+
+    def _notify(self, productos: List[dict], timestamp: str) -> None:
+        if self._on_write is not None and productos:
+            self._on_write(productos, timestamp)
+
+
+async def expire_periodically(reservations: StockReservations, interval: float, blocking: bool = False) -> None:
+    """
+    Tarea en segundo plano: libera reservas vencidas aunque no haya tráfico.
+    Con `blocking` (almacén con E/S) la expiración corre en un hilo aparte.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        if blocking:
+            await asyncio.to_thread(reservations.expire)
+        else:
+            reservations.expire()
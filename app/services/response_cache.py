@@ -0,0 +1,212 @@
+"""
+Caché de respuestas de lectura de productos sobre el backend de FastAPICache.
+
+Un índice LRU en proceso decide qué está vigente: cada clave lógica
+("product:<id>" o "list:<filtros>") apunta a una clave versionada del
+backend, que incluye la secuencia del catálogo con que se generó. Las
+escrituras invalidan con precisión a partir del registro de cambios:
+
+- la entrada del producto modificado;
+- los listados que lo contenían, o cuyos filtros cumple su nuevo estado.
+  Con paginación keyset una página solo cambia en esos dos casos.
+
+Las invalidaciones son síncronas sobre el índice (una clave fuera del
+índice nunca se sirve) y el borrado en el backend se completa en la
+siguiente operación asíncrona.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from fastapi_cache import FastAPICache
+from fastapi_cache.types import Backend
+
+# Sobre este tamaño de lote (p. ej. cargas masivas) se descartan todos los
+# listados en vez de evaluar cada uno contra cada cambio
+_BULK_INVALIDATION = 64
+
+
+class _Entry:
+    __slots__ = ("backend_key", "ids", "filtros")
+
+    def __init__(self, backend_key: str, ids: FrozenSet[int], filtros: Optional[dict]):
+        self.backend_key = backend_key
+        self.ids = ids
+        self.filtros = filtros
+
+
+def list_key(**params) -> str:
+    """Clave lógica de un listado a partir de sus parámetros de consulta"""
+    canonical = json.dumps(params, sort_keys=True, separators=(",", ":"), default=list)
+    return "list:" + hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+
+
+def product_key(product_id: int) -> str:
+    return f"product:{product_id}"
+
+
+def _matches(filtros: dict, producto: dict) -> bool:
+    """Indica si un producto cumple los filtros de igualdad y rango de un listado"""
+    for field in ("categoria", "marca"):
+        if filtros.get(field) is not None and producto[field] != filtros[field]:
+            return False
+    if filtros.get("precio_min") is not None and producto["precio"] < filtros["precio_min"]:
+        return False
+    if filtros.get("precio_max") is not None and producto["precio"] > filtros["precio_max"]:
+        return False
+    specs = filtros.get("specs")
+    if specs:
+        pares = {
+            (detalle["atributo"], detalle["valor"])
+            for grupo in producto.get("especificaciones") or ()
+            for detalle in grupo["detalles"]
+        }
+        return all(tuple(spec) in pares for spec in specs)
+    return True
+
+
+class ResponseCache:
+    """
+    Respuestas serializadas con expulsión LRU e invalidación por escritura.
+
+    Se suscribe a `changelog` (un ChangeLog) para invalidar y toma de él la
+    versión del catálogo. `max_entries` acota el índice; `ttl` es solo una
+    red de seguridad para el backend, que guarda cada valor con expiración.
+    Con `enabled` en False no se guarda ni se sirve nada: es lo que
+    corresponde si `changelog` no ve todas las escrituras (otros procesos
+    escriben en el mismo almacenamiento).
+    """
+
+    def __init__(
+        self,
+        changelog,
+        max_entries: int,
+        ttl: int,
+        namespace: str = "responses",
+        enabled: bool = True
+    ):
+        self.changelog = changelog
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._pending: List[str] = []
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        changelog.subscribe(self.invalidate)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations
+        }
+
+    def version(self) -> Tuple[str, int]:
+        """Versión actual del catálogo (época, secuencia), a capturar antes de leer"""
+        return self.changelog.epoch, self.changelog.last_seq
+
+    def backend(self) -> Optional[Backend]:
+        """Backend de FastAPICache, o None si no se inicializó o la caché está deshabilitada"""
+        if not self.enabled:
+            return None
+        try:
+            return FastAPICache.get_backend()
+        except AssertionError:
+            return None
+
+    async def get(self, key: str) -> Optional[bytes]:
+        backend = self.backend()
+        if backend is None:
+            return None
+        await self._purge(backend)
+        with self._lock:
+            entry = self._entries.get(key)
+        data = await backend.get(entry.backend_key) if entry is not None else None
+        with self._lock:
+            if data is None:
+                self.misses += 1
+                # Expiró en el backend: se quita del índice
+                if entry is not None and self._entries.get(key) is entry:
+                    del self._entries[key]
+                return None
+            if self._entries.get(key) is not entry:
+                # Invalidada mientras se leía
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return data
+
+    async def set(
+        self,
+        key: str,
+        data: bytes,
+        version: Tuple[str, int],
+        ids: Iterable[int],
+        filtros: Optional[dict] = None
+    ) -> None:
+        """
+        Guarda `data` generado con la versión del catálogo `version` (época,
+        secuencia). Si hubo escrituras desde entonces no se guarda nada: el
+        resultado podría no reflejarlas.
+        """
+        backend = self.backend()
+        if backend is None:
+            return
+        epoch, seq = version
+        backend_key = f"{self.namespace}:{key}:{epoch}-{seq}"
+        await backend.set(backend_key, data, expire=self.ttl)
+        with self._lock:
+            if self.version() != version:
+                self._pending.append(backend_key)
+                return
+            anterior = self._entries.pop(key, None)
+            if anterior is not None and anterior.backend_key != backend_key:
+                self._pending.append(anterior.backend_key)
+            self._entries[key] = _Entry(backend_key, frozenset(ids), filtros)
+            while len(self._entries) > self.max_entries:
+                _, expulsada = self._entries.popitem(last=False)
+                self._pending.append(expulsada.backend_key)
+                self.evictions += 1
+
+    def invalidate(self, entradas: List[dict]) -> None:
+        """Descarta las entradas afectadas por un grupo de cambios del catálogo"""
+        with self._lock:
+            afectadas = {product_key(e["id"]) for e in entradas} & self._entries.keys()
+            if len(entradas) > _BULK_INVALIDATION:
+                afectadas.update(k for k, entry in self._entries.items() if entry.filtros is not None)
+            else:
+                ids = {e["id"] for e in entradas}
+                nuevos = [e["product"] for e in entradas if e["product"] is not None]
+                for key, entry in self._entries.items():
+                    if entry.filtros is None:
+                        continue
+                    if not ids.isdisjoint(entry.ids) or any(_matches(entry.filtros, p) for p in nuevos):
+                        afectadas.add(key)
+            for key in afectadas:
+                self._pending.append(self._entries.pop(key).backend_key)
+            self.invalidations += len(afectadas)
+
+    async def _purge(self, backend: Backend) -> None:
+        """Borra del backend las claves invalidadas o expulsadas"""
+        with self._lock:
+            pendientes, self._pending = self._pending, []
+        for backend_key in pendientes:
+            try:
+                await backend.clear(key=backend_key)
+            except KeyError:
+                # Ya había expirado en el backend
+                pass
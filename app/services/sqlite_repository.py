@@ -0,0 +1,474 @@
+"""
+Repositorio de productos sobre SQLite.
+
+Usa modo WAL (varios lectores junto a un escritor, de modo que varios
+workers de uvicorn pueden compartir el mismo archivo), un pool de
+conexiones y sentencias SQL constantes que sqlite3 mantiene preparadas en la
+caché de cada conexión. Las especificaciones se guardan como JSON; los pares
+(atributo, valor) y el texto buscable se replican en tablas auxiliares. La
+columna `escaped` guarda el marcador ESCAPED separado por comas.
+
+Las reservas de stock se guardan en `stock_reservations` y se crean o
+cierran en una transacción BEGIN IMMEDIATE junto con el ajuste de stock,
+de modo que son atómicas y visibles para todos los workers.
+"""
+import json
+import queue
+import sqlite3
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+from app.core.interfaces.repository import ProductRepository
+from app.services.indexes import tokenize
+from app.services.reservations import InsufficientStock, ProductsNotFound, reservation_items
+from app.utils.validators import ESCAPED
+
+_COLUMNS = (
+    "id", "nombre", "precio", "categoria", "marca", "stock", "especificaciones",
+    "created_at", "updated_at", "created_by", "updated_by", "escaped"
+)
+_SELECT = f"SELECT {', '.join(_COLUMNS)} FROM products"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY,
+    nombre TEXT NOT NULL,
+    precio REAL NOT NULL,
+    categoria TEXT NOT NULL,
+    marca TEXT NOT NULL,
+    stock INTEGER NOT NULL,
+    especificaciones TEXT NOT NULL DEFAULT '[]',
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    created_by TEXT,
+    updated_by TEXT,
+    escaped TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_products_categoria ON products(categoria);
+CREATE INDEX IF NOT EXISTS idx_products_marca ON products(marca);
+CREATE INDEX IF NOT EXISTS idx_products_precio ON products(precio, id);
+
+CREATE TABLE IF NOT EXISTS product_specs (
+    product_id INTEGER NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+    atributo TEXT NOT NULL,
+    valor TEXT NOT NULL,
+    PRIMARY KEY (product_id, atributo, valor)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_product_specs_facet ON product_specs(atributo, valor, product_id);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+    nombre, especificaciones, tokenize = 'unicode61 remove_diacritics 2'
+);
+
+CREATE TABLE IF NOT EXISTS id_allocator (
+    name TEXT PRIMARY KEY,
+    next_id INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO id_allocator (name, next_id)
+SELECT 'products', COALESCE(MAX(id), 0) + 1 FROM products;
+
+CREATE TABLE IF NOT EXISTS stock_reservations (
+    id TEXT PRIMARY KEY,
+    items TEXT NOT NULL,
+    expires_at TEXT NOT NULL,
+    deadline REAL NOT NULL,
+    actor TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_stock_reservations_deadline ON stock_reservations(deadline);
+"""
+
+_UPSERT = f"""
+INSERT INTO products ({', '.join(_COLUMNS)})
+VALUES ({', '.join('?' for _ in _COLUMNS)})
+ON CONFLICT(id) DO UPDATE SET
+{', '.join(f'{c} = excluded.{c}' for c in _COLUMNS[1:])}
+"""
+
+# Ajuste condicional: no actualiza (ni retorna) si el stock quedaría negativo
+_ADJUST_STOCK = f"""
+UPDATE products SET stock = stock + ?, updated_at = ?, updated_by = ?
+WHERE id = ? AND stock + ? >= 0
+RETURNING {', '.join(_COLUMNS)}
+"""
+
+_RESERVATION_COLUMNS = ("id", "items", "expires_at", "deadline", "actor")
+
+
+class SQLiteProductRepository(ProductRepository):
+    """
+    Implementación de ProductRepository persistida en un archivo SQLite.
+
+    Cada operación toma una conexión del pool y la devuelve al terminar; las
+    escrituras se ejecutan en una transacción que actualiza la tabla de
+    productos, la de especificaciones y el índice FTS5 a la vez.
+    """
+
+    def __init__(self, path: str, pool_size: int = 4, timeout: float = 5.0):
+        self.path = path
+        self.timeout = timeout
+        self._pool: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue(maxsize=pool_size)
+        for _ in range(pool_size):
+            self._pool.put(self._connect())
+        with self._connection() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.timeout,
+            check_same_thread=False,
+            cached_statements=256
+        )
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA foreign_keys = ON")
+        return conn
+
+    @contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    @contextmanager
+    def _immediate(self) -> Iterator[sqlite3.Connection]:
+        """Transacción que toma el lock de escritura al comenzar (BEGIN IMMEDIATE)"""
+        with self._connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+
+    def close(self) -> None:
+        """Cierra todas las conexiones del pool"""
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+
+    @staticmethod
+    def _to_dict(row: Sequence[Any]) -> dict:
+        product = dict(zip(_COLUMNS, row))
+        product["especificaciones"] = json.loads(product["especificaciones"])
+        escaped = product.pop("escaped")
+        if escaped:
+            product[ESCAPED] = tuple(escaped.split(","))
+        return product
+
+    def __len__(self) -> int:
+        with self._connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+
+    def get(self, product_id: int) -> Optional[dict]:
+        with self._connection() as conn:
+            row = conn.execute(f"{_SELECT} WHERE id = ?", (product_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def put(self, product: dict) -> dict:
+        with self._connection() as conn, conn:
+            self._write(conn, product)
+        return product
+
+    def put_many(self, products: Sequence[dict]) -> Sequence[dict]:
+        # Un lote completo en una sola transacción (un commit)
+        with self._connection() as conn, conn:
+            for product in products:
+                self._write(conn, product)
+        return products
+
+    @staticmethod
+    def _write(conn: sqlite3.Connection, product: dict) -> None:
+        """Escribe un producto en las tres tablas, dentro de la transacción en curso"""
+        especificaciones = product.get("especificaciones") or []
+        values = [product.get(c) for c in _COLUMNS]
+        values[_COLUMNS.index("escaped")] = ",".join(product[ESCAPED]) if product.get(ESCAPED) else None
+        values[_COLUMNS.index("especificaciones")] = json.dumps(
+            especificaciones, ensure_ascii=False, separators=(",", ":")
+        )
+        pairs = {
+            (detalle["atributo"], detalle["valor"])
+            for grupo in especificaciones
+            for detalle in grupo.get("detalles") or []
+        }
+        texto = " ".join(valor for _, valor in pairs)
+
+        conn.execute(_UPSERT, values)
+        conn.execute(
+            "UPDATE id_allocator SET next_id = MAX(next_id, ? + 1) WHERE name = 'products'",
+            (product["id"],)
+        )
+        conn.execute("DELETE FROM product_specs WHERE product_id = ?", (product["id"],))
+        conn.executemany(
+            "INSERT INTO product_specs (product_id, atributo, valor) VALUES (?, ?, ?)",
+            [(product["id"], atributo, valor) for atributo, valor in pairs]
+        )
+        conn.execute("DELETE FROM products_fts WHERE rowid = ?", (product["id"],))
+        conn.execute(
+            "INSERT INTO products_fts (rowid, nombre, especificaciones) VALUES (?, ?, ?)",
+            (product["id"], product.get("nombre") or "", texto)
+        )
+
+    def remove(self, product_id: int) -> Optional[dict]:
+        with self._connection() as conn, conn:
+            row = conn.execute(f"{_SELECT} WHERE id = ?", (product_id,)).fetchone()
+            if row is None:
+                return None
+            # product_specs se elimina en cascada
+            conn.execute("DELETE FROM products WHERE id = ?", (product_id,))
+            conn.execute("DELETE FROM products_fts WHERE rowid = ?", (product_id,))
+        return self._to_dict(row)
+
+    def reserve_stock(self, reservation: dict, timestamp: str) -> List[dict]:
+        items = reservation_items(reservation)
+        with self._immediate() as conn:
+            actualizados = []
+            rechazados = []
+            for product_id, qty in items.items():
+                row = conn.execute(
+                    _ADJUST_STOCK, (-qty, timestamp, reservation["actor"], product_id, -qty)
+                ).fetchone()
+                if row is None:
+                    rechazados.append(product_id)
+                else:
+                    actualizados.append(self._to_dict(row))
+            if rechazados:
+                # La excepción revierte los descuentos ya hechos en la transacción
+                marcadores = ", ".join("?" for _ in rechazados)
+                stock = dict(conn.execute(
+                    f"SELECT id, stock FROM products WHERE id IN ({marcadores})", rechazados
+                ))
+                faltantes = [product_id for product_id in rechazados if product_id not in stock]
+                if faltantes:
+                    raise ProductsNotFound(faltantes)
+                raise InsufficientStock([
+                    {"id": product_id, "requested": items[product_id], "available": stock[product_id]}
+                    for product_id in rechazados
+                ])
+            conn.execute(
+                f"INSERT INTO stock_reservations ({', '.join(_RESERVATION_COLUMNS)}) VALUES (?, ?, ?, ?, ?)",
+                (
+                    reservation["reservation_id"],
+                    json.dumps(reservation["items"], separators=(",", ":")),
+                    reservation["expires_at"],
+                    reservation["deadline"],
+                    reservation["actor"]
+                )
+            )
+        return actualizados
+
+    def finish_reservation(
+        self,
+        reservation_id: str,
+        restore: bool,
+        timestamp: str
+    ) -> Optional[Tuple[dict, List[dict]]]:
+        with self._immediate() as conn:
+            row = conn.execute(
+                f"DELETE FROM stock_reservations WHERE id = ? RETURNING {', '.join(_RESERVATION_COLUMNS)}",
+                (reservation_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            reservation = self._to_reservation(row)
+            return reservation, self._restore(conn, reservation, timestamp) if restore else []
+
+    def get_reservation(self, reservation_id: str) -> Optional[dict]:
+        with self._connection() as conn:
+            row = conn.execute(
+                f"SELECT {', '.join(_RESERVATION_COLUMNS)} FROM stock_reservations WHERE id = ?",
+                (reservation_id,)
+            ).fetchone()
+        return self._to_reservation(row) if row is not None else None
+
+    def expire_reservations(self, now: float, timestamp: str) -> List[Tuple[dict, List[dict]]]:
+        with self._immediate() as conn:
+            rows = conn.execute(
+                f"DELETE FROM stock_reservations WHERE deadline <= ? RETURNING {', '.join(_RESERVATION_COLUMNS)}",
+                (now,)
+            ).fetchall()
+            vencidas = [self._to_reservation(row) for row in rows]
+            return [(reservation, self._restore(conn, reservation, timestamp)) for reservation in vencidas]
+
+    def reservation_count(self) -> int:
+        with self._connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM stock_reservations").fetchone()[0]
+
+    def _restore(self, conn: sqlite3.Connection, reservation: dict, timestamp: str) -> List[dict]:
+        """Devuelve el stock de una reserva; un producto borrado mientras tanto no lo recupera"""
+        actualizados = []
+        for product_id, qty in reservation_items(reservation).items():
+            row = conn.execute(
+                _ADJUST_STOCK, (qty, timestamp, reservation["actor"], product_id, qty)
+            ).fetchone()
+            if row is not None:
+                actualizados.append(self._to_dict(row))
+        return actualizados
+
+    @staticmethod
+    def _to_reservation(row: Sequence[Any]) -> dict:
+        reservation_id, items, expires_at, deadline, actor = row
+        return {
+            "reservation_id": reservation_id,
+            "items": json.loads(items),
+            "expires_at": expires_at,
+            "deadline": deadline,
+            "actor": actor
+        }
+
+    def max_id(self) -> int:
+        with self._connection() as conn:
+            return conn.execute("SELECT COALESCE(MAX(id), 0) FROM products").fetchone()[0]
+
+    def allocate_id(self) -> int:
+        # El UPDATE toma el lock de escritura de SQLite: es atómico entre
+        # hilos y también entre procesos que comparten el archivo
+        with self._connection() as conn, conn:
+            return conn.execute(
+                "UPDATE id_allocator SET next_id = next_id + 1 "
+                "WHERE name = 'products' RETURNING next_id - 1"
+            ).fetchone()[0]
+
+    @staticmethod
+    def _where(
+        precio_min: Optional[float] = None,
+        precio_max: Optional[float] = None,
+        categoria: Optional[str] = None,
+        marca: Optional[str] = None,
+        specs: Optional[Sequence[Tuple[str, str]]] = None
+    ) -> Tuple[List[str], List[Any]]:
+        clauses: List[str] = []
+        params: List[Any] = []
+        if categoria is not None:
+            clauses.append("categoria = ?")
+            params.append(categoria)
+        if marca is not None:
+            clauses.append("marca = ?")
+            params.append(marca)
+        if precio_min is not None:
+            clauses.append("precio >= ?")
+            params.append(precio_min)
+        if precio_max is not None:
+            clauses.append("precio <= ?")
+            params.append(precio_max)
+        for atributo, valor in specs or ():
+            clauses.append(
+                "id IN (SELECT product_id FROM product_specs WHERE atributo = ? AND valor = ?)"
+            )
+            params.extend((atributo, valor))
+        return clauses, params
+
+    def scan(
+        self,
+        after: Optional[Sequence] = None,
+        sort: Optional[str] = None,
+        precio_min: Optional[float] = None,
+        precio_max: Optional[float] = None,
+        limit: Optional[int] = None,
+        **filtros
+    ) -> Iterator[dict]:
+        clauses, params = self._where(precio_min, precio_max, **filtros)
+        if sort is None:
+            order = "id"
+            if after is not None:
+                clauses.append("id > ?")
+                params.append(after[0])
+        elif sort == "precio":
+            order = "precio, id"
+            if after is not None:
+                clauses.append("(precio, id) > (?, ?)")
+                params.extend(after)
+        else:
+            order = "precio DESC, id DESC"
+            if after is not None:
+                clauses.append("(precio, id) < (?, ?)")
+                params.extend(after)
+
+        sql = _SELECT
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += f" ORDER BY {order}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        with self._connection() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        for row in rows:
+            yield self._to_dict(row)
+
+    def filter_ids(self, **filtros) -> List[int]:
+        clauses, params = self._where(**filtros)
+        sql = "SELECT id FROM products"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        with self._connection() as conn:
+            return [row[0] for row in conn.execute(sql + " ORDER BY id", params)]
+
+    def facet_counts(
+        self,
+        precio_min: Optional[float] = None,
+        precio_max: Optional[float] = None,
+        **filtros
+    ) -> Dict[str, Dict[str, int]]:
+        clauses, params = self._where(precio_min, precio_max, **filtros)
+        if clauses:
+            sql = (
+                "SELECT s.atributo, s.valor, COUNT(*) FROM product_specs s "
+                "JOIN products ON products.id = s.product_id "
+                "WHERE " + " AND ".join(clauses) + " GROUP BY s.atributo, s.valor"
+            )
+        else:
+            sql = "SELECT atributo, valor, COUNT(*) FROM product_specs GROUP BY atributo, valor"
+        counts: Dict[str, Dict[str, int]] = {}
+        with self._connection() as conn:
+            for atributo, valor, total in conn.execute(sql, params):
+                counts.setdefault(atributo, {})[valor] = total
+        return counts
+
+    def group_stats(self, group_by: str, stock_bajo: int) -> Dict[str, Dict[str, float]]:
+        if group_by not in self.GROUP_BY:
+            raise ValueError(f"Agrupación no soportada: {group_by}")
+        sql = (
+            f"SELECT {group_by}, COUNT(*), SUM(stock), SUM(precio * stock), AVG(precio), "
+            f"MIN(precio), MAX(precio), SUM(stock < ?) FROM products GROUP BY {group_by}"
+        )
+        stats: Dict[str, Dict[str, float]] = {}
+        with self._connection() as conn:
+            for grupo, *values in conn.execute(sql, (stock_bajo,)):
+                stats[grupo] = dict(zip(
+                    ("productos", "stock_total", "valor_stock", "precio_promedio",
+                     "precio_min", "precio_max", "stock_bajo"),
+                    values
+                ))
+        return stats
+
+    def aggregates(self, group_by: str) -> Dict[str, Dict[str, float]]:
+        # Sin agregados mantenidos: es el mismo GROUP BY de group_stats, que
+        # recorre toda la tabla en el orden del índice de la columna (sin
+        # ordenar aparte) leyendo precio y stock de cada fila
+        stats = self.group_stats(group_by, 0)
+        return {
+            grupo: {
+                campo: valores[campo]
+                for campo in ("productos", "stock_total", "precio_min", "precio_max", "precio_promedio")
+            }
+            for grupo, valores in stats.items()
+        }
+
+    def search(self, query: str, limit: int) -> List[dict]:
+        tokens = sorted(set(tokenize(query)))
+        if not tokens:
+            return []
+        # Los tokens son [a-z0-9]+, se citan para que FTS5 no los interprete
+        match = " OR ".join(f'"{token}"' for token in tokens)
+        sql = (
+            f"{_SELECT} JOIN ("
+            "SELECT rowid, bm25(products_fts, 2.0, 1.0) AS rank FROM products_fts "
+            "WHERE products_fts MATCH ? ORDER BY rank, rowid LIMIT ?"
+            ") AS f ON products.id = f.rowid ORDER BY f.rank, products.id"
+        )
+        with self._connection() as conn:
+            rows = conn.execute(sql, (match, limit)).fetchall()
+        return [self._to_dict(row) for row in rows]
@@ -0,0 +1,35 @@
+"""
+ETags y precondiciones HTTP (If-None-Match / If-Match)
+"""
+from typing import List, Optional
+
+
+def make_etag(*partes) -> str:
+    """ETag fuerte a partir de sus componentes"""
+    return '"' + "-".join(str(parte) for parte in partes) + '"'
+
+
+def _tags(header: str) -> List[str]:
+    return [tag.strip() for tag in header.split(",") if tag.strip()]
+
+
+def none_match(header: Optional[str], etag: Optional[str]) -> bool:
+    """
+    True si If-None-Match contiene `etag`: el cliente ya tiene esa versión y
+    corresponde responder 304. Usa la comparación débil (ignora "W/"). Sin
+    ETag (versiones deshabilitadas) nunca se cumple.
+    """
+    if not header or etag is None:
+        return False
+    return any(tag.removeprefix("W/") == etag for tag in _tags(header))
+
+
+def if_match(header: Optional[str], etag: Optional[str]) -> bool:
+    """
+    True si se cumple If-Match (o no viene): "*" o alguna etiqueta igual a
+    `etag` con comparación fuerte. Sin ETag (versiones deshabilitadas) solo
+    se cumple con "*".
+    """
+    if header is None:
+        return True
+    return any(tag == "*" or tag == etag for tag in _tags(header))
@@ -0,0 +1,69 @@
+"""
+Serialización por lotes para la exportación del catálogo (NDJSON y CSV) y
+compresión gzip incremental
+"""
+import csv
+import io
+import json
+import zlib
+from typing import AsyncIterable, AsyncIterator, List, Optional
+
+CSV_COLUMNS = (
+    "id", "nombre", "precio", "categoria", "marca", "stock", "especificaciones",
+    "created_at", "updated_at", "created_by", "updated_by"
+)
+
+
+def ndjson_rows(productos: List[dict]) -> bytes:
+    """Un producto JSON por línea"""
+    return "".join(
+        json.dumps(producto, ensure_ascii=False, separators=(",", ":")) + "\n"
+        for producto in productos
+    ).encode("utf-8")
+
+
+def csv_header() -> bytes:
+    return (",".join(CSV_COLUMNS) + "\r\n").encode("utf-8")
+
+
+def csv_rows(productos: List[dict]) -> bytes:
+    """Filas CSV; las especificaciones anidadas van como JSON en una celda"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for producto in productos:
+        row = [producto.get(column) for column in CSV_COLUMNS]
+        row[CSV_COLUMNS.index("especificaciones")] = json.dumps(
+            producto.get("especificaciones") or [], ensure_ascii=False, separators=(",", ":")
+        )
+        writer.writerow(row)
+    return buffer.getvalue().encode("utf-8")
+
+
+def accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    """Indica si el header Accept-Encoding admite gzip (y no lo excluye con q=0)"""
+    for coding in (accept_encoding or "").split(","):
+        name, _, params = coding.strip().partition(";")
+        if name.strip().lower() not in ("gzip", "*"):
+            continue
+        q = params.strip().lower()
+        if q.startswith("q="):
+            try:
+                return float(q[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+
+async def gzip_stream(chunks: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+    """
+    Comprime un stream en formato gzip (wbits=31) sin acumularlo: cada
+    fragmento de entrada se entrega comprimido con un flush de sincronización,
+    para que el cliente pueda descomprimir a medida que llega.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    async for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,51 @@
+"""
+Lectura incremental de NDJSON (un documento JSON por línea)
+"""
+from typing import AsyncIterable, AsyncIterator, Optional, Tuple
+
+
+async def iter_lines(
+    chunks: AsyncIterable[bytes],
+    max_line_bytes: int
+) -> AsyncIterator[Tuple[int, Optional[bytes]]]:
+    """
+    Separa en líneas un cuerpo recibido por fragmentos, sin acumularlo
+    completo en memoria.
+
+    Args:
+        chunks (AsyncIterable[bytes]): Fragmentos del cuerpo (p. ej. request.stream())
+        max_line_bytes (int): Largo máximo de una línea
+
+    Yields:
+        Tuple[int, Optional[bytes]]: (número de línea desde 1, contenido). Las
+        líneas vacías se omiten; una línea más larga que `max_line_bytes` se
+        descarta y se entrega como None para reportarla sin retenerla.
+    """
+    numero = 0
+    buffer = b""
+    descartando = False
+    async for chunk in chunks:
+        if descartando:
+            # Resto de una línea demasiado larga: se ignora hasta su fin
+            fin = chunk.find(b"\n")
+            if fin < 0:
+                continue
+            numero += 1
+            descartando = False
+            yield numero, None
+            chunk = chunk[fin + 1:]
+        buffer += chunk
+        *lineas, buffer = buffer.split(b"\n")
+        for linea in lineas:
+            numero += 1
+            if len(linea) > max_line_bytes:
+                yield numero, None
+            elif linea.strip():
+                yield numero, linea
+        if len(buffer) > max_line_bytes:
+            descartando = True
+            buffer = b""
+    if descartando:
+        yield numero + 1, None
+    elif buffer.strip():
+        yield numero + 1, buffer
@@ -0,0 +1,54 @@
+"""
+Cursores opacos para paginación keyset
+"""
+import base64
+import json
+from typing import Any, List, Tuple
+
+
+def encode_cursor(key: List[Any]) -> str:
+    """
+    Codifica la clave de continuación de una página como un cursor opaco.
+
+    Args:
+        key (List[Any]): Valores de la clave de orden del último elemento
+
+    Returns:
+        str: Cursor en base64 url-safe
+    """
+    raw = json.dumps(key, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> List[Any]:
+    """
+    Decodifica un cursor generado por encode_cursor.
+
+    Raises:
+        ValueError: Si el cursor está mal formado
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        key = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, UnicodeError) as e:
+        raise ValueError("Cursor inválido") from e
+    if not isinstance(key, list) or not key:
+        raise ValueError("Cursor inválido")
+    return key
+
+
+def decode_sort_key(cursor: str, sort: str = None) -> Tuple[Any, ...]:
+    """
+    Decodifica un cursor y verifica que corresponda al orden solicitado:
+    (id,) para el orden por defecto o (precio, id) al ordenar por precio.
+
+    Raises:
+        ValueError: Si el cursor está mal formado o es de otro orden
+    """
+    key = decode_cursor(cursor)
+    expected = 1 if sort is None else 2
+    if len(key) != expected or not isinstance(key[-1], int):
+        raise ValueError("Cursor inválido")
+    if sort is not None and not isinstance(key[0], (int, float)):
+        raise ValueError("Cursor inválido")
+    return tuple(key)
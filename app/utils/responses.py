@@ -0,0 +1,43 @@
+"""
+Clases de respuesta JSON con codificadores rápidos (orjson, msgspec).
+
+JSON_RESPONSE_CLASS elige la clase por defecto de la aplicación. Con
+"json" FastAPI serializa las rutas con response_model directamente con
+pydantic (dump_json); cualquier otra clase recibe el contenido ya
+validado como objetos Python y lo codifica ella. Las lecturas más
+frecuentes de productos no pasan por aquí: entregan bytes codificados con
+los Struct de msgspec (ver app.models.schemas).
+"""
+from typing import Any, Dict, Type
+
+import msgspec
+import orjson
+from fastapi.responses import JSONResponse
+
+_MSGSPEC_ENCODER = msgspec.json.Encoder()
+
+
+class OrjsonResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        # Claves no string (p. ej. enteros) como en json.dumps
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+class MsgspecResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return _MSGSPEC_ENCODER.encode(content)
+
+
+RESPONSE_CLASSES: Dict[str, Type[JSONResponse]] = {
+    "json": JSONResponse,
+    "orjson": OrjsonResponse,
+    "msgspec": MsgspecResponse,
+}
+
+
+def response_class(name: str) -> Type[JSONResponse]:
+    """Clase de respuesta por nombre de JSON_RESPONSE_CLASS"""
+    try:
+        return RESPONSE_CLASSES[name]
+    except KeyError:
+        raise ValueError(f"JSON_RESPONSE_CLASS debe ser uno de {', '.join(RESPONSE_CLASSES)}")
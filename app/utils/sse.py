@@ -0,0 +1,24 @@
+"""
+Formato Server-Sent Events (text/event-stream)
+"""
+import json
+from typing import Optional
+
+from app.utils.validators import sanitize_output
+
+KEEPALIVE = b": keepalive\n\n"
+
+
+def format_event(event: str, data: dict, event_id: Optional[str] = None) -> bytes:
+    """
+    Un evento SSE. El JSON compacto no contiene saltos de línea, así que
+    cabe en un único campo `data`.
+    """
+    payload = json.dumps(sanitize_output(data), ensure_ascii=False, separators=(",", ":"))
+    cabecera = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{cabecera}event: {event}\ndata: {payload}\n\n".encode("utf-8")
+
+
+def format_change(entrada: dict, event_id: str) -> bytes:
+    """Evento de un cambio del catálogo: nombre = acción, id = cursor de su secuencia"""
+    return format_event(entrada["action"], entrada, event_id)
@@ -1,5 +1,15 @@
 from fastapi import HTTPException
+import html
 import re
+from app.core import config
+
+# Marcador de un producto almacenado ya escapado (SANITIZE_ON_WRITE): tupla
+# con los campos cuyo valor ya pasó por sanitize_output
+ESCAPED = "_escaped"
+PRODUCT_TEXT_FIELDS = (
+    "nombre", "categoria", "marca", "especificaciones",
+    "created_at", "updated_at", "created_by", "updated_by"
+)
 
 def validate_product_input(data: dict) -> None:
     """
@@ -59,9 +69,16 @@ def sanitize_output(data: dict) -> dict:
         data (dict): Datos a sanitizar
         
     Returns:
-        dict: Datos sanitizados
+        dict: Datos sanitizados. Los campos listados en el marcador ESCAPED
+        de un dict se entregan tal cual y el marcador se quita.
     """
     if isinstance(data, dict):
+        escaped = data.get(ESCAPED)
+        if escaped:
+            return {
+                k: v if k in escaped else sanitize_output(v)
+                for k, v in data.items() if k != ESCAPED
+            }
         return {k: sanitize_output(v) for k, v in data.items()}
     elif isinstance(data, list):
         return [sanitize_output(i) for i in data]
@@ -72,4 +89,48 @@ def sanitize_output(data: dict) -> dict:
                    .replace('>', '&gt;')
                    .replace('"', '&quot;')
                    .replace("'", '&#x27;'))
-    return data
\ No newline at end of file
+    return data
+
+
+def escape_on_write(data):
+    """
+    Forma almacenada de un valor de entrada: con SANITIZE_ON_WRITE se
+    escapa una única vez al escribir; si no, se guarda tal cual.
+    """
+    return sanitize_output(data) if config.SANITIZE_ON_WRITE else data
+
+
+def sanitize_stored(value):
+    """
+    Sanitiza un valor leído del almacén que no lleva marcador (claves de
+    facetas y agregados): con SANITIZE_ON_WRITE ya está escapado.
+    """
+    return value if config.SANITIZE_ON_WRITE else sanitize_output(value)
+
+
+def escape_product(product: dict) -> dict:
+    """Escapa los campos de texto aún no escapados de un producto y los marca"""
+    escaped = product.get(ESCAPED) or ()
+    result = sanitize_output(product)
+    result[ESCAPED] = tuple(dict.fromkeys(PRODUCT_TEXT_FIELDS + tuple(escaped)))
+    return result
+
+
+def unescape_product(product: dict) -> dict:
+    """Revierte escape_product: devuelve los campos marcados a su forma original"""
+    escaped = product.get(ESCAPED) or ()
+    return {
+        k: _unescape(v) if k in escaped else v
+        for k, v in product.items() if k != ESCAPED
+    }
+
+
+def _unescape(data):
+    if isinstance(data, dict):
+        return {k: _unescape(v) for k, v in data.items()}
+    elif isinstance(data, list):
+        return [_unescape(i) for i in data]
+    elif isinstance(data, str):
+        # Inversa exacta del escape: todo "&" de la forma escapada es "&amp;"
+        return html.unescape(data)
+    return data
@@ -0,0 +1,68 @@
+"""
+Benchmark de carga masiva: POST /products individuales vs POST /products:bulk.
+
+Uso (desde la raíz del proyecto, con RATE_LIMIT_PER_SECOND alto para que el
+limitador no rechace los POST individuales):
+    RATE_LIMIT_PER_SECOND=1000000 python -m benchmarks.bench_bulk [cantidad]
+
+Ambos caminos recorren la aplicación completa en proceso (middleware,
+autenticación, validación, logging) mediante TestClient.
+"""
+import json
+import logging
+import sys
+import time
+
+from fastapi.testclient import TestClient
+
+from app.core.config import API_VERSION, SECRET_KEY
+from app.main import app
+
+BASE_URL = f"/api/{API_VERSION}/products"
+HEADERS = {"Authorization": f"Bearer {SECRET_KEY}"}
+
+
+def producto(i: int) -> dict:
+    return {
+        "nombre": f"Producto proveedor {i}",
+        "precio": 1000.0 + i % 997,
+        "categoria": ("Laptops", "Smartphones", "Tablets")[i % 3],
+        "marca": ("Apple", "Samsung", "Lenovo", "Xiaomi")[i % 4],
+        "stock": i % 50,
+        "especificaciones": [
+            {"grupo": "Memoria", "detalles": [{"atributo": "RAM", "valor": f"{i % 4 * 4}GB"}]}
+        ]
+    }
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+    # El logging de seguridad escribe cada evento; se silencia la consola
+    logging.disable(logging.CRITICAL)
+    client = TestClient(app)
+
+    start = time.perf_counter()
+    for i in range(n):
+        response = client.post(BASE_URL, json=producto(i), headers=HEADERS)
+        assert response.status_code == 201, response.text
+    individual = time.perf_counter() - start
+
+    body = "\n".join(json.dumps(producto(i)) for i in range(n)).encode("utf-8")
+    start = time.perf_counter()
+    response = client.post(
+        f"{BASE_URL}:bulk",
+        content=body,
+        headers={**HEADERS, "Content-Type": "application/x-ndjson"}
+    )
+    bulk = time.perf_counter() - start
+    resultados = [json.loads(linea) for linea in response.text.splitlines()]
+    assert all(r["status"] == 201 for r in resultados) and len(resultados) == n
+
+    print(f"Productos: {n}")
+    print(f"  POST /products x{n}:   {individual:8.2f} s  ({n / individual:10,.0f} productos/s)")
+    print(f"  POST /products:bulk:   {bulk:8.2f} s  ({n / bulk:10,.0f} productos/s)")
+    print(f"  aceleración:           {individual / bulk:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
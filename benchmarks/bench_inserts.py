@@ -0,0 +1,61 @@
+"""
+Benchmark de throughput de inserción a medida que crece el catálogo.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.bench_inserts [tamaño máximo]
+
+En cada tamaño del catálogo (duplicándose desde 10.000) mide cuántas
+inserciones por segundo logra ProductStore asignando el ID con el asignador
+(allocate_id, O(1)) y con el método anterior (max_id() + 1, O(n)).
+"""
+import sys
+import time
+
+from app.services.database import ProductStore
+
+LOTE = 1000
+
+
+def producto(product_id: int) -> dict:
+    return {
+        "id": product_id,
+        "nombre": f"Producto {product_id}",
+        "precio": 1000.0 + product_id % 997,
+        "categoria": ("Laptops", "Smartphones", "Tablets")[product_id % 3],
+        "marca": ("Apple", "Samsung", "Lenovo", "Xiaomi")[product_id % 4],
+        "stock": product_id % 50,
+        "created_at": "2025-09-15T10:30:00+00:00",
+        "updated_at": "2025-09-15T10:30:00+00:00",
+        "created_by": "admin@techstore.cl",
+        "updated_by": "admin@techstore.cl",
+        "especificaciones": [
+            {"grupo": "Memoria", "detalles": [{"atributo": "RAM", "valor": f"{product_id % 4 * 4}GB"}]}
+        ]
+    }
+
+
+def throughput(store: ProductStore, next_id) -> float:
+    """Inserciones por segundo de un lote usando `next_id()` para el ID"""
+    start = time.perf_counter()
+    for _ in range(LOTE):
+        store.put(producto(next_id()))
+    return LOTE / (time.perf_counter() - start)
+
+
+def main() -> None:
+    maximo = int(sys.argv[1]) if len(sys.argv) > 1 else 160_000
+    store = ProductStore()
+
+    print(f"{'catálogo':>10} {'allocate_id':>14} {'max_id() + 1':>14}   (inserciones/s)")
+    size = 10_000
+    while size <= maximo:
+        while len(store) < size:
+            store.put(producto(store.allocate_id()))
+        nuevo = throughput(store, store.allocate_id)
+        anterior = throughput(store, lambda: store.max_id() + 1)
+        print(f"{size:>10} {nuevo:>14,.0f} {anterior:>14,.0f}")
+        size *= 2
+
+
+if __name__ == "__main__":
+    main()
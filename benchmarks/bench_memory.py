@@ -0,0 +1,81 @@
+"""
+Benchmark de memoria por producto: dict anidado vs ProductRecord.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.bench_memory [cantidad]
+
+Mide con tracemalloc los bytes asignados por producto al mantener N
+productos sintéticos con la forma del catálogo (3 grupos x 3 detalles),
+solo la representación y luego el ProductStore completo con sus índices.
+"""
+import gc
+import json
+import sys
+import tracemalloc
+
+from app.services.database import ProductStore
+from app.services.records import ProductRecord
+
+GRUPOS = ("Procesador", "Memoria y Almacenamiento", "Pantalla")
+ATRIBUTOS = ("Chip", "RAM", "Tamaño")
+
+
+def producto(i: int) -> dict:
+    # Valores únicos por producto para no favorecer a ninguna representación.
+    # El ida y vuelta por JSON reproduce lo que llega en un request o al
+    # reproducir el WAL: strings nuevos aunque se repitan entre productos
+    return json.loads(json.dumps({
+        "id": i,
+        "nombre": f"Producto de prueba número {i}",
+        "precio": 1000.0 + i,
+        "categoria": ("Laptops", "Smartphones", "Tablets")[i % 3],
+        "marca": ("Apple", "Samsung", "Lenovo", "Xiaomi")[i % 4],
+        "stock": i % 50,
+        "created_at": "2025-09-15T10:30:00+00:00",
+        "updated_at": "2025-10-20T14:20:00+00:00",
+        "created_by": "admin@techstore.cl",
+        "updated_by": "admin@techstore.cl",
+        "especificaciones": [
+            {
+                "grupo": grupo,
+                "detalles": [
+                    {"atributo": atributo, "valor": f"{atributo} {i}-{g}{a}"}
+                    for a, atributo in enumerate(ATRIBUTOS)
+                ]
+            }
+            for g, grupo in enumerate(GRUPOS)
+        ]
+    }))
+
+
+def measure(build, n: int) -> float:
+    """Bytes asignados por producto por el objeto que retorna build()"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return (after - before) / n
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    ids = range(1, n + 1)
+
+    # Cada representación se construye desde dicts nuevos que luego se
+    # descartan, así ambas cuentan sus propios strings
+    nested = measure(lambda: [producto(i) for i in ids], n)
+    records = measure(lambda: [ProductRecord.from_dict(producto(i)) for i in ids], n)
+    store = measure(lambda: ProductStore(producto(i) for i in ids), n)
+
+    print(f"Productos: {n}")
+    print(f"  dict anidado (antes):         {nested:8.0f} bytes/producto")
+    print(f"  ProductRecord (después):      {records:8.0f} bytes/producto")
+    print(f"  reducción:                    {nested / records:8.1f}x")
+    print(f"  ProductStore + índices:       {store:8.0f} bytes/producto")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Benchmark de GET /products: sanitizar en cada lectura vs SANITIZE_ON_WRITE.
+
+Uso (desde la raíz del proyecto, con RATE_LIMIT_PER_SECOND alto para que el
+limitador no rechace las lecturas repetidas):
+    RATE_LIMIT_PER_SECOND=1000000 python -m benchmarks.bench_reads [cantidad] [repeticiones]
+
+Para cada modo se carga un catálogo de N productos y se mide:
+- GET /products en frío: ningún producto tiene su JSON codificado, como
+  tras una carga masiva; cada producto pasa por sanitize_output y pydantic.
+- GET /products en caliente: se concatenan los JSON que conserva el almacén.
+- sanitize_output sobre el catálogo como dicts (búsqueda, cambios, exportación).
+
+La caché de respuestas no se inicializa (TestClient sin lifespan), así que
+cada lectura recorre el almacén.
+"""
+import logging
+import sys
+import time
+
+from fastapi.testclient import TestClient
+
+from app.core import config
+from app.core.config import API_VERSION
+from app.main import app
+from app.services import database
+from app.services.database import ProductStore
+from app.utils.validators import sanitize_output
+
+BASE_URL = f"/api/{API_VERSION}/products"
+GRUPOS = ("Procesador", "Memoria & Almacenamiento", "Pantalla")
+ATRIBUTOS = ("Chip", "RAM", "Tamaño")
+
+
+def producto(i: int) -> dict:
+    return {
+        "id": i,
+        "nombre": f"Producto \"edición {i}\" de prueba",
+        "precio": 1000.0 + i,
+        "categoria": ("Laptops", "Smartphones", "Tablets")[i % 3],
+        "marca": ("Apple", "Samsung", "Lenovo", "Xiaomi")[i % 4],
+        "stock": i % 50,
+        "created_at": "2025-09-15T10:30:00+00:00",
+        "updated_at": "2025-10-20T14:20:00+00:00",
+        "created_by": "admin@techstore.cl",
+        "updated_by": "admin@techstore.cl",
+        "especificaciones": [
+            {
+                "grupo": grupo,
+                "detalles": [
+                    {"atributo": atributo, "valor": f"{atributo} {i}-{g}{a}"}
+                    for a, atributo in enumerate(ATRIBUTOS)
+                ]
+            }
+            for g, grupo in enumerate(GRUPOS)
+        ]
+    }
+
+
+def best(fn, repeticiones: int) -> float:
+    tiempos = []
+    for _ in range(repeticiones):
+        start = time.perf_counter()
+        fn()
+        tiempos.append(time.perf_counter() - start)
+    return min(tiempos)
+
+
+def measure(client: TestClient, n: int, repeticiones: int, on_write: bool) -> dict:
+    config.SANITIZE_ON_WRITE = on_write
+    store = ProductStore(producto(i) for i in range(1, n + 1))
+    database._align_escaping(store)
+    database.db = store
+
+    def get():
+        response = client.get(BASE_URL)
+        assert response.status_code == 200, response.text
+
+    def get_cold():
+        # Descarta el JSON que conserva cada registro, como si todo hubiera cambiado
+        for record in store.records():
+            record._json = None
+        get()
+
+    productos = list(store)
+    return {
+        "frio": best(get_cold, repeticiones),
+        "caliente": best(get, repeticiones),
+        "sanitize": best(lambda: sanitize_output(productos), repeticiones),
+    }
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    repeticiones = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    logging.disable(logging.CRITICAL)
+    client = TestClient(app)
+
+    antes = measure(client, n, repeticiones, on_write=False)
+    despues = measure(client, n, repeticiones, on_write=True)
+
+    print(f"Productos: {n} (mejor de {repeticiones})")
+    print(f"  {'':32} {'en lectura':>12} {'en escritura':>12} {'aceleración':>12}")
+    for clave, nombre in (
+        ("frio", "GET /products en frío"),
+        ("caliente", "GET /products en caliente"),
+        ("sanitize", "sanitize_output del catálogo"),
+    ):
+        print(
+            f"  {nombre:32} {antes[clave] * 1000:9.1f} ms {despues[clave] * 1000:9.1f} ms"
+            f" {antes[clave] / despues[clave]:11.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
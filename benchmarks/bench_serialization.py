@@ -0,0 +1,87 @@
+"""
+Benchmark de serialización JSON de productos por codificador.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.bench_serialization [cantidad] [repeticiones]
+
+Serializa una lista de N productos (dicts con la forma de `Producto`) por
+cada camino que puede tomar una respuesta:
+- jsonable_encoder + json.dumps: JSONResponse en rutas sin response_model.
+- pydantic dump_json: rutas con response_model y JSON_RESPONSE_CLASS=json.
+- pydantic + orjson / msgspec: rutas con response_model y esa clase.
+- Struct msgspec: convert + encode, el camino de las lecturas frecuentes.
+"""
+import json
+import sys
+import time
+from typing import List
+
+import msgspec
+import orjson
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from app.models.schemas import Producto, ProductoStruct
+
+GRUPOS = ("Procesador", "Memoria y Almacenamiento", "Pantalla")
+ATRIBUTOS = ("Chip", "RAM", "Tamaño")
+
+
+def producto(i: int) -> dict:
+    return {
+        "id": i,
+        "nombre": f"Producto de prueba número {i}",
+        "precio": 1000.0 + i,
+        "categoria": ("Laptops", "Smartphones", "Tablets")[i % 3],
+        "marca": ("Apple", "Samsung", "Lenovo", "Xiaomi")[i % 4],
+        "stock": i % 50,
+        "created_at": "2025-09-15T10:30:00+00:00",
+        "updated_at": "2025-10-20T14:20:00+00:00",
+        "created_by": "admin@techstore.cl",
+        "updated_by": "admin@techstore.cl",
+        "especificaciones": [
+            {
+                "grupo": grupo,
+                "detalles": [
+                    {"atributo": atributo, "valor": f"{atributo} {i}-{g}{a}"}
+                    for a, atributo in enumerate(ATRIBUTOS)
+                ]
+            }
+            for g, grupo in enumerate(GRUPOS)
+        ]
+    }
+
+
+def best(fn, repeticiones: int) -> float:
+    tiempos = []
+    for _ in range(repeticiones):
+        start = time.perf_counter()
+        fn()
+        tiempos.append(time.perf_counter() - start)
+    return min(tiempos)
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    repeticiones = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    productos = [producto(i) for i in range(1, n + 1)]
+    adapter = TypeAdapter(List[Producto])
+    encoder = msgspec.json.Encoder()
+
+    caminos = (
+        ("jsonable_encoder + json.dumps", lambda: json.dumps(jsonable_encoder(productos)).encode("utf-8")),
+        ("pydantic dump_json", lambda: adapter.dump_json(adapter.validate_python(productos))),
+        ("pydantic + orjson", lambda: orjson.dumps(adapter.dump_python(adapter.validate_python(productos), mode="json"))),
+        ("pydantic + msgspec", lambda: encoder.encode(adapter.dump_python(adapter.validate_python(productos), mode="json"))),
+        ("Struct msgspec", lambda: encoder.encode(msgspec.convert(productos, List[ProductoStruct]))),
+    )
+    base = None
+    print(f"Productos: {n} (mejor de {repeticiones})")
+    for nombre, serializar in caminos:
+        segundos = best(serializar, repeticiones)
+        base = base or segundos
+        print(f"  {nombre:32} {segundos * 1000:9.1f} ms {n / segundos:12,.0f} productos/s {base / segundos:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
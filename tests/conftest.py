@@ -0,0 +1,8 @@
+"""
+Configuración común de pytest.
+"""
+import os
+
+# Los tests comparten un único cliente (una sola IP): se eleva el rate limit
+# para que no interfiera con las pruebas funcionales.
+os.environ["RATE_LIMIT_PER_SECOND"] = "10000"
@@ -0,0 +1,711 @@
+"""
+Tests para la capa de datos (app/services/database.py).
+"""
+
+import asyncio
+import random
+import threading
+import pytest
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from app.services import database
+from app.services.database import ProductStore
+from app.services.changelog import ChangeLog, ResyncRequired
+from app.services.events import DROPPED, EventBroker
+from app.services.indexes import SortedList
+from app.services.persistence import WriteAheadLog, load_state
+from app.services.records import SYMBOLS, ProductRecord
+from app.services.reservations import InsufficientStock, ProductsNotFound, StockReservations
+from app.services.sqlite_repository import SQLiteProductRepository
+
+
+def _producto(product_id: int, **campos) -> dict:
+    base = {
+        "id": product_id,
+        "nombre": f"Producto {product_id}",
+        "precio": 1000.0 * product_id,
+        "categoria": "Test",
+        "marca": "TestBrand",
+        "stock": 1,
+        "especificaciones": [],
+        "created_at": "2025-01-01T00:00:00+00:00",
+        "updated_at": "2025-01-01T00:00:00+00:00",
+        "created_by": None,
+        "updated_by": None,
+    }
+    base.update(campos)
+    return base
+
+
+# TEST 1: ProductStore conserva el orden de inserción tras reemplazos y borrados
+def test_product_store_keeps_stable_order():
+    """Verifica que reemplazar no mueve el producto y borrar no altera el resto."""
+    store = ProductStore(_producto(i) for i in (1, 2, 3, 4))
+
+    store.put(_producto(2, nombre="Reemplazado"))
+    assert store.remove(3)["id"] == 3
+    assert store.remove(3) is None
+
+    assert [p["id"] for p in store] == [1, 2, 4]
+    assert store.get(2)["nombre"] == "Reemplazado"
+    assert 3 not in store
+
+
+# TEST 2: los índices de categoria/marca se mantienen al reemplazar y borrar
+def test_product_store_secondary_indexes_follow_writes():
+    """Verifica que filter_ids refleja cambios de categoría y borrados."""
+    store = ProductStore([
+        _producto(1, categoria="Smartphones", marca="Samsung"),
+        _producto(2, categoria="Smartphones", marca="Apple"),
+        _producto(3, categoria="Laptops", marca="Samsung"),
+    ])
+
+    assert store.filter_ids(categoria="Smartphones", marca="Samsung") == [1]
+
+    store.put(_producto(3, categoria="Smartphones", marca="Samsung"))
+    assert store.filter_ids(categoria="Smartphones", marca="Samsung") == [1, 3]
+    assert store.filter_ids(categoria="Laptops") == []
+
+    store.remove(1)
+    assert store.filter_ids(marca="Samsung") == [3]
+
+
+# TEST 3: paginación keyset con borrados intermedios
+def test_product_store_page_skips_deleted_ids():
+    """Verifica que page() continúa tras el cursor aunque haya lápidas."""
+    store = ProductStore(_producto(i) for i in range(1, 8))
+    store.remove(3)
+    store.remove(4)
+
+    items, next_after = store.page(2, after=(2,))
+    assert [p["id"] for p in items] == [5, 6]
+    assert next_after == (6,)
+
+    items, next_after = store.page(2, after=next_after)
+    assert [p["id"] for p in items] == [7]
+    assert next_after is None
+
+
+# TEST 4: rango y orden por precio con el índice ordenado
+def test_product_store_price_range_sorted_and_paginated():
+    """Verifica rango de precio, orden descendente, filtros y cursor (precio, id)."""
+    store = ProductStore([
+        _producto(1, precio=300.0, marca="A"),
+        _producto(2, precio=100.0, marca="B"),
+        _producto(3, precio=200.0, marca="A"),
+        _producto(4, precio=200.0, marca="A"),
+        _producto(5, precio=500.0, marca="A"),
+    ])
+
+    items, next_after = store.page(2, sort="precio", precio_min=150, precio_max=400)
+    assert [p["id"] for p in items] == [3, 4]
+    assert next_after == (200.0, 4)
+    items, next_after = store.page(2, after=next_after, sort="precio", precio_min=150, precio_max=400)
+    assert [p["id"] for p in items] == [1]
+    assert next_after is None
+
+    store.put(_producto(4, precio=50.0, marca="A"))
+    desc = list(store.scan(sort="-precio", marca="A"))
+    assert [p["id"] for p in desc] == [5, 1, 3, 4]
+
+
+# TEST 5: el índice de texto se actualiza en cada escritura
+def test_product_store_text_search_is_incremental():
+    """Verifica búsqueda sin tildes, ranking por nombre y actualización incremental."""
+    especificaciones = [
+        {"grupo": "Procesador", "detalles": [{"atributo": "Chip", "valor": "8 núcleos"}]}
+    ]
+    store = ProductStore([
+        _producto(1, nombre="Notebook Pro", especificaciones=especificaciones),
+        _producto(2, nombre="Tablet Núcleos"),
+    ])
+
+    assert [p["id"] for p in store.search("NUCLEOS", 10)] == [2, 1]
+
+    store.put(_producto(2, nombre="Tablet"))
+    assert [p["id"] for p in store.search("nucleos", 10)] == [1]
+    store.remove(1)
+    assert store.search("nucleos", 10) == []
+
+
+# TEST 6: las facetas siguen a las escrituras y respetan los filtros
+def test_product_store_facet_counts():
+    """Verifica conteos con y sin filtros tras reemplazar un producto."""
+    def specs(ram):
+        return [{"grupo": "Memoria", "detalles": [{"atributo": "RAM", "valor": ram}]}]
+
+    store = ProductStore([
+        _producto(1, marca="A", especificaciones=specs("8GB")),
+        _producto(2, marca="A", especificaciones=specs("8GB")),
+        _producto(3, marca="B", especificaciones=specs("12GB")),
+    ])
+
+    assert store.facet_counts() == {"RAM": {"8GB": 2, "12GB": 1}}
+    assert store.facet_counts(marca="A") == {"RAM": {"8GB": 2}}
+
+    store.put(_producto(2, marca="A", especificaciones=specs("12GB")))
+    assert store.facet_counts() == {"RAM": {"8GB": 1, "12GB": 2}}
+    assert store.filter_ids(specs=[("RAM", "12GB")]) == [2, 3]
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def repository(request, tmp_path):
+    """Cada implementación de ProductRepository, vacía"""
+    if request.param == "memory":
+        yield ProductStore()
+        return
+    repo = SQLiteProductRepository(str(tmp_path / "products.db"), pool_size=2)
+    yield repo
+    repo.close()
+
+
+# TEST 7: ambas implementaciones del repositorio se comportan igual
+def test_repository_implementations_are_interchangeable(repository):
+    """Verifica CRUD, filtros, orden por precio, búsqueda y facetas en cada backend."""
+    especificaciones = [
+        {"grupo": "Memoria", "detalles": [{"atributo": "RAM", "valor": "8GB"}]},
+        {"grupo": "Procesador", "detalles": [{"atributo": "Chip", "valor": "8 núcleos"}]},
+    ]
+    repository.put(_producto(1, precio=300.0, marca="A", especificaciones=especificaciones))
+    repository.put(_producto(2, precio=100.0, marca="B"))
+    repository.put(_producto(3, precio=200.0, marca="A"))
+
+    assert len(repository) == 3
+    assert repository.max_id() == 3
+    assert repository.allocate_id() == 4
+    assert repository.allocate_id() == 5
+    assert repository.get(1)["especificaciones"] == especificaciones
+    assert repository.filter_ids(marca="A") == [1, 3]
+
+    items, next_after = repository.page(1, sort="-precio", marca="A")
+    assert [p["id"] for p in items] == [1]
+    items, _ = repository.page(1, after=next_after, sort="-precio", marca="A")
+    assert [p["id"] for p in items] == [3]
+
+    assert [p["id"] for p in repository.search("NUCLEOS", 10)] == [1]
+    assert repository.facet_counts(marca="A") == {"RAM": {"8GB": 1}, "Chip": {"8 núcleos": 1}}
+
+    repository.put(_producto(1, precio=50.0, marca="B"))
+    assert [p["id"] for p in repository.scan(sort="precio", precio_max=150)] == [1, 2]
+    assert repository.search("nucleos", 10) == []
+
+    assert repository.remove(2)["id"] == 2
+    assert repository.remove(2) is None
+    assert [p["id"] for p in repository] == [1, 3]
+
+
+# TEST 8: WAL + snapshot recuperan el estado, ignorando un registro truncado
+def test_wal_and_snapshot_recover_store_state(tmp_path):
+    """Verifica que snapshot + cola del log reconstruyen el almacén tras un 'crash'."""
+    directory = str(tmp_path)
+    assert load_state(directory) == (None, 0, 1, {})
+
+    journal = WriteAheadLog(directory, fsync_interval=0)
+    store = ProductStore(journal=journal)
+    for i in (1, 2, 3):
+        store.put(_producto(i))
+    store.remove(2)
+
+    lsn = journal.rotate()
+    journal.write_snapshot(lsn, list(store))
+    store.put(_producto(1, nombre="Post snapshot"))
+    store.put(_producto(4))
+    journal.close()
+
+    # Simula una escritura a medio terminar al final del log
+    segmento = sorted(tmp_path.glob("wal-*.log"))[-1]
+    with open(segmento, "ab") as f:
+        f.write(b"\x10\x00\x00\x00basura")
+
+    productos, last_lsn, _, _ = load_state(directory)
+    assert last_lsn == 6
+    assert list(productos) == [1, 3, 4]
+    assert productos[1]["nombre"] == "Post snapshot"
+
+    # El nuevo segmento continúa tras el último LSN válido
+    journal = WriteAheadLog(directory, last_lsn=last_lsn, fsync_interval=0)
+    ProductStore(productos.values(), journal=journal).remove(3)
+    journal.close()
+    assert list(load_state(directory)[0]) == [1, 4]
+
+
+# TEST 9: ProductRecord conserva la forma exacta de las especificaciones
+def test_product_record_round_trip():
+    """Verifica que aplanar y reconstruir conserva grupos vacíos y repetidos."""
+    especificaciones = [
+        {"grupo": "Pantalla", "detalles": [
+            {"atributo": "Tamaño", "valor": "6.1"},
+            {"atributo": "Brillo", "valor": "500 nits"},
+        ]},
+        {"grupo": "Extras", "detalles": []},
+        {"grupo": "Pantalla", "detalles": [{"atributo": "HDR", "valor": "Sí"}]},
+    ]
+    producto = _producto(7, especificaciones=especificaciones)
+
+    record = ProductRecord.from_dict(producto)
+
+    assert record.to_dict() == producto
+    assert [(SYMBOLS.decode(a), v) for a, v in record.spec_pairs()] == [
+        ("Tamaño", "6.1"), ("Brillo", "500 nits"), ("HDR", "Sí")
+    ]
+
+
+# TEST 10: categoria y marca se guardan como códigos de la tabla de símbolos
+def test_symbol_table_shares_low_cardinality_fields():
+    """Verifica que categoria y marca se guardan como códigos compartidos."""
+    store = ProductStore([
+        _producto(1, categoria="Tablets", marca="Lenovo"),
+        _producto(2, categoria="Tablets", marca="Samsung"),
+    ])
+    primero, segundo = store.records()
+
+    assert isinstance(primero.categoria, int)
+    assert primero.categoria == segundo.categoria
+    assert SYMBOLS.decode(primero.marca) == "Lenovo"
+    assert store.filter_ids(categoria="Tablets", marca="Samsung") == [2]
+    # Un valor nunca visto no se registra en la tabla
+    antes = len(SYMBOLS)
+    assert store.filter_ids(categoria="Inexistente") == []
+    assert len(SYMBOLS) == antes
+
+
+# TEST 11: agregados por grupo iguales en ambos backends tras escrituras
+def test_repository_group_stats_follow_writes(repository):
+    """Verifica agregados por marca después de insertar, reemplazar y borrar."""
+    repository.put(_producto(1, precio=100.0, stock=2, marca="A"))
+    repository.put(_producto(2, precio=300.0, stock=10, marca="A"))
+    repository.put(_producto(3, precio=50.0, stock=1, marca="B"))
+    repository.put(_producto(4, precio=80.0, stock=4, marca="B"))
+    repository.put(_producto(3, precio=70.0, stock=1, marca="A"))
+    repository.remove(4)
+
+    stats = repository.group_stats("marca", stock_bajo=3)
+
+    assert set(stats) == {"A"}
+    assert stats["A"] == {
+        "productos": 3,
+        "stock_total": 13,
+        "valor_stock": 100.0 * 2 + 300.0 * 10 + 70.0,
+        "precio_promedio": pytest.approx(470.0 / 3),
+        "precio_min": 70.0,
+        "precio_max": 300.0,
+        "stock_bajo": 2,
+    }
+
+
+# TEST 12: los agregados materializados siguen a las escrituras
+def test_repository_aggregates_follow_writes(repository):
+    """Verifica que mínimo y máximo se recalculan al borrar o mover el extremo."""
+    repository.put(_producto(1, precio=100.0, stock=2, categoria="X"))
+    repository.put(_producto(2, precio=300.0, stock=10, categoria="X"))
+    repository.put(_producto(3, precio=50.0, stock=1, categoria="X"))
+    repository.put(_producto(4, precio=80.0, stock=4, categoria="Y"))
+
+    repository.remove(3)  # era el mínimo de X
+    repository.put(_producto(2, precio=120.0, stock=5, categoria="X"))  # era el máximo
+    repository.put(_producto(4, precio=80.0, stock=4, categoria="X"))  # Y queda vacía
+
+    assert repository.aggregates("categoria") == {
+        "X": {
+            "productos": 3,
+            "stock_total": 11,
+            "precio_min": 80.0,
+            "precio_max": 120.0,
+            "precio_promedio": pytest.approx(100.0),
+        }
+    }
+
+
+# TEST 13: el asignador de IDs no reutiliza IDs, ni entre hilos ni tras reiniciar
+def test_id_allocator_is_monotonic_and_persisted(tmp_path):
+    """Verifica IDs únicos bajo concurrencia y que sobreviven snapshot + log."""
+    directory = str(tmp_path)
+    journal = WriteAheadLog(directory, fsync_interval=0)
+    store = ProductStore([_producto(1), _producto(2)], journal=journal)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        ids = list(pool.map(lambda _: store.allocate_id(), range(200)))
+    assert sorted(ids) == list(range(3, 203))
+
+    store.put(_producto(203))
+    lsn = journal.rotate()
+    journal.write_snapshot(lsn, store.records(), ProductRecord.to_dict, store.next_id)
+    store.put(_producto(204))
+    store.remove(204)  # el mayor ID se borra: no debe volver a asignarse
+    journal.close()
+
+    productos, last_lsn, next_id, _ = load_state(directory)
+    assert next_id == 205
+    restored = ProductStore(productos.values(), next_id=next_id)
+    assert restored.allocate_id() == 205
+
+
+# TEST 14: put_many deja el mismo estado que inserciones individuales
+def test_put_many_matches_individual_puts(repository):
+    """Verifica lotes con reemplazos y con IDs repetidos dentro del lote."""
+    repository.put(_producto(1, precio=500.0, marca="A"))
+    lote = [
+        _producto(2, precio=300.0, marca="A"),
+        _producto(1, precio=100.0, marca="B"),  # reemplaza uno existente
+        _producto(3, precio=200.0, marca="B"),
+        _producto(3, precio=250.0, marca="A"),  # repetido dentro del lote
+    ]
+
+    repository.put_many(lote)
+
+    assert [p["id"] for p in repository.scan(sort="precio")] == [1, 3, 2]
+    assert repository.filter_ids(marca="A") == [2, 3]
+    assert repository.aggregates("marca")["A"]["precio_min"] == 250.0
+    assert repository.group_stats("marca", 5)["B"]["productos"] == 1
+    assert repository.allocate_id() == 4
+
+
+# TEST 15: la exportación por lotes keyset tolera escrituras entre lotes
+def test_iter_product_batches_is_safe_under_mutation(monkeypatch):
+    """Verifica que borrados e inserciones entre lotes no duplican ni saltan productos."""
+    store = ProductStore(_producto(i) for i in range(1, 8))
+    monkeypatch.setattr(database, "db", store)
+
+    vistos = []
+    for lote in database.iter_product_batches(3):
+        vistos.extend(p["id"] for p in lote)
+        if len(vistos) == 3:
+            store.remove(5)
+            store.remove(2)  # ya entregado
+            store.put(_producto(20))
+
+    assert vistos == [1, 2, 3, 4, 6, 7, 20]
+
+
+# TEST 16: reemplazar casi todo el catálogo en un lote equivale a construirlo de nuevo
+def test_put_many_large_replacement_matches_fresh_store():
+    """Verifica índices ordenados y agregados tras reemplazar un lote grande."""
+    store = ProductStore(_producto(i, marca="AB"[i % 2]) for i in range(1, 101))
+    cambios = [_producto(i, precio=5000.0 - i, marca="AB"[i % 3 == 0]) for i in range(1, 91)]
+
+    store.put_many(cambios)
+
+    fresco = ProductStore([*cambios, *(_producto(i, marca="AB"[i % 2]) for i in range(91, 101))])
+    assert [p["id"] for p in store.scan(sort="precio")] == [p["id"] for p in fresco.scan(sort="precio")]
+    assert store.aggregates("marca") == fresco.aggregates("marca")
+    assert store.group_stats("marca", 5) == fresco.group_stats("marca", 5)
+
+
+# TEST 17: las reservas concurrentes nunca venden más stock del disponible
+def test_concurrent_reservations_never_oversell(repository):
+    """Verifica que de 400 reservas de 1 unidad sobre stock 150 se acepten exactamente 150."""
+    repository.put(_producto(1, stock=150))
+    repository.put(_producto(2, stock=10_000))
+    reservations = StockReservations(repository, ttl=60, timestamp=lambda: "2025-01-02T00:00:00+00:00")
+
+    def reservar(_):
+        try:
+            return reservations.reserve([(1, 1), (2, 1)], "cliente@test.cl")
+        except InsufficientStock:
+            return None
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        resultados = list(pool.map(reservar, range(400)))
+
+    aceptadas = [r for r in resultados if r is not None]
+    assert len(aceptadas) == 150
+    assert len({r["reservation_id"] for r in aceptadas}) == 150
+    assert repository.get(1)["stock"] == 0
+    # La línea del producto 2 solo se descontó en las reservas aceptadas
+    assert repository.get(2)["stock"] == 10_000 - 150
+    assert repository.get(1)["updated_by"] == "cliente@test.cl"
+
+
+# TEST 18: reservar es todo o nada; liberar y expirar devuelven el stock
+def test_reservations_release_and_expire(repository):
+    """Verifica rechazo sin efectos, confirmación, liberación y expiración por TTL."""
+    repository.put_many([_producto(1, stock=5), _producto(2, stock=2)])
+    reservations = StockReservations(repository, ttl=60, timestamp=lambda: "2025-01-02T00:00:00+00:00")
+
+    with pytest.raises(InsufficientStock) as error:
+        reservations.reserve([(1, 1), (2, 2), (2, 1)])
+    assert error.value.faltantes == [{"id": 2, "requested": 3, "available": 2}]
+    with pytest.raises(ProductsNotFound):
+        reservations.reserve([(1, 1), (99, 1)])
+    assert repository.get(1)["stock"] == 5 and repository.get(2)["stock"] == 2
+
+    confirmada = reservations.reserve([(1, 2)], actor="user:a")
+    liberada = reservations.reserve([(1, 1), (2, 2)])
+    assert repository.get_reservation(confirmada["reservation_id"])["actor"] == "user:a"
+    assert repository.get(1)["stock"] == 2 and repository.get(2)["stock"] == 0
+    assert reservations.confirm(confirmada["reservation_id"]) is not None
+    assert reservations.release(liberada["reservation_id"]) is not None
+    assert reservations.release(liberada["reservation_id"]) is None
+    assert repository.get_reservation(liberada["reservation_id"]) is None
+    assert repository.get(1)["stock"] == 3 and repository.get(2)["stock"] == 2
+
+    # Con TTL cero la reserva vence en la siguiente operación
+    reservations.ttl = 0
+    vencida = reservations.reserve([(2, 2)])
+    assert repository.get(2)["stock"] == 0
+    assert reservations.expire() == 1
+    assert repository.get(2)["stock"] == 2
+    assert reservations.confirm(vencida["reservation_id"]) is None
+    assert len(reservations) == 0
+
+
+# TEST 19: el registro de cambios descarta lo más antiguo y exige resincronizar
+def test_changelog_ring_buffer_and_resync():
+    """Verifica secuencias, lápidas, paginación, descarte y el error de resincronización."""
+    changelog = ChangeLog(capacity=4)
+    assert changelog.since(0, 10) == []
+
+    changelog.record_upserts([_producto(1), _producto(2)], "t1", "create")
+    changelog.record_delete(1, "t2")
+    assert [(c["seq"], c["op"], c["id"]) for c in changelog.since(0, 10)] == [
+        (1, "upsert", 1), (2, "upsert", 2), (3, "delete", 1)
+    ]
+    assert changelog.since(3, 10) == []
+    assert [c["product"]["id"] for c in changelog.since(1, 1)] == [2]
+    assert changelog.since(2, 10)[0]["product"] is None
+
+    changelog.record_upserts([_producto(3), _producto(4), _producto(5)], "t3", "create")
+    assert changelog.last_seq == 6 and changelog.oldest_seq == 3
+    assert [c["seq"] for c in changelog.since(2, 10)] == [3, 4, 5, 6]
+    for since in (1, 7):
+        with pytest.raises(ResyncRequired) as error:
+            changelog.since(since, 10)
+        assert (error.value.oldest_seq, error.value.last_seq) == (3, 6)
+
+    assert changelog.parse_cursor(changelog.cursor(4)) == 4
+    with pytest.raises(ResyncRequired):
+        changelog.parse_cursor(ChangeLog(capacity=4).cursor(4))
+    for cursor in ("4", "-4", f"{changelog.epoch}-x"):
+        with pytest.raises(ValueError):
+            changelog.parse_cursor(cursor)
+
+
+# TEST 20: el broker reparte cambios publicados desde otro hilo y descarta a los lentos
+def test_event_broker_fan_out_and_slow_consumer():
+    """Verifica orden por secuencia, codificación compartida y baja del suscriptor lento."""
+    changelog = ChangeLog(capacity=100)
+    codificados = []
+
+    def encode(entrada):
+        codificados.append(entrada["seq"])
+        return f"{entrada['action']}:{entrada['id']}".encode()
+
+    broker = EventBroker(encode, queue_size=3, max_subscribers=2)
+    changelog.subscribe(broker.publish)
+
+    async def escenario():
+        rapido, lento = broker.subscribe(), broker.subscribe()
+        assert broker.subscribe() is None  # máximo de suscriptores
+
+        def escribir(inicio):
+            changelog.record_upserts([_producto(inicio), _producto(inicio + 1)], "t", "create")
+
+        recibidos = []
+        for inicio in (1, 3):
+            hilo = threading.Thread(target=escribir, args=(inicio,))
+            hilo.start()
+            hilo.join()
+            for _ in range(2):
+                recibidos.append(await asyncio.wait_for(rapido.get(), timeout=1))
+        changelog.record_delete(1, "t")
+        recibidos.append(await asyncio.wait_for(rapido.get(), timeout=1))
+        return recibidos, lento
+
+    recibidos, lento = asyncio.run(escenario())
+    assert recibidos == [(1, b"create:1"), (2, b"create:2"), (3, b"create:3"), (4, b"create:4"), (5, b"delete:1")]
+    # Cada cambio se codifica una sola vez para todos los suscriptores
+    assert codificados == [1, 2, 3, 4, 5]
+    # El suscriptor que no consumió quedó fuera al llenarse su cola
+    assert lento.get_nowait() is DROPPED and len(broker) == 1
+
+
+# TEST 21: el JSON de cada producto se codifica una vez y se rehace solo al cambiar
+def test_encoded_json_is_reused_until_product_changes(repository):
+    """Verifica la reutilización en ProductStore y el mismo resultado en cualquier almacén."""
+    codificados = []
+
+    def encode(producto):
+        codificados.append(producto["id"])
+        return f'{{"id":{producto["id"]},"stock":{producto["stock"]}}}'.encode()
+
+    repository.put_many([_producto(i, precio=100.0 * (4 - i)) for i in (1, 2, 3)])
+    items, next_after = repository.page_json(encode, 2, sort="precio")
+    assert [key for key, _ in items] == [(100.0, 3), (200.0, 2)] and next_after == (200.0, 2)
+    assert [data for _, data in repository.scan_json(encode)] == [encode(repository.get(i)) for i in (1, 2, 3)]
+    assert repository.get_json(9, encode) is None
+
+    codificados.clear()
+    repository.put(_producto(2, stock=7))
+    assert repository.get_json(2, encode) == b'{"id":2,"stock":7}'
+    assert [data for _, data in repository.scan_json(encode)][1] == b'{"id":2,"stock":7}'
+    if isinstance(repository, ProductStore):
+        # Solo el producto modificado vuelve a codificarse
+        assert codificados == [2]
+
+
+# TEST 22: un producto inválido no llega al log y el estado se sigue reproduciendo
+def test_invalid_put_is_not_journaled(tmp_path):
+    """Verifica que el error ocurre antes del log y que load_state reconstruye el almacén."""
+    directory = str(tmp_path)
+    journal = WriteAheadLog(directory, fsync_interval=0)
+    store = ProductStore(journal=journal)
+    store.put_many([_producto(1), _producto(2)])
+
+    invalidos = (
+        _producto(1, precio=None), _producto(2, stock="5"), _producto(3, categoria=None),
+        _producto(2, stock=10 ** 20), _producto(2, stock=-1), _producto(2, precio=float("nan")),
+        _producto(2, precio=10 ** 400), _producto(2 ** 63)
+    )
+    for invalido in invalidos:
+        with pytest.raises((TypeError, ValueError)):
+            store.put(invalido)
+    store.put(_producto(1, precio=5.0))
+    journal.close()
+
+    productos, _, _, _ = load_state(directory)
+    restaurado = ProductStore(productos.values())
+    assert restaurado.get(1)["precio"] == 5.0 and 3 not in restaurado
+    assert [p["id"] for p in restaurado.scan(sort="precio")] == [1, 2]
+
+
+# TEST 23: un lote con un producto inválido no modifica ningún producto
+def test_patch_products_rolls_nothing_on_invalid_item(monkeypatch):
+    """Verifica productos, agregados y registro de cambios intactos tras un lote rechazado."""
+    store = ProductStore([_producto(1, marca="A"), _producto(2, marca="B"), _producto(3, marca="B")])
+    monkeypatch.setattr(database, "db", store)
+    antes = [store.get(i) for i in (1, 2, 3)]
+    agregados = store.aggregates("marca")
+    ultimo = database.changelog.last_seq
+
+    with pytest.raises(TypeError):
+        database.patch_products([(2, {"stock": 9}), (3, {"precio": None})])
+
+    assert [store.get(i) for i in (1, 2, 3)] == antes
+    assert store.aggregates("marca") == agregados
+    assert database.changelog.last_seq == ultimo
+
+
+# TEST 24: las reservas sobreviven a un reinicio y se comparten entre workers
+def test_reservations_persist_across_restarts_and_workers(tmp_path):
+    """Verifica WAL + snapshot en memoria y dos repositorios SQLite sobre el mismo archivo."""
+    directory = str(tmp_path)
+    journal = WriteAheadLog(directory, fsync_interval=0)
+    store = ProductStore(journal=journal)
+    store.put_many([_producto(1, stock=5), _producto(2, stock=5)])
+    reservations = StockReservations(store, ttl=60, timestamp=lambda: "2025-01-02T00:00:00+00:00")
+    antes = reservations.reserve([(1, 2)])
+    journal.write_snapshot(journal.rotate(), store.records(), ProductRecord.to_dict, store.next_id, store.reservations())
+    despues = reservations.reserve([(2, 3)])
+    journal.close()
+
+    productos, _, next_id, reservas = load_state(directory)
+    assert set(reservas) == {antes["reservation_id"], despues["reservation_id"]}
+    restored = ProductStore(productos.values(), next_id=next_id, reservations=reservas.values())
+    reservations = StockReservations(restored, ttl=60, timestamp=lambda: "2025-01-02T00:00:00+00:00")
+    assert reservations.release(antes["reservation_id"]) is not None
+    assert reservations.confirm(despues["reservation_id"]) is not None
+    assert restored.get(1)["stock"] == 5 and restored.get(2)["stock"] == 2
+
+    path = str(tmp_path / "products.db")
+    worker_a = SQLiteProductRepository(path, pool_size=1)
+    worker_b = SQLiteProductRepository(path, pool_size=1)
+    worker_a.put(_producto(1, stock=3))
+    reserva = StockReservations(worker_a, ttl=60, timestamp=lambda: "t").reserve([(1, 3)])
+    en_b = StockReservations(worker_b, ttl=60, timestamp=lambda: "t")
+    with pytest.raises(InsufficientStock):
+        en_b.reserve([(1, 1)])
+    assert len(en_b) == 1
+    assert en_b.release(reserva["reservation_id"]) is not None
+    assert worker_a.get(1)["stock"] == 3
+    worker_a.close()
+    worker_b.close()
+
+
+# TEST 25: la paginación filtrada sin orden recorre los IDs sin ordenar el conjunto
+def test_filtered_pages_follow_id_order():
+    """Verifica páginas filtradas amplias (recorrido) y selectivas (selección) contra un filtro directo."""
+    productos = [_producto(i, marca="Z" if i % 50 == 0 else "AB"[i % 2]) for i in range(1, 201)]
+    store = ProductStore(productos)
+    for marca, limit in (("A", 7), ("Z", 2)):
+        esperado = [p["id"] for p in productos if p["marca"] == marca]
+        vistos, after = [], None
+        while True:
+            items, after = store.page(limit, after=after, marca=marca)
+            vistos.extend(p["id"] for p in items)
+            if after is None:
+                break
+        assert vistos == esperado
+        assert [p["id"] for p in store.scan(marca=marca, precio_max=10**6)] == esperado
+
+
+# TEST 26: SortedList por tramos se comporta como una lista ordenada
+def test_sorted_list_matches_plain_sorted_list(monkeypatch):
+    """Verifica inserciones, lotes, borrados, bisect y recorridos contra list + sort con tramos pequeños."""
+    monkeypatch.setattr(SortedList, "LOAD", 4)
+    rng = random.Random(7)
+    valores = SortedList([rng.randint(0, 50) for _ in range(30)])
+    esperado = sorted(valores)
+    for _ in range(300):
+        op = rng.random()
+        if op < 0.5:
+            valor = rng.randint(0, 60)
+            valores.add(valor)
+            esperado.append(valor)
+        elif op < 0.8:
+            valor = rng.randint(0, 60)
+            assert valores.remove(valor) == (valor in esperado)
+            if valor in esperado:
+                esperado.remove(valor)
+        elif op < 0.9:
+            lote = [rng.randint(0, 60) for _ in range(rng.randint(1, 40))]
+            valores.update(lote)
+            esperado.extend(lote)
+        else:
+            lote = rng.sample(esperado, min(len(esperado), rng.randint(1, 40)))
+            valores.remove_many(lote)
+            for valor in lote:
+                esperado.remove(valor)
+        esperado.sort()
+        assert list(valores) == esperado and len(valores) == len(esperado)
+
+    assert (valores[0], valores[-1], valores[len(esperado) // 2]) == (
+        esperado[0], esperado[-1], esperado[len(esperado) // 2]
+    )
+    for valor in range(-1, 62):
+        start, stop = valores.bisect_left(valor), valores.bisect_right(valor + 10)
+        assert (start, stop) == (bisect_left(esperado, valor), bisect_right(esperado, valor + 10))
+        assert list(valores.islice(start, stop)) == esperado[start:stop]
+        assert list(valores.islice(start, stop, reverse=True)) == esperado[start:stop][::-1]
+
+
+# TEST 27: si un índice falla a mitad de put, el producto y el log quedan como antes
+def test_put_unwinds_when_an_index_fails(tmp_path, monkeypatch):
+    """Verifica que el registro previo vuelve a todos los índices y que el log no reproduce la escritura."""
+    directory = str(tmp_path)
+    journal = WriteAheadLog(directory, fsync_interval=0)
+    store = ProductStore(journal=journal)
+    store.put_many([_producto(1, nombre="Teclado"), _producto(2)])
+    antes = list(store.scan(sort="precio"))
+    agregados = store.aggregates("categoria")
+    stats = store.group_stats("categoria", 5)
+
+    add = store._columns.add
+    def falla(record):
+        if record.nombre == "Mouse":
+            raise OverflowError("no cabe")
+        add(record)
+    monkeypatch.setattr(store._columns, "add", falla)
+
+    for producto in (_producto(1, nombre="Mouse", categoria="Otra"), _producto(3, nombre="Mouse")):
+        with pytest.raises(OverflowError):
+            store.put(producto)
+
+    assert list(store.scan(sort="precio")) == antes and 3 not in store
+    assert store.aggregates("categoria") == agregados
+    assert store.group_stats("categoria", 5) == stats
+    assert [p["id"] for p in store.search("teclado", 10)] == [1]
+    assert store.search("mouse", 10) == [] and store.filter_ids(categoria="Otra") == []
+    journal.close()
+
+    productos, _, _, _ = load_state(directory)
+    assert sorted(productos.values(), key=lambda p: p["precio"]) == antes
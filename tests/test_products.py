@@ -2,8 +2,27 @@
 Tests para endpoints de productos de la API REST.
 """
 
+import asyncio
+import csv
+import io
+import json
+import threading
+from fastapi import FastAPI, Response
 from fastapi.testclient import TestClient
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.inmemory import InMemoryBackend
 from app.main import app
+from app.core import config
+from pydantic import TypeAdapter
+from app.api.rest.endpoints import products as products_endpoints
+from app.utils.token import extraer_actor_desde_token
+from app.api.rest.endpoints.products import _encode_producto, _stream_changes, events, response_cache
+from app.services import database
+from app.services.database import ProductStore
+from app.models.schemas import Producto
+from app.utils.responses import RESPONSE_CLASSES
+from app.utils.validators import ESCAPED, sanitize_output
+from app.middleware.security import SecurityMiddleware
 from app.core.config import API_VERSION, SECRET_KEY
 
 # Crear cliente de pruebas
@@ -100,3 +119,667 @@ def test_create_product_with_auth_returns_201_and_product():
     # Verificar que se asignó el actor
     assert "created_by" in product
     assert product["created_by"] == "user:authenticated"
+
+
+# TEST 6: GET /products con filtros categoria y marca
+def test_get_products_filtered_by_categoria_and_marca():
+    """Verifica que GET /products?categoria=&marca= solo retorna coincidencias."""
+    response = client.get(BASE_URL, params={"categoria": "Smartphones", "marca": "Samsung"})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data) >= 1
+    assert all(p["categoria"] == "Smartphones" and p["marca"] == "Samsung" for p in data)
+
+
+# TEST 7: GET /products paginado por cursor recorre todo el catálogo sin repetir
+def test_get_products_cursor_pagination_walks_catalog():
+    """Verifica que limit + X-Next-Cursor recorren el catálogo completo en orden de ID."""
+    todos = [p["id"] for p in client.get(BASE_URL).json()]
+
+    vistos = []
+    params = {"limit": 2}
+    while True:
+        response = client.get(BASE_URL, params=params)
+        assert response.status_code == 200
+        pagina = response.json()
+        assert len(pagina) <= 2
+        vistos.extend(p["id"] for p in pagina)
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+        params = {"limit": 2, "cursor": cursor}
+
+    assert vistos == sorted(todos)
+
+
+# TEST 8: GET /products con cursor inválido - Retorna 400
+def test_get_products_invalid_cursor_returns_400():
+    """Verifica que un cursor mal formado retorna 400."""
+    response = client.get(BASE_URL, params={"limit": 2, "cursor": "no-es-un-cursor"})
+
+    assert response.status_code == 400
+
+
+# TEST 9: GraphQL productsPage acepta los mismos cursores
+def test_graphql_products_page_returns_next_cursor():
+    """Verifica que productsPage pagina y entrega nextCursor."""
+    query = "{ productsPage(limit: 1) { items { id } nextCursor } }"
+
+    response = client.post("/graphql", json={"query": query})
+
+    assert response.status_code == 200
+    page = response.json()["data"]["productsPage"]
+    assert len(page["items"]) == 1
+    assert page["nextCursor"] is not None
+
+    query = '{ products(limit: 1, cursor: "%s") { id } }' % page["nextCursor"]
+    siguiente = client.post("/graphql", json={"query": query}).json()["data"]["products"]
+    assert siguiente[0]["id"] > page["items"][0]["id"]
+
+
+# TEST 10: GET /products con rango de precio ordenado por precio
+def test_get_products_price_range_sorted():
+    """Verifica que precio_min/precio_max filtran y sort=-precio ordena descendente."""
+    params = {"precio_min": 1000000, "precio_max": 1300000, "sort": "-precio"}
+
+    response = client.get(BASE_URL, params=params)
+
+    assert response.status_code == 200
+    precios = [p["precio"] for p in response.json()]
+    assert len(precios) >= 1
+    assert all(1000000 <= precio <= 1300000 for precio in precios)
+    assert precios == sorted(precios, reverse=True)
+
+
+# TEST 11: PATCH /products/{id} con tipo inválido - Retorna 422 sin tocar el producto
+def test_patch_product_invalid_type_returns_422():
+    """Verifica que PATCH rechaza un precio no numérico."""
+    antes = client.get(f"{BASE_URL}/1").json()
+
+    response = client.patch(f"{BASE_URL}/1", json={"precio": "caro"}, headers=HEADERS_AUTH)
+
+    assert response.status_code == 422
+    assert client.get(f"{BASE_URL}/1").json() == antes
+
+
+# TEST 12: GET /products/search ignora tildes y ordena por relevancia
+def test_search_products_accent_insensitive():
+    """Verifica que 'nucleos' encuentra productos con 'núcleos' en sus especificaciones."""
+    response = client.get(f"{BASE_URL}/search", params={"q": "nucleos"})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert any(p["id"] == 1 for p in data)
+
+    response = client.get(f"{BASE_URL}/search", params={"q": "Samsung Galaxy"})
+    assert response.json()[0]["marca"] == "Samsung"
+
+
+# TEST 13: GET /products/facets cuenta valores por atributo según los filtros
+def test_get_facets_counts_values_for_filters():
+    """Verifica conteos de facetas y filtro spec=atributo:valor en GET /products."""
+    response = client.get(f"{BASE_URL}/facets", params={"categoria": "Smartphones"})
+
+    assert response.status_code == 200
+    facetas = response.json()
+    assert facetas["Tecnología"]["Dynamic AMOLED 2X"] >= 1
+    assert "Chip" not in facetas  # solo la laptop tiene "Chip"
+
+    response = client.get(BASE_URL, params={"spec": "RAM:12GB"})
+    assert response.status_code == 200
+    assert [p["id"] for p in response.json()] == [3]
+
+
+# TEST 14: GET /products/stats agrega inventario por categoría y marca
+def test_get_stats_groups_by_categoria_and_marca():
+    """Verifica agregados por categoría y rechazo de una agrupación desconocida."""
+    response = client.get(f"{BASE_URL}/stats", params={"group_by": "categoria"})
+
+    assert response.status_code == 200
+    stats = response.json()
+    productos = client.get(BASE_URL, params={"categoria": "Smartphones"}).json()
+    smartphones = stats["Smartphones"]
+    assert smartphones["productos"] == len(productos)
+    assert smartphones["stock_total"] == sum(p["stock"] for p in productos)
+    assert smartphones["precio_min"] == min(p["precio"] for p in productos)
+
+    response = client.get(f"{BASE_URL}/stats", params={"group_by": "nombre"})
+    assert response.status_code == 422
+
+
+# TEST 15: GET /products/aggregates coincide con los agregados calculados
+def test_get_aggregates_match_stats():
+    """Verifica que los agregados materializados coinciden con /products/stats."""
+    response = client.get(f"{BASE_URL}/aggregates", params={"group_by": "marca"})
+
+    assert response.status_code == 200
+    agregados = response.json()
+    stats = client.get(f"{BASE_URL}/stats", params={"group_by": "marca"}).json()
+    assert agregados.keys() == stats.keys()
+    for marca, valores in agregados.items():
+        for campo in ("productos", "stock_total", "precio_min", "precio_max"):
+            assert valores[campo] == stats[marca][campo]
+
+
+# TEST 16: POST /products:bulk crea por lotes y reporta un resultado por línea
+def test_bulk_create_reports_each_line(monkeypatch):
+    """Verifica lotes parciales, líneas inválidas y líneas demasiado largas."""
+    monkeypatch.setattr(config, "BULK_BATCH_SIZE", 2)
+    monkeypatch.setattr(config, "BULK_MAX_LINE_BYTES", 200)
+    valido = '{"nombre": "Bulk %d", "precio": 10, "categoria": "Bulk", "marca": "B", "stock": 1}'
+    lineas = [
+        valido % 1,
+        "",
+        "no es json",
+        '{"nombre": "<script>", "precio": 1, "categoria": "Bulk", "marca": "B", "stock": 1}',
+        '{"nombre": "%s", "precio": 1, "categoria": "Bulk", "marca": "B", "stock": 1}' % ("x" * 300),
+        valido % 2,
+    ]
+
+    response = client.post(
+        f"{BASE_URL}:bulk",
+        content="\n".join(lineas).encode("utf-8"),
+        headers={**HEADERS_AUTH, "Content-Type": "application/x-ndjson"}
+    )
+
+    assert response.status_code == 200
+    resultados = [json.loads(linea) for linea in response.text.splitlines()]
+    assert [(r["line"], r["status"]) for r in resultados] == [
+        (1, 201), (3, 422), (4, 400), (5, 400), (6, 201)
+    ]
+    creado = client.get(f"{BASE_URL}/{resultados[-1]['id']}").json()
+    assert creado["nombre"] == "Bulk 2"
+    assert client.post(f"{BASE_URL}:bulk", content=valido % 3).status_code == 401
+
+
+# TEST 17: GET /products/export transmite el catálogo en NDJSON, CSV y gzip
+def test_export_streams_catalog_in_each_format():
+    """Verifica que la exportación coincide con GET /products en cada formato."""
+    catalogo = client.get(BASE_URL).json()
+
+    response = client.get(f"{BASE_URL}/export", headers={"Accept-Encoding": "identity"})
+    assert response.status_code == 200
+    assert "content-encoding" not in response.headers
+    assert [json.loads(linea) for linea in response.text.splitlines()] == catalogo
+
+    response = client.get(
+        f"{BASE_URL}/export", params={"format": "csv"}, headers={"Accept-Encoding": "identity"}
+    )
+    filas = list(csv.DictReader(io.StringIO(response.text)))
+    assert [int(fila["id"]) for fila in filas] == [p["id"] for p in catalogo]
+    assert json.loads(filas[0]["especificaciones"]) == catalogo[0]["especificaciones"]
+
+    response = client.get(f"{BASE_URL}/export", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    # httpx descomprime el cuerpo de forma transparente
+    assert [json.loads(linea)["id"] for linea in response.text.splitlines()] == [p["id"] for p in catalogo]
+
+
+# TEST 18: PATCH /products:batch aplica todos los cambios o ninguno
+def test_patch_batch_is_all_or_nothing():
+    """Verifica el resumen, el rechazo por ID inexistente y por contenido malicioso."""
+    antes = {p["id"]: p for p in client.get(BASE_URL).json()}
+    ids = sorted(antes)[:2]
+
+    response = client.patch(f"{BASE_URL}:batch", json=[
+        {"id": ids[0], "changes": {"precio": 111.0, "stock": 3}},
+        {"id": ids[1], "changes": {"precio": 222.0}},
+    ], headers=HEADERS_AUTH)
+
+    assert response.status_code == 200
+    assert response.json() == {"updated": 2, "fields_updated": {"precio": 2, "stock": 1}}
+    assert client.get(f"{BASE_URL}/{ids[0]}").json()["stock"] == 3
+
+    for lote, status in (
+        ([{"id": ids[0], "changes": {"precio": 1.0}}, {"id": 999999, "changes": {"stock": 1}}], 404),
+        ([{"id": ids[0], "changes": {"precio": 1.0}}, {"id": ids[1], "changes": {"nombre": "<b>"}}], 400),
+        ([{"id": ids[0], "changes": {"precio": 1.0}}, {"id": ids[0], "changes": {"stock": 1}}], 400),
+        ([{"id": ids[0], "changes": {"precio": "caro"}}], 422),
+        ([{"id": ids[0], "changes": {"precio": 1.0}}, {"id": ids[1], "changes": {"precio": None}}], 422),
+    ):
+        response = client.patch(f"{BASE_URL}:batch", json=lote, headers=HEADERS_AUTH)
+        assert response.status_code == status
+        assert client.get(f"{BASE_URL}/{ids[0]}").json()["precio"] == 111.0
+
+
+# TEST 19: reservar stock, confirmar y liberar vía API
+def test_stock_reservation_endpoints():
+    """Verifica 201 con descuento, 409 sin efectos, 404 y la devolución al liberar."""
+    producto = client.post(BASE_URL, json={
+        "nombre": "Producto reservable",
+        "precio": 1000.0,
+        "categoria": "Test",
+        "marca": "TestBrand",
+        "stock": 4,
+        "especificaciones": []
+    }, headers=HEADERS_AUTH).json()
+    url = f"{BASE_URL}/stock"
+
+    response = client.post(f"{url}/reserve", json=[{"id": producto["id"], "qty": 3}], headers=HEADERS_AUTH)
+    assert response.status_code == 201
+    reserva = response.json()
+    assert reserva["items"] == [{"id": producto["id"], "qty": 3}]
+    assert client.get(f"{BASE_URL}/{producto['id']}").json()["stock"] == 1
+
+    response = client.post(f"{url}/reserve", json=[{"id": producto["id"], "qty": 2}], headers=HEADERS_AUTH)
+    assert response.status_code == 409
+    assert response.json()["detail"]["faltantes"] == [{"id": producto["id"], "requested": 2, "available": 1}]
+    assert client.post(f"{url}/reserve", json=[{"id": 999999, "qty": 1}], headers=HEADERS_AUTH).status_code == 404
+    assert client.post(f"{url}/reserve", json=[{"id": producto["id"], "qty": 0}], headers=HEADERS_AUTH).status_code == 422
+    assert client.post(f"{url}/reserve", json=[{"id": producto["id"], "qty": 1}]).status_code == 401
+
+    response = client.delete(f"{url}/reservations/{reserva['reservation_id']}", headers=HEADERS_AUTH)
+    assert response.status_code == 204
+    assert client.get(f"{BASE_URL}/{producto['id']}").json()["stock"] == 4
+    response = client.post(f"{url}/reservations/{reserva['reservation_id']}/confirm", headers=HEADERS_AUTH)
+    assert response.status_code == 404
+
+
+# TEST 20: GET /products/changes entrega solo los cambios desde un cursor
+def test_changes_feed_returns_deltas_and_tombstones():
+    """Verifica creación, modificación y lápida en orden, y el 410 de resincronización."""
+    otro_proceso = f"{'0' * 12}-1"
+    response = client.get(f"{BASE_URL}/changes", params={"since": otro_proceso})
+    assert response.status_code == 410
+    since = response.json()["detail"]["next_since"]
+    epoch, _, seq = since.rpartition("-")
+    seq = int(seq)
+    assert client.get(f"{BASE_URL}/changes", params={"since": f"{epoch}-{10**9}"}).status_code == 410
+    assert client.get(f"{BASE_URL}/changes", params={"since": "10"}).status_code == 400
+
+    creado = client.post(BASE_URL, json={
+        "nombre": "Producto con historial",
+        "precio": 1000.0,
+        "categoria": "Test",
+        "marca": "TestBrand",
+        "stock": 4,
+        "especificaciones": []
+    }, headers=HEADERS_AUTH).json()
+    client.patch(f"{BASE_URL}/{creado['id']}", json={"stock": 9}, headers=HEADERS_AUTH)
+    client.delete(f"{BASE_URL}/{creado['id']}", headers=HEADERS_AUTH)
+
+    response = client.get(f"{BASE_URL}/changes", params={"since": since, "limit": 2})
+    assert response.status_code == 200
+    pagina = response.json()
+    assert [(c["op"], c["id"]) for c in pagina["changes"]] == [("upsert", creado["id"])] * 2
+    assert pagina["changes"][1]["product"]["stock"] == 9
+    assert pagina["has_more"] and pagina["next_since"] == f"{epoch}-{seq + 2}"
+
+    resto = client.get(f"{BASE_URL}/changes", params={"since": pagina["next_since"]}).json()
+    assert [(c["op"], c["id"], c["product"]) for c in resto["changes"]] == [("delete", creado["id"], None)]
+    assert not resto["has_more"] and resto["next_since"] == f"{epoch}-{resto['last_seq']}"
+    assert resto["last_seq"] == seq + 3
+
+
+# TEST 21: GET /products/stream rechaza suscriptores sobre el máximo
+def test_stream_rejects_when_subscribers_exhausted(monkeypatch):
+    """Verifica el 503 cuando no quedan cupos de suscripción."""
+    monkeypatch.setattr(events, "max_subscribers", 0)
+    response = client.get(f"{BASE_URL}/stream")
+    assert response.status_code == 503
+
+
+# TEST 22: ETag con If-None-Match (304) e If-Match (412)
+def test_etags_conditional_get_and_optimistic_concurrency():
+    """Verifica 304 mientras no hay cambios, ETag nuevo tras escribir y 412 con versión vieja."""
+    producto_id = client.get(BASE_URL).json()[0]["id"]
+    url = f"{BASE_URL}/{producto_id}"
+
+    response = client.get(url)
+    etag = response.headers["ETag"]
+    lista_etag = client.get(BASE_URL).headers["ETag"]
+    assert etag.startswith('"') and etag != lista_etag
+
+    response = client.get(url, headers={"If-None-Match": f'"otro", W/{etag}'})
+    assert response.status_code == 304 and response.content == b""
+    assert response.headers["ETag"] == etag
+    assert client.get(BASE_URL, headers={"If-None-Match": lista_etag}).status_code == 304
+
+    response = client.patch(url, json={"stock": 11}, headers={**HEADERS_AUTH, "If-Match": etag})
+    assert response.status_code == 200
+    nuevo = response.headers["ETag"]
+    assert nuevo != etag
+
+    # La versión anterior ya no sirve: ni para 304 ni para escribir
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 200
+    assert client.get(BASE_URL, headers={"If-None-Match": lista_etag}).status_code == 200
+    for metodo, kwargs in (("patch", {"json": {"stock": 1}}), ("delete", {})):
+        response = getattr(client, metodo)(url, headers={**HEADERS_AUTH, "If-Match": etag}, **kwargs)
+        assert response.status_code == 412
+    assert client.get(url).json()["stock"] == 11
+    assert client.get(url, headers={"If-None-Match": nuevo}).status_code == 304
+
+
+# TEST 23: Cache-Control según la ruta, sin pisar lo que fija el handler
+def test_cache_policy_is_route_aware():
+    """Verifica caché pública en lecturas, no-store en escrituras/errores y respeto del handler."""
+    producto_id = client.get(BASE_URL).json()[0]["id"]
+
+    response = client.get(f"{BASE_URL}/{producto_id}")
+    assert response.headers["Cache-Control"] == config.CACHE_CONTROL_PRODUCT
+    assert "Pragma" not in response.headers
+    assert client.get(BASE_URL).headers["Cache-Control"] == config.CACHE_CONTROL_PRODUCT_LIST
+
+    for response in (
+        client.get(f"{BASE_URL}/999999"),
+        client.get(f"{BASE_URL}/changes"),
+        client.patch(f"{BASE_URL}/{producto_id}", json={"stock": 2}, headers=HEADERS_AUTH),
+    ):
+        assert response.headers["Cache-Control"] == config.CACHE_CONTROL_NO_STORE
+        assert response.headers["Pragma"] == "no-cache"
+
+    app_propia = FastAPI()
+    app_propia.add_middleware(SecurityMiddleware, cache_policies={"/item": "public, max-age=5"})
+
+    @app_propia.get("/item")
+    def item():
+        return {"ok": True}
+
+    @app_propia.get("/propio")
+    def propio(response: Response):
+        response.headers["Cache-Control"] = "private, max-age=60"
+        return {"ok": True}
+
+    cliente = TestClient(app_propia)
+    assert cliente.get("/item").headers["Cache-Control"] == "public, max-age=5"
+    assert cliente.get("/propio").headers["Cache-Control"] == "private, max-age=60"
+
+
+# TEST 24: la caché de respuestas se invalida solo donde la escritura afecta
+def test_response_cache_invalidates_precisely(monkeypatch):
+    """Verifica HIT/MISS, invalidación por producto y por filtro, expulsión LRU y contadores."""
+    FastAPICache.init(InMemoryBackend(), prefix="fastapi-cache")
+    try:
+        def nuevo(categoria):
+            return client.post(BASE_URL, json={
+                "nombre": f"Cacheable {categoria}",
+                "precio": 500.0,
+                "categoria": categoria,
+                "marca": "TestBrand",
+                "stock": 1,
+                "especificaciones": []
+            }, headers=HEADERS_AUTH).json()
+
+        def estado(response):
+            return response.headers["X-FastAPI-Cache"]
+
+        a, b = nuevo("CacheA"), nuevo("CacheB")
+        url_a = f"{BASE_URL}/{a['id']}"
+
+        assert estado(client.get(url_a)) == "MISS"
+        response = client.get(url_a)
+        assert estado(response) == "HIT" and response.json() == client.get(url_a).json()
+        assert response.headers["ETag"]
+
+        lista_a = {"categoria": "CacheA"}
+        assert estado(client.get(BASE_URL, params=lista_a)) == "MISS"
+        assert estado(client.get(BASE_URL, params=lista_a)) == "HIT"
+
+        # Un cambio fuera del filtro no invalida el listado ni el producto A
+        client.patch(f"{BASE_URL}/{b['id']}", json={"stock": 5}, headers=HEADERS_AUTH)
+        assert estado(client.get(BASE_URL, params=lista_a)) == "HIT"
+        assert estado(client.get(url_a)) == "HIT"
+
+        # B pasa a cumplir el filtro: el listado se regenera y lo incluye
+        client.patch(f"{BASE_URL}/{b['id']}", json={"categoria": "CacheA"}, headers=HEADERS_AUTH)
+        response = client.get(BASE_URL, params=lista_a)
+        assert estado(response) == "MISS"
+        assert [p["id"] for p in response.json()] == [a["id"], b["id"]]
+
+        # A se modifica: su entrada y el listado que lo contiene se invalidan
+        client.patch(url_a, json={"stock": 9}, headers=HEADERS_AUTH)
+        response = client.get(url_a)
+        assert estado(response) == "MISS" and response.json()["stock"] == 9
+        assert estado(client.get(BASE_URL, params=lista_a)) == "MISS"
+
+        client.delete(url_a, headers=HEADERS_AUTH)
+        assert client.get(url_a).status_code == 404
+        assert [p["id"] for p in client.get(BASE_URL, params=lista_a).json()] == [b["id"]]
+
+        monkeypatch.setattr(response_cache, "max_entries", 2)
+        for categoria in ("X1", "X2", "X3"):
+            client.get(BASE_URL, params={"categoria": categoria})
+        stats = client.get(f"/api/{API_VERSION}/health").json()["response_cache"]
+        assert stats["entries"] == 2 and stats["evictions"] >= 1
+        assert stats["hits"] >= 4 and stats["misses"] >= 5 and stats["invalidations"] >= 3
+    finally:
+        FastAPICache.reset()
+
+
+# TEST 25: con SANITIZE_ON_WRITE se escapa una vez al escribir y las respuestas no cambian
+def test_sanitize_on_write_escapes_once(monkeypatch):
+    """Verifica almacenamiento escapado y marcado, respuestas idénticas, filtros y facetas."""
+    monkeypatch.setattr(config, "SANITIZE_ON_WRITE", True)
+    previo = {
+        "id": 1, "nombre": "Cable 'USB'", "precio": 10.0, "categoria": "Audio & Co",
+        "marca": "Rock & Roll", "stock": 3,
+        "especificaciones": [{"grupo": "Conexión", "detalles": [{"atributo": "Tipo", "valor": "A & C"}]}],
+        "created_at": "2025-01-01T00:00:00+00:00", "updated_at": "2025-01-01T00:00:00+00:00",
+        "created_by": None, "updated_by": None
+    }
+    store = ProductStore([previo])
+    # Los productos cargados sin escapar se alinean con el modo
+    assert database._align_escaping(store) == 1
+    monkeypatch.setattr(database, "db", store)
+    assert store.get(1)["categoria"] == "Audio &amp; Co" and store.get(1)[ESCAPED]
+
+    nuevo = client.post(BASE_URL, json={
+        "nombre": 'Parlante "Pro"', "precio": 20.0, "categoria": "Audio & Co",
+        "marca": "Rock & Roll", "stock": 1, "especificaciones": []
+    }, headers=HEADERS_AUTH).json()
+    assert nuevo["nombre"] == "Parlante &quot;Pro&quot;" and ESCAPED not in nuevo
+    assert store.get(nuevo["id"])["nombre"] == "Parlante &quot;Pro&quot;"
+
+    actualizado = client.patch(
+        f"{BASE_URL}/{nuevo['id']}", json={"marca": "Sun & Moon"}, headers=HEADERS_AUTH
+    ).json()
+    assert actualizado["marca"] == "Sun &amp; Moon" and actualizado["nombre"] == "Parlante &quot;Pro&quot;"
+
+    assert client.get(f"{BASE_URL}/1").json()["nombre"] == "Cable &#x27;USB&#x27;"
+    listado = client.get(BASE_URL, params={"categoria": "Audio & Co"}).json()
+    assert [p["id"] for p in listado] == [1, nuevo["id"]]
+    assert [p["id"] for p in client.get(BASE_URL, params={"spec": "Tipo:A & C"}).json()] == [1]
+    facetas = client.get(f"{BASE_URL}/facets").json()
+    assert facetas == {"Tipo": {"A &amp; C": 1}}
+
+    # Al desactivar el modo el catálogo vuelve a su forma original
+    monkeypatch.setattr(config, "SANITIZE_ON_WRITE", False)
+    assert database._align_escaping(store) == 2
+    assert store.get(1)["categoria"] == "Audio & Co" and ESCAPED not in store.get(1)
+    assert client.get(f"{BASE_URL}/1").json()["nombre"] == "Cable &#x27;USB&#x27;"
+
+
+# TEST 26: los espejos msgspec codifican igual que pydantic y OpenAPI no cambia
+def test_msgspec_mirrors_match_pydantic_and_openapi():
+    """Verifica bytes idénticos a response_model, esquemas sin Struct y las clases de respuesta."""
+    adapter = TypeAdapter(Producto)
+    extra = {
+        "id": 99, "nombre": "Ñandú \"☕\" 's", "precio": 10, "categoria": "A & B",
+        "marca": "M", "stock": 0, "especificaciones": [{"grupo": "G", "detalles": []}],
+        "created_at": "t", "updated_at": "t", "created_by": None, "updated_by": "x@y.cl"
+    }
+    for producto in list(database.db) + [extra, dict(extra, precio=0.1 + 0.2)]:
+        esperado = adapter.dump_json(adapter.validate_python(sanitize_output(producto)))
+        assert _encode_producto(producto) == esperado
+    # Desde 1e16 solo cambia la notación del exponente ("1e16" vs "1e+16")
+    grande = dict(extra, precio=1e16)
+    assert json.loads(_encode_producto(grande)) == json.loads(adapter.dump_json(adapter.validate_python(sanitize_output(grande))))
+
+    schema = app.openapi()
+    assert not any("Struct" in nombre for nombre in schema["components"]["schemas"])
+    respuesta = schema["paths"][f"{BASE_URL}/search"]["get"]["responses"]["200"]
+    assert respuesta["content"]["application/json"]["schema"]["items"]["$ref"].endswith("/Producto")
+
+    for clase in RESPONSE_CLASSES.values():
+        assert json.loads(clase({"a": [1, "ñ"], 2: None}).body) == {"a": [1, "ñ"], "2": None}
+
+
+# TEST 27: PATCH con null explícito - Retorna 422 sin tocar el producto
+def test_patch_product_null_returns_422():
+    """Verifica que un null en un campo indexado se rechaza y el catálogo sigue legible."""
+    antes = client.get(f"{BASE_URL}/1").json()
+
+    for campo in ("precio", "stock", "nombre", "categoria", "marca", "especificaciones"):
+        response = client.patch(f"{BASE_URL}/1", json={campo: None}, headers=HEADERS_AUTH)
+        assert response.status_code == 422, campo
+
+    assert client.get(f"{BASE_URL}/1").json() == antes
+    assert client.get(BASE_URL).status_code == 200
+
+
+# TEST 28: GET /products/stream usa cursores "<epoch>-<seq>" como id de evento
+def test_stream_event_ids_are_epoch_cursors():
+    """Verifica el id de cada evento y el `resync` ante un Last-Event-ID de otro proceso."""
+    creado = client.post(BASE_URL, json={
+        "nombre": "Producto en vivo",
+        "precio": 1000.0,
+        "categoria": "Test",
+        "marca": "TestBrand",
+        "stock": 4,
+        "especificaciones": []
+    }, headers=HEADERS_AUTH).json()
+    client.delete(f"{BASE_URL}/{creado['id']}", headers=HEADERS_AUTH)
+    cursor = client.get(f"{BASE_URL}/changes", params={"since": "0" * 12 + "-1"}).json()["detail"]["next_since"]
+    epoch, _, seq = cursor.rpartition("-")
+
+    async def primer_evento(since):
+        stream = _stream_changes(None, since)
+        try:
+            return await stream.__anext__()
+        finally:
+            await stream.aclose()
+
+    evento = asyncio.run(primer_evento(f"{epoch}-{int(seq) - 1}")).decode()
+    assert evento.startswith(f"id: {cursor}\nevent: delete\n")
+    for since in ("0" * 12 + f"-{seq}", seq):
+        evento = asyncio.run(primer_evento(since)).decode()
+        assert evento.startswith("event: resync\n") and f'"next_since":"{cursor}"' in evento
+
+
+# TEST 29: sin versiones confiables (SQLite) no hay ETags ni caché de respuestas
+def test_shared_storage_disables_etags_and_response_cache(monkeypatch):
+    """Verifica que no se envían ETags, que If-Match solo acepta "*" y que nada se sirve de caché."""
+    producto_id = client.get(BASE_URL).json()[0]["id"]
+    url = f"{BASE_URL}/{producto_id}"
+    etag = client.get(url).headers["ETag"]
+    monkeypatch.setattr(products_endpoints, "TRACKS_ALL_WRITES", False)
+    monkeypatch.setattr(response_cache, "enabled", False)
+
+    for _ in range(2):
+        response = client.get(url, headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert "ETag" not in response.headers and "X-FastAPI-Cache" not in response.headers
+    assert "ETag" not in client.get(BASE_URL).headers
+
+    response = client.patch(url, json={"stock": 3}, headers={**HEADERS_AUTH, "If-Match": etag})
+    assert response.status_code == 412
+    response = client.patch(url, json={"stock": 3}, headers={**HEADERS_AUTH, "If-Match": "*"})
+    assert response.status_code == 200 and "ETag" not in response.headers
+
+
+# TEST 30: valores fuera de rango - Retorna 422 sin escribir nada
+def test_out_of_range_values_return_422_and_leave_store_unchanged():
+    """Verifica que un stock mayor que int64 o negativo se rechaza antes de llegar al almacén."""
+    producto_id = client.get(BASE_URL).json()[0]["id"]
+    antes = client.get(BASE_URL).json()
+    otro_proceso = {"since": f"{'0' * 12}-1"}
+    cambios = client.get(f"{BASE_URL}/changes", params=otro_proceso).json()["detail"]["next_since"]
+    nuevo = {
+        "nombre": "Producto desbordado",
+        "precio": 10.0,
+        "categoria": "Test",
+        "marca": "TestBrand",
+        "especificaciones": []
+    }
+
+    for stock in (10 ** 20, -1):
+        response = client.post(BASE_URL, json={**nuevo, "stock": stock}, headers=HEADERS_AUTH)
+        assert response.status_code == 422, stock
+        response = client.patch(f"{BASE_URL}/{producto_id}", json={"stock": stock}, headers=HEADERS_AUTH)
+        assert response.status_code == 422, stock
+    response = client.post(BASE_URL, json={**nuevo, "stock": 1, "precio": -1.0}, headers=HEADERS_AUTH)
+    assert response.status_code == 422
+
+    assert client.get(BASE_URL).json() == antes
+    assert client.get(f"{BASE_URL}/changes", params=otro_proceso).json()["detail"]["next_since"] == cambios
+    assert client.get(f"{BASE_URL}/stats", params={"group_by": "categoria"}).status_code == 200
+
+
+# TEST 31: con un almacén que bloquea (SQLite) las llamadas salen del event loop
+def test_blocking_storage_runs_off_the_event_loop(monkeypatch):
+    """Verifica que _run_store usa el pool de hilos solo cuando el almacén bloquea."""
+    async def hilo():
+        return await products_endpoints._run_store(threading.get_ident)
+
+    assert asyncio.run(hilo()) == threading.get_ident()
+    monkeypatch.setattr(products_endpoints, "BLOCKING_STORAGE", True)
+    assert asyncio.run(hilo()) != threading.get_ident()
+    assert client.get(f"{BASE_URL}/1").status_code == 200
+
+
+# TEST 32: solo el creador de una reserva o un administrador puede cerrarla
+def test_reservation_can_only_be_closed_by_owner_or_admin(monkeypatch):
+    """Verifica el 403 para otro actor sin tocar el stock y que un administrador sí puede liberarla."""
+    producto = client.post(BASE_URL, json={
+        "nombre": "Producto con dueño",
+        "precio": 1000.0,
+        "categoria": "Test",
+        "marca": "TestBrand",
+        "stock": 4,
+        "especificaciones": []
+    }, headers=HEADERS_AUTH).json()
+    url = f"{BASE_URL}/stock"
+    reserva = client.post(f"{url}/reserve", json=[{"id": producto["id"], "qty": 3}], headers=HEADERS_AUTH).json()
+    reserva_url = f"{url}/reservations/{reserva['reservation_id']}"
+
+    monkeypatch.setitem(app.dependency_overrides, extraer_actor_desde_token, lambda: "user:otro")
+    assert client.post(f"{reserva_url}/confirm", headers=HEADERS_AUTH).status_code == 403
+    assert client.delete(reserva_url, headers=HEADERS_AUTH).status_code == 403
+    assert client.get(f"{BASE_URL}/{producto['id']}").json()["stock"] == 1
+
+    monkeypatch.setattr(config, "ADMIN_ACTORS", frozenset({"user:otro"}))
+    assert client.delete(reserva_url, headers=HEADERS_AUTH).status_code == 204
+    assert client.get(f"{BASE_URL}/{producto['id']}").json()["stock"] == 4
+
+
+# TEST 33: GET /products/{id} con If-None-Match de un ID inexistente - Retorna 404, no 304
+def test_conditional_get_of_missing_product_returns_404():
+    """Verifica que la existencia se comprueba antes que If-None-Match, también tras un borrado."""
+    epoch = client.get(f"{BASE_URL}/1").headers["ETag"].strip('"').split("-")[0]
+    inexistente = 987654
+    response = client.get(f"{BASE_URL}/{inexistente}", headers={"If-None-Match": f'"{epoch}-{inexistente}-0"'})
+    assert response.status_code == 404
+
+    creado = client.post(BASE_URL, json={
+        "nombre": "Producto efímero",
+        "precio": 1000.0,
+        "categoria": "Test",
+        "marca": "TestBrand",
+        "stock": 1,
+        "especificaciones": []
+    }, headers=HEADERS_AUTH).json()
+    url = f"{BASE_URL}/{creado['id']}"
+    client.delete(url, headers=HEADERS_AUTH)
+    assert client.get(url, headers={"If-None-Match": "*"}).status_code == 404
+
+
+# TEST 34: una respuesta SSE que nunca se transmite no deja suscripciones
+def test_stream_subscribes_only_while_streaming():
+    """Verifica que la cola se suscribe al comenzar a transmitir y se libera al cerrar."""
+    async def transmitir():
+        antes = len(events)
+        stream = _stream_changes(None, None)
+        assert len(events) == antes
+        evento = asyncio.ensure_future(stream.__anext__())
+        await asyncio.sleep(0)
+        assert len(events) == antes + 1
+        # Cliente desconectado: la espera se cancela y la cola se libera
+        evento.cancel()
+        await asyncio.gather(evento, return_exceptions=True)
+        assert len(events) == antes
+        # Nunca iterada: no hay nada que liberar
+        _stream_changes(None, None)
+        assert len(events) == antes
+
+    asyncio.run(transmitir())